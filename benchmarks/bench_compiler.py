@@ -0,0 +1,154 @@
+# Times ConfigsCompiler phases (discovery, parse, merge, variables, validate, cidr) and,
+# with --synth, a full InfrastructureStack synth over generated trees of
+# increasing size. Baselines are plain JSON so runs can be compared over time.
+#
+#   python benchmarks/bench_compiler.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/bench_compiler.py --compare benchmarks/baseline.json --threshold 0.25
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+from time import perf_counter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tree_generator import TreeShape, generate  # noqa: E402
+from eksdivingboard.cdk.compiler import ConfigsCompiler  # noqa: E402
+from eksdivingboard.cdk.deployment import DeploymentDefinition  # noqa: E402
+from eksdivingboard.cdk.tracing import tracer  # noqa: E402
+
+SCALES = {
+    'small': TreeShape(files=10, environments=3, vpcs=4, subnets=3, eks_clusters=2, variable_refs=2, depth=1),
+    'medium': TreeShape(files=200, environments=20, vpcs=100, subnets=6, eks_clusters=20, variable_refs=50,
+                        depth=3),
+    'large': TreeShape(files=2000, environments=60, vpcs=1000, subnets=9, eks_clusters=200, variable_refs=500,
+                       depth=5),
+}
+COMPILER_PHASES = ('discovery', 'parse', 'merge', 'variables', 'validate', 'cidr')
+
+
+def _phase_totals():
+    totals = {}
+    for name, _start, duration, _pid, _tid, _args in tracer.events:
+        totals[name] = totals.get(name, 0) + duration / 1e9
+    return totals
+
+
+def bench_compiler(definition_file, repeats):
+    best = {}
+    for _ in range(repeats):
+        tracer.events = []
+        tracer.enabled = True
+        start = perf_counter()
+        compiler = ConfigsCompiler(**DeploymentDefinition.load(definition_file).compiler_arguments())
+        environment_configs = compiler.compile_stack_configs('BenchmarkDefaultStack')
+        compiler.validate(environment_configs)
+        elapsed = perf_counter() - start
+        tracer.enabled = False
+        sample = {phase: seconds for phase, seconds in _phase_totals().items() if phase in COMPILER_PHASES}
+        sample['compile'] = elapsed
+        for phase, seconds in sample.items():
+            best[phase] = min(best.get(phase, seconds), seconds)
+    return best
+
+
+def bench_synth(definition_file, repeats):
+    from aws_cdk import core as cdk
+    from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
+
+    best = None
+    for _ in range(repeats):
+        outdir = tempfile.mkdtemp(prefix='bench-synth-')
+        try:
+            start = perf_counter()
+            app = cdk.App(outdir=outdir)
+            InfrastructureStack.from_deployment_file(app, 'InfrastructureStack', definition_file, validate=False)
+            app.synth()
+            elapsed = perf_counter() - start
+        finally:
+            shutil.rmtree(outdir, ignore_errors=True)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(scales, repeats, synth):
+    results = {}
+    for scale in scales:
+        root = tempfile.mkdtemp(prefix=f'bench-{scale}-')
+        try:
+            definition_file = generate(root, SCALES[scale])
+            results[scale] = bench_compiler(definition_file, repeats)
+            if synth:
+                results[scale]['synth'] = bench_synth(definition_file, max(1, repeats // 3))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for scale, phases in results.items():
+        for phase, seconds in phases.items():
+            previous = baseline.get('results', {}).get(scale, {}).get(phase)
+            # ignore sub-millisecond phases, their noise swamps any ratio
+            if previous and seconds > 1e-3 and seconds > previous * (1 + threshold):
+                regressions.append((scale, phase, previous, seconds))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    phases = sorted({phase for scale_results in results.values() for phase in scale_results})
+    print(f"{'scale':<8} " + ' '.join(f'{phase:>12}' for phase in phases))
+    for scale, scale_results in results.items():
+        print(f'{scale:<8} ' + ' '.join(
+            f'{scale_results[phase] * 1000:>10.2f}ms' if phase in scale_results else f"{'-':>12}"
+            for phase in phases))
+        if baseline and scale in baseline.get('results', {}):
+            previous = baseline['results'][scale]
+            print(f"{'  base':<8} " + ' '.join(
+                f'{previous[phase] * 1000:>10.2f}ms' if phase in previous else f"{'-':>12}"
+                for phase in phases))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark config compilation and synth.')
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium'], choices=sorted(SCALES))
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--synth', action='store_true', help='also time a full InfrastructureStack synth')
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fractional slowdown against the baseline that counts as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.repeats, args.synth)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as stream:
+            baseline = json.load(stream)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as stream:
+            json.dump({
+                'python': sys.version.split()[0],
+                'shapes': {scale: SCALES[scale].as_dict() for scale in args.scales},
+                'results': results,
+            }, stream, indent=2, sort_keys=True)
+        print(f'saved baseline to {args.save_baseline}')
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for scale, phase, previous, seconds in regressions:
+            print(f'REGRESSION {scale}/{phase}: {previous * 1000:.2f}ms -> {seconds * 1000:.2f}ms '
+                  f'(+{(seconds / previous - 1) * 100:.0f}%)')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
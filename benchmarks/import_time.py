@@ -0,0 +1,57 @@
+# Measures how long it takes a fresh interpreter to import eksdivingboard modules
+# and whether the import pulled in aws_cdk.
+#
+#   python benchmarks/import_time.py [module ...] [--runs N]
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = [
+    'eksdivingboard.cdk',
+    'eksdivingboard.cdk.compiler',
+    'eksdivingboard.cdk.infrastructure_stack',
+]
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'aws_cdk': any(m.startswith('aws_cdk') for m in sys.modules)}}))
+"""
+
+
+def measure(module, runs=5):
+    samples = []
+    loaded_cdk = False
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        loaded_cdk = loaded_cdk or result['aws_cdk']
+    return {'module': module, 'median_ms': statistics.median(samples) * 1000, 'aws_cdk': loaded_cdk}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time fresh-interpreter imports of eksdivingboard modules.')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+    print(f"{'module':<45} {'median ms':>10}  aws_cdk")
+    for module in args.modules:
+        try:
+            result = measure(module, args.runs)
+        except subprocess.CalledProcessError as error:
+            print(f'{module:<45} {"failed":>10}  {error.stderr.strip().splitlines()[-1]}')
+            continue
+        print(f"{result['module']:<45} {result['median_ms']:>10.1f}  {result['aws_cdk']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# Writes synthetic deployment trees shaped like tests/fixtures:
+#
+#   <root>/defaults/...                     default files
+#   <root>/<name>/...                       deploy files, nested `depth` levels
+#   <root>/<name>/environments/<env>.yaml   one variables file per environment
+#   <root>/<name>.yaml                      deployment definition
+#
+#   python benchmarks/tree_generator.py /tmp/tree --files 500 --environments 40 --vpcs 200
+import os
+import random
+import argparse
+import yaml
+
+SUBNET_TYPES = ('public', 'private', 'isolated')
+
+
+class TreeShape(object):
+
+    def __init__(self, files=10, environments=3, vpcs=2, subnets=3, eks_clusters=1,
+                 variable_refs=2, depth=1, name='example', seed=0):
+        self.files = max(files, 2)
+        self.environments = environments
+        self.vpcs = vpcs
+        self.subnets = subnets
+        self.eks_clusters = eks_clusters
+        self.variable_refs = variable_refs
+        self.depth = depth
+        self.name = name
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+def _write(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as stream:
+        yaml.safe_dump(payload, stream, sort_keys=False)
+
+
+def _nested_dir(base, index, depth):
+    parts = [f'level{(index + level) % 4}' for level in range(max(depth - 1, 0))]
+    return os.path.join(base, *parts)
+
+
+def _address(address):
+    return f'{address >> 24}.{(address >> 16) & 255}.{(address >> 8) & 255}.{address & 255}'
+
+
+def _vpc(index, shape, rng, reference):
+    # one non-overlapping /19 per VPC inside 10.0.0.0/8, /24 subnets inside it;
+    # the first 16 blocks are pinned, the rest hold the second zone's subnets
+    base = (10 << 24) + (index % 2048) * 8192
+    subnets = []
+    for subnet in range(shape.subnets):
+        subnets.append({f'subnet_{subnet}': {
+            'subnet_type': SUBNET_TYPES[subnet % len(SUBNET_TYPES)],
+            'cidr_mask': f'{_address(base + (subnet % 16) * 256)}/24',
+        }})
+    vpc = {
+        'cidr': f'{_address(base)}/19',
+        'nat_gateways': rng.randint(1, 2),
+        'max_azs': rng.randint(1, 3),
+        'subnet_configuration': subnets,
+    }
+    if reference is not None:
+        vpc['vpc_name'] = '${environment}-' + reference
+    return vpc
+
+
+def generate(root, shape):
+    # Returns the deployment definition path. Deterministic for a given shape.
+    rng = random.Random(shape.seed)
+    defaults_root = os.path.join(root, 'defaults')
+    deploy_root = os.path.join(root, shape.name)
+    environments_root = os.path.join(deploy_root, 'environments')
+
+    default_files = max(shape.files // 4, 1)
+    deploy_files = max(shape.files - default_files, 1)
+    buckets = [[] for _ in range(default_files + deploy_files)]
+    items = [('vpc', index) for index in range(shape.vpcs)]
+    items += [('eks_cluster', index) for index in range(shape.eks_clusters)]
+    for position, item in enumerate(items):
+        buckets[position % len(buckets)].append(item)
+
+    references = 0
+    for file_index, bucket in enumerate(buckets):
+        payload = {}
+        for key, index in bucket:
+            if key == 'vpc':
+                reference = None
+                if references < shape.variable_refs:
+                    reference = '${' + f'var_{references % max(shape.variable_refs, 1)}' + '}'
+                    references += 1
+                payload.setdefault('vpc', {})[f'vpc-{index}'] = _vpc(index, shape, rng, reference)
+            else:
+                payload.setdefault('eks_cluster', {})[f'cluster_{index}'] = {
+                    'version': rng.choice(('v1.19', 'v1.20', 'v1.21'))}
+        if file_index < default_files:
+            directory = _nested_dir(defaults_root, file_index, shape.depth)
+        else:
+            directory = _nested_dir(deploy_root, file_index, shape.depth)
+        _write(os.path.join(directory, f'config_{file_index}.yaml'), payload or {'vpc': {}})
+
+    environments = []
+    for environment in range(shape.environments):
+        environment_name = f'env{environment}'
+        variables = {'environment': environment_name, 'account': 100000 + environment}
+        for variable in range(shape.variable_refs):
+            variables[f'var_{variable}'] = f'value-{environment}-{variable}'
+        environment_file = os.path.join(environments_root, f'{environment_name}.yaml')
+        _write(environment_file, variables)
+        environments.append({environment_name: [os.path.relpath(environment_file, root)]})
+
+    definition_file = os.path.join(root, f'{shape.name}.yaml')
+    _write(definition_file, {
+        'default_files_root': 'defaults',
+        'deploy_configs_root': f'{shape.name}/',
+        'environment_files_root': f'{shape.name}/environments',
+        'environments': environments,
+    })
+    return definition_file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic deployment tree.')
+    parser.add_argument('root')
+    defaults = TreeShape()
+    for option, value in defaults.as_dict().items():
+        parser.add_argument(f"--{option.replace('_', '-')}", type=type(value), default=value)
+    args = vars(parser.parse_args(argv))
+    root = args.pop('root')
+    print(generate(root, TreeShape(**args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 # import os
 from os import (
-    path, getcwd
+    path, getcwd, environ
 )
-from aws_cdk import core as cdk
-from cdk.infrastructure_stack import InfrastructureStack
+from cdk import configure_logging
+from cdk.compiler import ConfigsCompiler
+from cdk.parallel_synth import configured_workers, synth_environments
+from cdk.incremental import incremental_synth
+from cdk.lookups import LookupCache, LOOKUP_CACHE_FILE, check_lookups
+from cdk.fragments import FragmentCache
+from cdk.schemas import SchemaValidationError
+from cdk.tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,14 +18,91 @@ current_path = getcwd()
 configs_root = path.join(current_path, "../deployments/example/")
 defaults_root = path.join(current_path, "../deployments/defaults/")
 environments_root = path.join(current_path, "../deployments/example/environments/")
-app = cdk.App()
-InfrastructureStack(
-    scope=app,
-    id="InfrastructureStack",
-    configs_root_path=configs_root,
-    defaults_root_path=defaults_root,
-    environments_root_path=environments_root,
-    )
 
+# EKSDIVE_SYNTH_WORKERS=N (or auto) synthesizes environments in N processes,
+# each with its own cdk.App, and stitches the results into one assembly.
+# EKSDIVE_INCREMENTAL=1 only rebuilds stacks whose input files changed.
+# EKSDIVE_SYNTH_BACKEND=python renders the templates in Python without jsii.
+# EKSDIVE_FREEZE_CONFIGS=1 compiles to immutable configs that share identical subtrees.
+# EKSDIVE_CONFIG_CACHE=<dir> reuses the compiled configs there until an input file changes.
+# EKSDIVE_PARSE_WORKERS=N parses large config trees in N processes (default: one per CPU).
+# EKSDIVE_DEDUPE_ASSEMBLY=1 stores each distinct template and file asset once in cdk.out/blobs.
+# EKSDIVE_FRAGMENT_CACHE=1 (or a directory, to keep them between runs) reuses the rendered
+# resources of constructs built before with the same options. Under jsii that only
+# covers vpc, or the config keys listed in EKSDIVE_FRAGMENT_CONSTRUCTS.
+# EKSDIVE_BUNDLE=<file> compiles from a bundle packed by bundle.py instead of the config roots.
+# Context lookups are answered from cdk.lookups.json (see lookups.py prefetch);
+# EKSDIVE_OFFLINE_LOOKUPS=1 fails the synth listing every lookup it does not hold.
 
-app.synth()
+
+def compile_environments(roots):
+    # what InfrastructureStack does before it builds any stack: compile, then
+    # reject schema and CIDR errors
+    with ConfigsCompiler(**roots) as compiler:
+        environment_configs = compiler.compile_stack_configs("InfrastructureStackDefaultStack")
+    errors = compiler.validate(environment_configs)
+    if errors:
+        raise SchemaValidationError([
+            error for environment_errors in errors.values() for error in environment_errors])
+    return compiler, environment_configs
+
+
+def main():
+    # behind the __main__ guard: spawned synth workers import this module as
+    # __mp_main__ and must not run the synth again
+    configure_logging()
+    synth_workers = configured_workers()
+    incremental = environ.get("EKSDIVE_INCREMENTAL") == "1"
+    python_backend = environ.get("EKSDIVE_SYNTH_BACKEND") == "python"
+    dedupe = environ.get("EKSDIVE_DEDUPE_ASSEMBLY") == "1"
+    offline_lookups = environ.get("EKSDIVE_OFFLINE_LOOKUPS") == "1"
+    fragments = FragmentCache.from_environment()
+    lookup_cache = LookupCache.load(path.join(current_path, LOOKUP_CACHE_FILE))
+    outdir = environ.get("CDK_OUTDIR", "cdk.out")
+    bundle = environ.get("EKSDIVE_BUNDLE")
+    roots = {"bundle": bundle} if bundle else {
+        "deploy_root": configs_root,
+        "defaults_root": defaults_root,
+        "environments_root": environments_root,
+    }
+    if python_backend:
+        from cdk.assembly import synth_configs
+        compiler, environment_configs = compile_environments(roots)
+        synth_configs(environment_configs, outdir, root_stack_id="InfrastructureStack", fragments=fragments)
+    elif synth_workers > 1 or incremental:
+        compiler, environment_configs = compile_environments(roots)
+        if incremental:
+            incremental_synth(compiler, environment_configs, outdir, max_workers=synth_workers,
+                              root_stack_id="InfrastructureStack", context=lookup_cache.context())
+        else:
+            synth_environments(environment_configs, outdir, max_workers=synth_workers,
+                               root_stack_id="InfrastructureStack", context=lookup_cache.context())
+    else:
+        from aws_cdk import core as cdk
+        from cdk.infrastructure_stack import InfrastructureStack
+        from cdk.structures import configure_fragments
+        configure_fragments(fragments)
+        app = cdk.App(context=lookup_cache.context())
+        InfrastructureStack(
+            scope=app,
+            id="InfrastructureStack",
+            configs_root_path=configs_root,
+            defaults_root_path=defaults_root,
+            environments_root_path=environments_root,
+            bundle=bundle,
+            )
+
+        with span('synth'):
+            outdir = app.synth().directory
+        if fragments is not None:
+            fragments.harvest(outdir)
+
+    if offline_lookups:
+        check_lookups(outdir, lookup_cache)
+    if dedupe:
+        from cdk.blobstore import dedupe_assembly
+        dedupe_assembly(outdir)
+
+
+if __name__ == '__main__':
+    main()
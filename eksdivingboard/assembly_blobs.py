@@ -0,0 +1,38 @@
+# Content-addressed cloud assembly output: stores every template and file
+# asset once in <outdir>/blobs, and copies blobs to an artifact directory,
+# skipping the ones an earlier run already sent there.
+#
+#   python3 assembly_blobs.py dedupe cdk.out --prune
+#   python3 assembly_blobs.py upload cdk.out /mnt/artifacts/eksdivingboard
+import os
+import sys
+import argparse
+from cdk import configure_logging
+from cdk.blobstore import BLOB_DIR, BlobStore, dedupe_assembly, directory_uploader
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deduplicate and upload cloud assembly files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    dedupe_parser = commands.add_parser('dedupe', help='move templates and file assets into the blob store')
+    dedupe_parser.add_argument('outdir')
+    dedupe_parser.add_argument('--prune', action='store_true', help='delete blobs the manifest no longer uses')
+    upload_parser = commands.add_parser('upload', help='copy blobs the destination does not have yet')
+    upload_parser.add_argument('outdir')
+    upload_parser.add_argument('destination')
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    if args.command == 'dedupe':
+        dedupe_assembly(args.outdir, prune=args.prune)
+    else:
+        destination = os.path.abspath(args.destination)
+        BlobStore(os.path.join(args.outdir, BLOB_DIR)).upload(destination, directory_uploader(destination))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# Packs a deployment into one bundle file for build machines where opening
+# many small config files is slow; app.py compiles from it with
+# EKSDIVE_BUNDLE=<file>.
+#
+#   python3 bundle.py pack ../deployments/example.yaml -o example.bundle
+#   python3 bundle.py list example.bundle
+#   python3 bundle.py check example.bundle      # exits 1 when a source file changed since packing
+import sys
+import argparse
+from cdk import configure_logging
+from cdk.bundle import Bundle, pack_bundle
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack and inspect single-file deployment bundles.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    pack_parser = commands.add_parser('pack', help='discover, parse and pack every file a deployment compiles from')
+    pack_parser.add_argument('definition', help='deployment definition file, e.g. ../deployments/example.yaml')
+    pack_parser.add_argument('-o', '--output', help='bundle file, default <definition name>.bundle beside it')
+    pack_parser.add_argument('--ignore-file')
+    for command, description in (('list', 'show the files in a bundle'),
+                                 ('check', 'fail when a packed file changed at its source')):
+        commands.add_parser(command, help=description).add_argument('bundle')
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    if args.command == 'pack':
+        try:
+            pack_bundle(args.definition, args.output, ignore_file=args.ignore_file)
+        except (ValueError, FileNotFoundError) as error:
+            logger.error('%s', error)
+            return 1
+        return 0
+
+    with Bundle.open(args.bundle) as bundle:
+        if args.command == 'list':
+            print(f'{bundle.name} packed {bundle.index["created"]} from {bundle.index["source_root"]}')
+            for kind, files in bundle.index['file_lists'].items():
+                for relative in files:
+                    print(f'  {kind:<12} {relative}')
+            for name, overlay in bundle.index['environments'].items():
+                print(f'  {"overlay":<12} {name}: {", ".join(overlay["files"]) if overlay else "-"}')
+            return 0
+        changed = bundle.changed_sources()
+        for relative in changed:
+            print(f'changed: {relative}', file=sys.stderr)
+        return 1 if changed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
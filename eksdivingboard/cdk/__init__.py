@@ -1,15 +1,60 @@
 import os
 import sys
+import importlib
 BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../')
 sys.path.append(BASE_DIR)
-from eksdivingboard.cdk import compiler
-from eksdivingboard.cdk import eks_cluster
-from eksdivingboard.cdk import infrastructure_stack
-from eksdivingboard.cdk import structures
-from eksdivingboard.cdk import vpc
 import logging
 
 logger = logging.getLogger('eks_diving_board')
-logging.basicConfig(format='%(asctime)s %(message)s',
-                    datefmt='%m/%d/%Y %I:%M:%S %p',
-                    level=logging.DEBUG)
+
+# Submodules are imported on first attribute access so compiler-only callers
+# never load aws_cdk or start the jsii runtime.
+_submodules = {
+    'assembly',
+    'batch',
+    'blobstore',
+    'bundle',
+    'cache',
+    'cidr',
+    'compiler',
+    'deploy',
+    'deployment',
+    'discovery',
+    'eks_cluster',
+    'emitter',
+    'fragments',
+    'frozen',
+    'incremental',
+    'lazy',
+    'lookups',
+    'infrastructure_stack',
+    'merge',
+    'parallel_synth',
+    'registry',
+    'schemas',
+    'server',
+    'specs',
+    'structures',
+    'templates',
+    'tracing',
+    'vpc',
+    'watch',
+}
+
+
+def __getattr__(name):
+    if name in _submodules:
+        module = importlib.import_module(f'{__name__}.{name}')
+        globals()[name] = module
+        return module
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | _submodules)
+
+
+def configure_logging(level=logging.DEBUG):
+    logging.basicConfig(format='%(asctime)s %(message)s',
+                        datefmt='%m/%d/%Y %I:%M:%S %p',
+                        level=level)
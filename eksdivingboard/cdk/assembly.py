@@ -0,0 +1,85 @@
+import os
+import json
+import logging
+from .emitter import emit_stack
+from .parallel_synth import MANIFEST_FILE, TREE_FILE
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Writes a cloud assembly from emitter templates without a cdk.App, in the
+# layout aws-cdk.core 1.123 produces, so `cdk deploy --app <outdir>` and
+# `cdk diff` accept it.
+
+ASSEMBLY_VERSION = '13.0.0'
+TREE_VERSION = 'tree-0.1'
+UNKNOWN_ENVIRONMENT = 'aws://unknown-account/unknown-region'
+
+
+def _write_json(file_name, payload):
+    # unindented output goes through json's C encoder, an order of magnitude
+    # faster for fleet-sized templates
+    with open(file_name, 'w') as stream:
+        stream.write(json.dumps(payload))
+
+
+def stack_artifact(template):
+    return {
+        'type': 'aws:cloudformation:stack',
+        'environment': UNKNOWN_ENVIRONMENT,
+        'properties': {'templateFile': f'{template.stack_name}.template.json'},
+        'metadata': {
+            f'/{path}': [{'type': 'aws:cdk:logicalId', 'data': logical_id}]
+            for path, logical_id in template.logical_ids().items()
+        },
+        'displayName': template.stack_name,
+    }
+
+
+def write_template(template, outdir):
+    file_name = os.path.join(outdir, f'{template.stack_name}.template.json')
+    _write_json(file_name, template.render())
+    return file_name
+
+
+def write_assembly(templates, outdir, stacks=None):
+    # templates in the order a single cdk.App would have synthesized the stacks;
+    # stacks limits which template files are rewritten, the manifest and tree
+    # always describe every template
+    os.makedirs(outdir, exist_ok=True)
+    artifacts = {}
+    tree_children = {'Tree': {'id': 'Tree', 'path': 'Tree'}}
+    for template in templates:
+        if stacks is None or template.stack_name in stacks:
+            write_template(template, outdir)
+        artifacts[template.stack_name] = stack_artifact(template)
+        stack_node = {'id': template.stack_name, 'path': template.stack_name}
+        children = template.construct_tree()
+        if children:
+            stack_node['children'] = children
+        tree_children[template.stack_name] = stack_node
+    artifacts['Tree'] = {'type': 'cdk:tree', 'properties': {'file': TREE_FILE}}
+
+    _write_json(os.path.join(outdir, TREE_FILE), {
+        'version': TREE_VERSION,
+        'tree': {'id': 'App', 'path': '', 'children': tree_children},
+    })
+    manifest = {'version': ASSEMBLY_VERSION, 'artifacts': artifacts}
+    _write_json(os.path.join(outdir, MANIFEST_FILE), manifest)
+    _write_json(os.path.join(outdir, 'cdk.out'), {'version': ASSEMBLY_VERSION})
+    return manifest
+
+
+def synth_configs(environment_configs, outdir, root_stack_id=None, path_metadata=True, fragments=None):
+    # The Python backend: compiled environment configs -> cloud assembly, no jsii.
+    # fragments: a FragmentCache to reuse constructs rendered with the same options
+    templates = []
+    with span('emit', environments=len(environment_configs)):
+        if root_stack_id:
+            templates.append(emit_stack(root_stack_id, {}, path_metadata))
+        for name, configs in environment_configs.items():
+            templates.append(emit_stack(name, configs, path_metadata, fragments))
+    with span('write_assembly', outdir=outdir):
+        manifest = write_assembly(templates, outdir)
+    logger.info('wrote %d stacks to %s with the python backend', len(templates), outdir)
+    return manifest
@@ -10,8 +10,13 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_VPC_ID = 'vpc-009508920dc9df9d3'
+
+
 class EksCluster(cdk.Stack):
-    def __init__(self, scope: cdk.Construct, construct_id: str, **kwargs) -> None:
+    # from_lookup needs an env with account and region; its answer comes from
+    # cdk.lookups.json when the app passes LookupCache.context() to cdk.App
+    def __init__(self, scope: cdk.Construct, construct_id: str, vpc_id: str = DEFAULT_VPC_ID, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         base_cluster_iam_role = iam.Role(
@@ -28,10 +33,10 @@ class EksCluster(cdk.Stack):
             cluster_name='EKSdiveCluster',
             output_cluster_name=True,
             endpoint_access=eks.EndpointAccess.PUBLIC,
-            vpc=ec2.Vpc.fromLookup(
+            vpc=ec2.Vpc.from_lookup(
                 self,
                 'vpc',
-                vpc_id='vpc-009508920dc9df9d3'
+                vpc_id=vpc_id
             )
         )
 
@@ -0,0 +1,110 @@
+import os
+import glob
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .compiler import ConfigsCompiler
+from .deployment import DeploymentDefinition
+from .frozen import Interner
+from .parallel_synth import _synth_group
+from .schemas import SchemaValidationError
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Synthesizes many deployment definitions in one process. Every compiler
+# shares one parsed-file table, so defaults and common files used by several
+# deployments are read and parsed once, and every jsii synth runs on the same
+# runtime (or the same pool of worker runtimes) instead of one per deployment.
+
+BACKENDS = ('jsii', 'python')
+
+
+def find_definitions(paths):
+    # deployment definition files, or directories whose top-level *.yaml files are definitions
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, '*.yaml'))))
+        else:
+            found.append(path)
+    return [os.path.abspath(path) for path in found]
+
+
+class BatchCompiler(object):
+
+    def __init__(self, definition_files, default_environment='InfrastructureStackDefaultStack', **compiler_options):
+        self.definitions = [DeploymentDefinition.load(file_name) for file_name in definition_files]
+        names = [definition.name for definition in self.definitions]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f'deployment names must be unique, found {", ".join(duplicates)} more than once')
+        self.default_environment = default_environment
+        # a copy: the shared interner is added here, not to the caller's options
+        self.compiler_options = dict(compiler_options)
+        # path -> parsed document, for every deployment
+        self.parsed_files = {}
+        if self.compiler_options.get('freeze') and self.compiler_options.get('interner') is None:
+            self.compiler_options['interner'] = Interner()
+        self.compilers = {}
+
+    def compile(self):
+        # deployment name -> {environment name -> configs}; raises with every
+        # deployment's errors at once
+        compiled = {}
+        errors = []
+        for definition in self.definitions:
+            with span('batch.compile', deployment=definition.name):
+                compiler = ConfigsCompiler(parsed_files=self.parsed_files, base_path=definition.base_path,
+                                           **self.compiler_options, **definition.compiler_arguments())
+                environment_configs = compiler.compile_stack_configs(self.default_environment)
+                for environment, environment_errors in compiler.validate(environment_configs).items():
+                    errors.extend(f'{definition.name}/{environment}: {error}' for error in environment_errors)
+            self.compilers[definition.name] = compiler
+            compiled[definition.name] = environment_configs
+        logger.info('compiled %d deployments from %d distinct files', len(compiled), len(self.parsed_files))
+        if errors:
+            raise SchemaValidationError(errors)
+        return compiled
+
+
+def synth_all(definition_files, outdir, backend='jsii', max_workers=1, root_stack_id='InfrastructureStack',
+              context=None, dedupe=False, fragments=None, **compiler_options):
+    # Writes one cloud assembly per deployment to <outdir>/<deployment name>
+    # and returns deployment name -> assembly directory. With the python
+    # backend a FragmentCache in fragments renders each distinct construct once
+    # across every deployment. With max_workers > 1 the caller must run behind
+    # an `if __name__ == '__main__':` guard: the spawned workers import the
+    # caller's main module before they synthesize anything.
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown backend {backend}, expected one of {", ".join(BACKENDS)}')
+    compiled = BatchCompiler(definition_files, **compiler_options).compile()
+    assemblies = {name: os.path.join(outdir, name) for name in compiled}
+
+    with span('batch.synth', deployments=len(compiled), backend=backend):
+        if backend == 'python':
+            from .assembly import synth_configs
+            for name, environment_configs in compiled.items():
+                synth_configs(environment_configs, assemblies[name], root_stack_id=root_stack_id, fragments=fragments)
+        elif max_workers and max_workers > 1:
+            # jsii's node child process does not survive fork, so always spawn
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(compiled)),
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [
+                    executor.submit(_synth_group, assemblies[name], list(environment_configs.items()),
+                                    root_stack_id, context)
+                    for name, environment_configs in compiled.items()
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for name, environment_configs in compiled.items():
+                _synth_group(assemblies[name], list(environment_configs.items()), root_stack_id, context)
+
+    if dedupe:
+        from .blobstore import dedupe_assembly
+        for assembly in assemblies.values():
+            dedupe_assembly(assembly)
+    for name, assembly in assemblies.items():
+        logger.info('%s: %d stacks in %s', name, len(compiled[name]) + (1 if root_stack_id else 0), assembly)
+    return assemblies
@@ -0,0 +1,177 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from .parallel_synth import MANIFEST_FILE
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed storage for a cloud assembly. Every stack template and
+# file asset is stored once under blobs/<first two hex digits>/<sha256><ext>
+# inside the assembly and the manifest points at the blob, so stacks that
+# synthesize to the same template share one file. Blobs written by earlier
+# runs are kept and never rewritten, and uploads record what each destination
+# already holds, so a stack that did not change since the last run costs
+# neither a write nor an upload.
+#
+# Templates embed the stack name in aws:cdk:path metadata and in the Name tags
+# ec2.Vpc sets, so two stacks share a blob only when neither is in play, e.g.
+# stacks without VPCs synthesized with `cdk synth --no-path-metadata`.
+
+BLOB_DIR = 'blobs'
+UPLOAD_LEDGER = 'uploaded.json'
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_blob(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore(object):
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.stored = 0
+        self.reused = 0
+        self.reused_bytes = 0
+
+    def key(self, digest, extension=''):
+        return f'{digest[:2]}/{digest}{extension}'
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put_file(self, file_name, move=False):
+        # returns the blob key; a blob that already exists is never rewritten
+        extension = os.path.splitext(file_name)[1]
+        key = self.key(hash_blob(file_name), extension)
+        destination = self.path(key)
+        if os.path.exists(destination):
+            self.reused += 1
+            self.reused_bytes += os.path.getsize(file_name)
+            if move:
+                os.unlink(file_name)
+            return key
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # stage next to the blob and rename, so readers never see a partial blob
+        descriptor, staging = tempfile.mkstemp(prefix='.blob-', dir=os.path.dirname(destination))
+        os.close(descriptor)
+        try:
+            if move:
+                shutil.move(file_name, staging)
+            else:
+                shutil.copyfile(file_name, staging)
+            os.replace(staging, destination)
+        except BaseException:
+            if os.path.exists(staging):
+                os.unlink(staging)
+            raise
+        self.stored += 1
+        return key
+
+    def keys(self):
+        found = set()
+        if not os.path.isdir(self.root):
+            return found
+        for prefix in os.scandir(self.root):
+            if prefix.is_dir() and len(prefix.name) == 2:
+                found.update(f'{prefix.name}/{entry.name}' for entry in os.scandir(prefix.path)
+                             if not entry.name.startswith('.'))
+        return found
+
+    def prune(self, keep):
+        # deletes every blob not in keep; returns the deleted keys
+        removed = sorted(self.keys() - set(keep))
+        for key in removed:
+            os.unlink(self.path(key))
+        return removed
+
+    def _read_ledger(self):
+        try:
+            with open(os.path.join(self.root, UPLOAD_LEDGER), 'r') as stream:
+                return json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def upload(self, destination, upload, keys=None):
+        # upload(path, key) sends one blob to destination (any string naming
+        # it, e.g. an s3 url). Keys already sent there by earlier runs are
+        # skipped; returns the keys sent now.
+        ledger = self._read_ledger()
+        sent = set(ledger.get(destination, ()))
+        pending = sorted((self.keys() if keys is None else set(keys)) - sent)
+        uploaded = []
+        try:
+            for key in pending:
+                with span('blob.upload', key=key):
+                    upload(self.path(key), key)
+                uploaded.append(key)
+        finally:
+            ledger[destination] = sorted(sent.union(uploaded))
+            with open(os.path.join(self.root, UPLOAD_LEDGER), 'w') as stream:
+                json.dump(ledger, stream)
+        logger.info('uploaded %d blobs to %s, %d were already there', len(uploaded), destination, len(sent))
+        return uploaded
+
+
+def directory_uploader(directory):
+    # upload function that copies blobs into another directory, e.g. a mounted artifact share
+    def upload(path, key):
+        destination = os.path.join(directory, *key.split('/'))
+        if not os.path.exists(destination):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            shutil.copyfile(path, destination)
+    return upload
+
+
+def _blob_files(outdir, artifact):
+    # (container, field) pairs naming files the artifact uses, relative to outdir
+    properties = artifact.get('properties', {})
+    if artifact.get('type') == 'aws:cloudformation:stack' and properties.get('templateFile'):
+        yield properties, 'templateFile'
+    for entries in artifact.get('metadata', {}).values():
+        for entry in entries:
+            data = entry.get('data')
+            # directory assets are already named by their content hash
+            if (entry.get('type') == 'aws:cdk:asset' and isinstance(data, dict) and data.get('path')
+                    and os.path.isfile(os.path.join(outdir, data['path']))):
+                yield data, 'path'
+
+
+def dedupe_assembly(outdir, prune=False):
+    # Moves every template and file asset of the assembly in outdir into its
+    # blob store and rewrites the manifest to point at the blobs.
+    store = BlobStore(os.path.join(outdir, BLOB_DIR))
+    manifest_file = os.path.join(outdir, MANIFEST_FILE)
+    with open(manifest_file, 'r') as stream:
+        manifest = json.load(stream)
+
+    referenced = set()
+    moved = {}
+    prefix = BLOB_DIR + '/'
+    with span('dedupe', outdir=outdir):
+        for artifact in manifest.get('artifacts', {}).values():
+            for container, field in _blob_files(outdir, artifact):
+                relative = container[field]
+                if relative.startswith(prefix):
+                    referenced.add(relative[len(prefix):])
+                    continue
+                if relative not in moved:
+                    moved[relative] = store.put_file(os.path.join(outdir, relative), move=True)
+                container[field] = prefix + moved[relative]
+                referenced.add(moved[relative])
+
+    with open(manifest_file, 'w') as stream:
+        json.dump(manifest, stream, indent=2)
+    if prune:
+        store.prune(referenced)
+    logger.info('%s: %d files in %d blobs, %d new, %d reused (%d bytes not rewritten)',
+                outdir, len(moved), len(referenced), store.stored, store.reused, store.reused_bytes)
+    return store
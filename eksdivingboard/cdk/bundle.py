@@ -0,0 +1,220 @@
+import os
+import json
+import mmap
+import struct
+import marshal
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timezone
+from .cache import hash_file
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# A deployment bundle is one file holding everything a compile reads: the
+# deployment definition, the discovered default, common, deploy and
+# environment file lists, and every file's parsed document. The compiler
+# memory-maps it and decodes only the sections it asks for, so compiling
+# from a bundle makes no per-file syscalls and parses no YAML.
+#
+#   <MAGIC> <version u32> <index length u64> <JSON index> <marshal sections...>
+#
+# Bundle.open() checks the index digest against the sections, so a truncated
+# or corrupted bundle is rejected before anything is decoded. The digest is
+# not a signature: marshal can build code objects and must not read untrusted
+# data, so only compile from bundles you packed or got from a trusted source.
+#
+# Paths inside a bundle are relative to the definition's directory; a compiler
+# configured from a bundle sees them below the bundle's own directory.
+#
+#   pack_bundle('../deployments/example.yaml', 'example.bundle')
+#   ConfigsCompiler(bundle='example.bundle').compile_stack_configs(...)
+
+MAGIC = b'EKSDBNDL'
+BUNDLE_VERSION = 2
+# the marshal format every supported Python reads
+_MARSHAL_VERSION = 4
+BUNDLE_EXTENSION = '.bundle'
+_HEADER = struct.Struct('<8sIQ')
+FILE_LISTS = ('environment', 'default', 'common', 'deploy')
+
+
+class Bundle(object):
+
+    def __init__(self, file_name, index, mapped, data_start):
+        self.file_name = file_name
+        self.root = os.path.dirname(file_name)
+        self.index = index
+        self.digest = index['digest']
+        self.name = index['name']
+        self._mapped = mapped
+        self._data_start = data_start
+        # path as the compiler names it -> (offset, length)
+        self._sections = {
+            self.path(relative): (offset, length) for relative, (offset, length, _hash) in index['files'].items()
+        }
+        self.loaded = 0
+
+    @classmethod
+    def open(cls, file_name):
+        file_name = os.path.abspath(file_name)
+        with open(file_name, 'rb') as stream:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            index_length = cls._check_header(file_name, mapped)
+            index = json.loads(mapped[_HEADER.size:_HEADER.size + index_length])
+            cls._check_digest(file_name, index, mapped, _HEADER.size + index_length)
+        except BaseException:
+            mapped.close()
+            raise
+        logger.info('opened bundle %s: %d files', file_name, len(index['files']))
+        return cls(file_name, index, mapped, _HEADER.size + index_length)
+
+    @staticmethod
+    def _check_header(file_name, mapped):
+        if len(mapped) < _HEADER.size:
+            raise ValueError(f'{file_name} is not a deployment bundle')
+        magic, version, index_length = _HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            raise ValueError(f'{file_name} is not a deployment bundle')
+        if version != BUNDLE_VERSION:
+            raise ValueError(f'{file_name} is bundle version {version}, this release reads version {BUNDLE_VERSION}; '
+                             'pack it again')
+        return index_length
+
+    @staticmethod
+    def _check_digest(file_name, index, mapped, data_start):
+        # the digest pack_bundle wrote, over every section and the file lists
+        digest = hashlib.sha256()
+        with memoryview(mapped) as view:
+            for relative, (offset, length, _hash) in index['files'].items():
+                start = data_start + offset
+                digest.update(relative.encode() + b'\0')
+                digest.update(view[start:start + length])
+        digest.update(json.dumps([index['file_lists'], index['environments']], sort_keys=True).encode())
+        if digest.hexdigest() != index['digest']:
+            raise ValueError(f'{file_name} does not match its digest, it is corrupted or was changed after packing')
+
+    def close(self):
+        self._mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def path(self, relative):
+        return os.path.normpath(os.path.join(self.root, relative))
+
+    def __contains__(self, path):
+        return path in self._sections
+
+    def load(self, path):
+        # the parsed document of one packed file
+        try:
+            offset, length = self._sections[path]
+        except KeyError:
+            raise FileNotFoundError(f'cannot find file {path} in bundle {self.file_name}')
+        start = self._data_start + offset
+        self.loaded += 1
+        with memoryview(self._mapped) as view:
+            return marshal.loads(view[start:start + length])
+
+    def compiler_arguments(self):
+        # ConfigsCompiler.configure() arguments naming the packed files; nothing is discovered
+        lists = {kind: [self.path(relative) for relative in files] for kind, files in self.index['file_lists'].items()}
+        environments = []
+        for name, overlay in self.index['environments'].items():
+            if overlay is None:
+                environments.append(name)
+            else:
+                environments.append({name: {'files': [self.path(relative) for relative in overlay['files']],
+                                            'overrides': overlay['overrides']}})
+        return {
+            'environment_files': lists['environment'],
+            'default_files': lists['default'],
+            'common_files': lists['common'],
+            'deploy_files': lists['deploy'],
+            'environments': environments,
+        }
+
+    def changed_sources(self):
+        # packed files whose source differs from what is in the bundle, or is gone
+        source_root = self.index['source_root']
+        changed = []
+        for relative, (_offset, _length, content_hash) in self.index['files'].items():
+            source = os.path.join(source_root, relative)
+            if not os.path.isfile(source) or hash_file(source) != content_hash:
+                changed.append(relative)
+        return changed
+
+
+def pack_bundle(definition_file, output=None, ignore_file=None, **compiler_options):
+    # Discovers and parses every file the deployment compiles from and writes
+    # them to one bundle, by default <definition name>.bundle next to the
+    # definition. Returns the bundle's file name.
+    from .compiler import ConfigsCompiler
+    from .deployment import DeploymentDefinition
+    definition = DeploymentDefinition.load(definition_file)
+    output = os.path.abspath(output or os.path.join(definition.base_path, definition.name + BUNDLE_EXTENSION))
+    compiler = ConfigsCompiler(base_path=definition.base_path, ignore_file=ignore_file, **compiler_options,
+                               **definition.compiler_arguments())
+
+    def relative(path):
+        return os.path.relpath(path, definition.base_path).replace(os.sep, '/')
+
+    input_files = compiler.input_files()
+    file_lists = {kind: [relative(path) for path in input_files[kind]] for kind in FILE_LISTS}
+    environments = {name: None for name in compiler.environments}
+    for name, overlay in compiler.environment_overlays.items():
+        environments[name] = {'files': [relative(path) for path in overlay['files']], 'overrides': overlay['overrides']}
+    paths = list(dict.fromkeys(
+        [path for kind in FILE_LISTS for path in input_files[kind]]
+        + [path for overlay in compiler.environment_overlays.values() for path in overlay['files']]))
+
+    with span('bundle.pack', files=len(paths)):
+        documents = compiler.parse_config_files(paths)
+        sections = []
+        files = {}
+        offset = 0
+        digest = hashlib.sha256()
+        for path, document in zip(paths, documents):
+            try:
+                section = marshal.dumps(document, _MARSHAL_VERSION)
+            except ValueError as error:
+                # marshal holds plain YAML values; a timestamp or a custom tag is not one
+                raise ValueError(f'cannot pack {path}: {error}')
+            files[relative(path)] = (offset, len(section), hash_file(path))
+            digest.update(relative(path).encode() + b'\0' + section)
+            sections.append(section)
+            offset += len(section)
+        digest.update(json.dumps([file_lists, environments], sort_keys=True).encode())
+        index = json.dumps({
+            'name': definition.name,
+            'digest': digest.hexdigest(),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'source_root': definition.base_path,
+            'definition': definition.definition,
+            'file_lists': file_lists,
+            'environments': environments,
+            'files': files,
+        }).encode()
+
+        descriptor, staging = tempfile.mkstemp(prefix='.bundle-', dir=os.path.dirname(output))
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                stream.write(_HEADER.pack(MAGIC, BUNDLE_VERSION, len(index)))
+                stream.write(index)
+                for section in sections:
+                    stream.write(section)
+            os.replace(staging, output)
+        except BaseException:
+            if os.path.exists(staging):
+                os.unlink(staging)
+            raise
+    logger.info('packed %d files of %s into %s (%d bytes)', len(paths), definition.name, output,
+                os.path.getsize(output))
+    return output
@@ -0,0 +1,94 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# bump when the stored entry changes shape (2: merge origins)
+CACHE_VERSION = 2
+
+
+def hash_file(file_name):
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Compiled configs and variables keyed by every input file's path, size, mtime and
+# content hash plus the compiler's configure() arguments. Adding, removing, renaming
+# or editing a file under any root changes the key. Content hashes are only
+# recomputed for files whose size or mtime moved since the last run.
+class ConfigCache(object):
+
+    _index_file = 'file_index.json'
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self._file_index = None
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _load_file_index(self):
+        if self._file_index is None:
+            try:
+                with open(self._path(self._index_file), 'r') as stream:
+                    self._file_index = json.load(stream)
+            except (FileNotFoundError, ValueError):
+                self._file_index = {}
+        return self._file_index
+
+    def fingerprint(self, file_name):
+        index = self._load_file_index()
+        stat = os.stat(file_name)
+        known = index.get(file_name)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known
+        entry = [stat.st_size, stat.st_mtime_ns, hash_file(file_name)]
+        index[file_name] = entry
+        return entry
+
+    def make_key(self, configure_args, file_lists):
+        digest = hashlib.sha256()
+        digest.update(f'v{CACHE_VERSION}'.encode())
+        digest.update(json.dumps(configure_args, sort_keys=True, default=str).encode())
+        for list_name in sorted(file_lists):
+            digest.update(f'\0{list_name}'.encode())
+            for file_name in file_lists[list_name]:
+                size, mtime_ns, content_hash = self.fingerprint(file_name)
+                digest.update(f'\0{file_name}\0{size}\0{mtime_ns}\0{content_hash}'.encode())
+        return digest.hexdigest()
+
+    def load(self, key):
+        try:
+            with open(self._path(f'{key}.pickle'), 'rb') as stream:
+                entry = pickle.load(stream)
+        except FileNotFoundError:
+            logger.debug('config cache miss for %s', key)
+            return None
+        except (pickle.UnpicklingError, EOFError, ValueError) as error:
+            logger.warning('discarding unreadable config cache entry %s: %s', key, error)
+            return None
+        logger.debug('config cache hit for %s', key)
+        return entry
+
+    def store(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._atomic_write(f'{key}.pickle', pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        self._atomic_write(self._index_file, json.dumps(self._load_file_index()).encode())
+
+    def _atomic_write(self, name, payload):
+        descriptor, temp_name = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                stream.write(payload)
+            os.replace(temp_name, self._path(name))
+        except BaseException:
+            if os.path.exists(temp_name):
+                os.unlink(temp_name)
+            raise
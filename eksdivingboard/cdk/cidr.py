@@ -0,0 +1,310 @@
+import logging
+from collections.abc import Mapping
+from functools import lru_cache
+from .schemas import ConfigError
+from .specs import VPC_SPEC
+
+logger = logging.getLogger(__name__)
+
+# IPv4 networks as integer ranges. Everything here is plain int arithmetic so a
+# deployment with tens of thousands of subnets can be planned and checked
+# without ipaddress objects or aws_cdk.
+
+ADDRESS_BITS = 32
+ADDRESS_MASK = (1 << ADDRESS_BITS) - 1
+DEFAULT_MAX_AZS = 3
+# Fn::GetAZs of an environment-agnostic stack resolves to two zones at synth time
+AGNOSTIC_AZS = 2
+
+
+class CidrError(ValueError):
+    pass
+
+
+class Network(object):
+    __slots__ = ('address', 'prefix', 'start', 'end')
+
+    def __init__(self, address, prefix):
+        self.address = address
+        self.prefix = prefix
+        size = 1 << (ADDRESS_BITS - prefix)
+        # the range the address actually belongs to, host bits cleared
+        self.start = address & ~(size - 1) & ADDRESS_MASK
+        self.end = self.start + size - 1
+
+    @property
+    def aligned(self):
+        return self.address == self.start
+
+    def contains(self, other):
+        return self.start <= other.start and other.end <= self.end
+
+    def __eq__(self, other):
+        return isinstance(other, Network) and (self.address, self.prefix) == (other.address, other.prefix)
+
+    def __hash__(self):
+        return hash((self.address, self.prefix))
+
+    def __str__(self):
+        return format_network(self.address, self.prefix)
+
+    def __repr__(self):
+        return f'Network({str(self)!r})'
+
+
+def format_network(address, prefix):
+    return f'{address >> 24}.{(address >> 16) & 255}.{(address >> 8) & 255}.{address & 255}/{prefix}'
+
+
+@lru_cache(maxsize=65536)
+def parse_cidr(text):
+    # '10.0.16.0/20' -> Network. Host bits are kept so callers can report
+    # misalignment instead of silently rounding.
+    try:
+        address_text, prefix_text = text.strip().split('/')
+        octets = address_text.split('.')
+        prefix = int(prefix_text)
+        if len(octets) != 4 or not 0 <= prefix <= ADDRESS_BITS:
+            raise ValueError
+        address = 0
+        for octet in octets:
+            value = int(octet)
+            if not 0 <= value <= 255:
+                raise ValueError
+            address = address << 8 | value
+    except (ValueError, AttributeError):
+        raise CidrError(f'{text!r} is not an IPv4 CIDR block')
+    return Network(address, prefix)
+
+
+def mask_length(value):
+    # cidr_mask accepts 20, '20', '/20' or a full block such as '10.0.16.0/20'
+    if isinstance(value, bool):
+        raise CidrError(f'{value!r} is not a prefix length')
+    if isinstance(value, int):
+        prefix = value
+    else:
+        text = str(value).strip()
+        if '.' in text:
+            return parse_cidr(text).prefix
+        try:
+            prefix = int(text.lstrip('/'))
+        except ValueError:
+            raise CidrError(f'{value!r} is not a prefix length')
+    if not 0 <= prefix <= ADDRESS_BITS:
+        raise CidrError(f'/{prefix} is not a valid prefix length')
+    return prefix
+
+
+def explicit_network(value):
+    # the block a cidr_mask pins, or None when it only gives a length
+    if isinstance(value, str) and '.' in value:
+        return parse_cidr(value)
+    return None
+
+
+def availability_zones(options):
+    # ec2.Vpc creates every subnet_configuration entry once per zone
+    max_azs = options.get('max_azs', DEFAULT_MAX_AZS)
+    if not isinstance(max_azs, int) or isinstance(max_azs, bool) or max_azs < 1:
+        max_azs = DEFAULT_MAX_AZS
+    return min(max_azs, AGNOSTIC_AZS)
+
+
+def allocate(parent, prefixes, reserved=()):
+    # Hands out aligned blocks of the requested lengths from parent in order,
+    # skipping reserved networks. Returns a Network or None (no room) per prefix.
+    taken = sorted((network.start, network.end) for network in reserved)
+    allocated = []
+    cursor = parent.start
+    for prefix in prefixes:
+        if prefix < parent.prefix:
+            allocated.append(None)
+            continue
+        size = 1 << (ADDRESS_BITS - prefix)
+        start = (cursor + size - 1) & ~(size - 1)
+        for taken_start, taken_end in taken:
+            if taken_end < start:
+                continue
+            if taken_start > start + size - 1:
+                break
+            start = (taken_end + size) & ~(size - 1)
+        if start + size - 1 > parent.end:
+            allocated.append(None)
+            continue
+        network = Network(start, prefix)
+        allocated.append(network)
+        taken.append((network.start, network.end))
+        taken.sort()
+        cursor = start + size
+    return allocated
+
+
+def allocate_subnets(vpc_cidr, masks):
+    # '10.0.0.0/16', [20, 20, 24] -> ['10.0.0.0/20', '10.0.16.0/20', '10.0.32.0/24']
+    parent = parse_cidr(vpc_cidr)
+    if not parent.aligned:
+        raise CidrError(f'{vpc_cidr} is not aligned to /{parent.prefix}, '
+                        f'the network is {Network(parent.start, parent.prefix)}')
+    networks = allocate(parent, [mask_length(mask) for mask in masks])
+    for mask, network in zip(masks, networks):
+        if network is None:
+            raise CidrError(f'no free /{mask_length(mask)} left in {vpc_cidr}')
+    return [str(network) for network in networks]
+
+
+def sweep(intervals):
+    # Sort-and-sweep over (start, end, item) tuples. Each interval is compared
+    # with the one reaching furthest so far, which finds every interval that
+    # overlaps something in O(n log n).
+    overlaps = []
+    furthest = None
+    for interval in sorted(intervals, key=lambda interval: (interval[0], -interval[1])):
+        if furthest is not None and interval[0] <= furthest[1]:
+            overlaps.append((interval[2], furthest[2]))
+            if interval[1] <= furthest[1]:
+                continue
+        furthest = interval
+    return overlaps
+
+
+class VpcPlan(object):
+    # The networks one VPC config asks for: its own block and one subnet per
+    # entry and zone. A pinned cidr_mask is the first zone's block; the other
+    # zones and the mask-only entries are allocated after the pinned blocks.
+
+    def __init__(self, environment, name, options):
+        self.environment = environment
+        self.name = name
+        self.path = ('vpc', name)
+        self.network = None
+        self.subnets = []
+        self.errors = []
+        self._plan(options)
+
+    def _error(self, path, message):
+        self.errors.append(ConfigError(self.path + path, message))
+
+    def _plan(self, options):
+        cidr = options.get('cidr', VPC_SPEC.defaults['cidr'])
+        if not isinstance(cidr, str):
+            return
+        try:
+            network = parse_cidr(cidr)
+        except CidrError as error:
+            self._error(('cidr',), str(error))
+            return
+        if not network.aligned:
+            self._error(('cidr',), f'{cidr} is not aligned to /{network.prefix}, '
+                                   f'the network is {Network(network.start, network.prefix)}')
+        self.network = network
+        zones = availability_zones(options)
+
+        pending = []
+        configuration = options.get('subnet_configuration')
+        for index, entry in enumerate(configuration if isinstance(configuration, (list, tuple)) else ()):
+            if not isinstance(entry, Mapping):
+                continue
+            for subnet_name, subnet in entry.items():
+                if not isinstance(subnet, Mapping) or 'cidr_mask' not in subnet:
+                    continue
+                path = ('subnet_configuration', index, subnet_name, 'cidr_mask')
+                try:
+                    prefix = mask_length(subnet['cidr_mask'])
+                    subnet_network = explicit_network(subnet['cidr_mask'])
+                except CidrError as error:
+                    self._error(path, str(error))
+                    continue
+                if prefix < network.prefix:
+                    self._error(path, f'/{prefix} is larger than the VPC cidr {cidr}')
+                    continue
+                if subnet_network is None:
+                    pending.append((path, subnet_name, prefix, zones))
+                    continue
+                if zones > 1:
+                    pending.append((path, subnet_name, prefix, zones - 1))
+                if not subnet_network.aligned:
+                    self._error(path, f'{subnet_network} is not aligned to /{prefix}, '
+                                      f'the network is {Network(subnet_network.start, prefix)}')
+                if not network.contains(subnet_network):
+                    self._error(path, f'{subnet_network} is outside the VPC cidr {cidr}')
+                self.subnets.append((path, subnet_name, subnet_network))
+
+        if pending:
+            reserved = [subnet_network for _path, _name, subnet_network in self.subnets]
+            allocated = iter(allocate(network, [prefix for _path, _name, prefix, count in pending
+                                                for _zone in range(count)], reserved))
+            for path, subnet_name, prefix, count in pending:
+                subnet_networks = [next(allocated) for _zone in range(count)]
+                if None in subnet_networks:
+                    self._error(path, f'no free /{prefix} left in {cidr} for {zones} availability zones')
+                self.subnets.extend((path, subnet_name, subnet_network)
+                                    for subnet_network in subnet_networks if subnet_network is not None)
+
+    def check_subnets(self):
+        intervals = [
+            (subnet_network.start, subnet_network.end, (path, subnet_name, subnet_network))
+            for path, subnet_name, subnet_network in self.subnets
+        ]
+        for (path, _name, subnet_network), (_other_path, other_name, other_network) in sweep(intervals):
+            self._error(path, f'{subnet_network} overlaps subnet {other_name} ({other_network})')
+        return self.errors
+
+
+class CidrPlanner(object):
+    # Plans every VPC of every environment and sweeps the subnets of each VPC,
+    # the VPC blocks of each environment and all VPC blocks together. VPCs overlapping in the
+    # same environment are errors. Across environments they are warnings (the
+    # stacks may target different accounts), except that the same VPC definition
+    # stamped into every environment is expected and not reported.
+
+    def __init__(self, environment_configs):
+        self.vpcs = []
+        for environment, configs in environment_configs.items():
+            vpcs = configs.get('vpc') if isinstance(configs, Mapping) else None
+            if not isinstance(vpcs, Mapping):
+                continue
+            for name, options in vpcs.items():
+                if isinstance(options, Mapping):
+                    self.vpcs.append(VpcPlan(environment, name, options))
+
+    def check(self, source_of=None):
+        # -> ({environment: [ConfigError]}, {environment: [ConfigError]})
+        errors = {}
+        warnings = {}
+        for vpc in self.vpcs:
+            for error in vpc.check_subnets():
+                errors.setdefault(vpc.environment, []).append(error)
+
+        by_environment = {}
+        for vpc in self.vpcs:
+            if vpc.network is not None:
+                by_environment.setdefault(vpc.environment, []).append((vpc.network.start, vpc.network.end, vpc))
+        for intervals in by_environment.values():
+            for vpc, other in sweep(intervals):
+                self._overlap(errors, vpc, other)
+        # one sweep over every environment; pairs within an environment were reported above
+        everything = [interval for intervals in by_environment.values() for interval in intervals]
+        for vpc, other in sweep(everything):
+            if vpc.environment != other.environment and not (
+                    vpc.name == other.name and vpc.network == other.network):
+                self._overlap(warnings, vpc, other)
+
+        if source_of is not None:
+            for environment, environment_errors in list(errors.items()) + list(warnings.items()):
+                for error in environment_errors:
+                    error.source = source_of(environment, error.path)
+        return errors, warnings
+
+    @staticmethod
+    def _overlap(found, vpc, other):
+        found.setdefault(vpc.environment, []).append(ConfigError(
+            vpc.path + ('cidr',),
+            f'{vpc.network} overlaps vpc {other.name} ({other.network}) in {other.environment}'))
+
+
+def check_cidrs(environment_configs, source_of=None):
+    planner = CidrPlanner(environment_configs)
+    errors, warnings = planner.check(source_of)
+    logger.debug('checked %d vpcs and %d subnets', len(planner.vpcs), sum(len(vpc.subnets) for vpc in planner.vpcs))
+    return errors, warnings
@@ -1,27 +1,91 @@
 import os
-from os import listdir, getcwd
+from os import listdir
 from os.path import isfile, join, dirname, isabs
+import concurrent.futures
 import yaml
 import glob
 import logging
+import contextlib
+from .cache import ConfigCache
+from .templates import TemplateEngine
+from .merge import MergeEngine
+from .frozen import Interner
+from .schemas import validate_configs
+from .cidr import check_cidrs
+from .tracing import span
+from .discovery import FileDiscovery, IgnorePatterns, DEFAULT_IGNORE_FILE
 
 logger = logging.getLogger(__name__)
 
+# libyaml's C loader is an order of magnitude faster than the pure-Python one
+# and produces the same objects for safe documents.
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# EKSDIVE_FREEZE_CONFIGS=1 compiles to immutable, interned config nodes
+FREEZE_ENV = 'EKSDIVE_FREEZE_CONFIGS'
+# EKSDIVE_CONFIG_CACHE=<dir> keeps compiled configs there for compilers given no cache_dir
+CONFIG_CACHE_ENV = 'EKSDIVE_CONFIG_CACHE'
+# EKSDIVE_PARSE_WORKERS=N parses config files in N processes for compilers given no
+# max_workers; 1 parses them serially
+PARSE_WORKERS_ENV = 'EKSDIVE_PARSE_WORKERS'
+
+
+def load_yaml_file(yaml_file):
+    try:
+        with open(yaml_file, "r") as stream:
+            return yaml.load(stream, Loader=YamlLoader)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'cannot find file {yaml_file} in {str(os.getcwd())}')
+
 
 class ConfigsCompiler(object):
 
     _magic_methods = []
+    # below this many files the pool start-up costs more than it saves; a file
+    # takes about 0.2 ms to parse, starting a process pool tens of ms
+    _parallel_threshold = 256
 
-    def __init__(self, **kwargs):
+    def __init__(self, max_workers=None, use_processes=True, cache_dir=None, parsed_files=None, base_path=None,
+                 freeze=None, interner=None, **kwargs):
 
-        self.base_path = os.getcwd()
+        # relative roots and files resolve against base_path, never the process
+        # cwd at compile time, so one process can compile for many callers
+        self.base_path = base_path or os.getcwd()
+        if max_workers is None and os.environ.get(PARSE_WORKERS_ENV):
+            max_workers = int(os.environ[PARSE_WORKERS_ENV])
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        if cache_dir is None:
+            cache_dir = os.environ.get(CONFIG_CACHE_ENV)
+        self._cache = ConfigCache(join(self.base_path, cache_dir)) if cache_dir else None
+        # path -> parsed document, kept across compiles by long-running callers
+        self.parsed_files = parsed_files
+        # compiled environments become frozen trees; pass one Interner to many
+        # compilers to store subtrees they have in common once
+        if freeze is None:
+            freeze = interner is not None or os.environ.get(FREEZE_ENV) == '1'
+        self.interner = (interner if interner is not None else Interner()) if freeze else None
+        self._configure_args = {}
+        self._ignore_file = None
+        self._bundle = None
+        # a bundle configure() opened from a file name, closed by close()
+        self._owned_bundle = None
         self.configs = {}
         self.variables = {}
+        self.mergers = {'configs': MergeEngine(), 'variables': MergeEngine()}
         self.environments = []
+        self.environment_overlays = {}
+        self.environment_configs = {}
+        self.environment_variables = {}
+        self.environment_mergers = {}
+        self._base = None
+        self._template_paths = []
         self._environment_files = []
         self._default_files = []
         self._common_files = []
         self._deploy_files = []
+        # files named in configure(); discovery adds to a copy of these on every compile
+        self._configured_files = {'environment': [], 'default': [], 'common': [], 'deploy': []}
         self._environment_files_root = None
         self._defaults_root = None
         self._common_files_root = None
@@ -39,14 +103,51 @@ class ConfigsCompiler(object):
                   deploy_files=None,
                   environments=None,
                   environments_root=None,
-                  environment_files=None
+                  environment_files=None,
+                  ignore_file=None,
+                  bundle=None
                   ):
 
-        self.environments = environments if environments else self.environments
+        self.close()
+        if bundle is not None:
+            # a bundle (file name or open Bundle) replaces every other argument
+            from .bundle import Bundle
+            owned = not isinstance(bundle, Bundle)
+            if owned:
+                bundle = Bundle.open(join(self.base_path, bundle))
+            self.base_path = bundle.root
+            self.configure(**bundle.compiler_arguments())
+            self._bundle = bundle
+            self._owned_bundle = bundle if owned else None
+            self._configure_args['bundle'] = bundle.digest
+            return
+        self._bundle = None
+        self._configure_args = {
+            'base_path': self.base_path,
+            'defaults_root': defaults_root,
+            'default_files': default_files,
+            'common_files_root': common_files_root,
+            'common_files': common_files,
+            'deploy_root': deploy_root,
+            'deploy_files': deploy_files,
+            'environments': environments,
+            'environments_root': environments_root,
+            'environment_files': environment_files,
+            'ignore_file': ignore_file,
+        }
+        self._ignore_file = ignore_file
+        if environments:
+            self._set_environments(environments)
         self._environment_files = [self.get_single_file(f) for f in environment_files] if environment_files else []
         self._default_files = [self.get_single_file(f) for f in default_files] if default_files else []
         self._common_files = [self.get_single_file(f) for f in common_files] if common_files else []
         self._deploy_files = [self.get_single_file(f) for f in deploy_files] if deploy_files else []
+        self._configured_files = {
+            'environment': list(self._environment_files),
+            'default': list(self._default_files),
+            'common': list(self._common_files),
+            'deploy': list(self._deploy_files),
+        }
         self._environment_files_root = self._format_dir_path(
             environments_root, '_environment_files_root') if environments_root else None
         self._defaults_root = self._format_dir_path(
@@ -56,24 +157,194 @@ class ConfigsCompiler(object):
         self._deploy_root = self._format_dir_path(
             deploy_root, '_deploy_root') if deploy_root else None
 
-        logger.debug(f"* * * * * * * * * * Setting Files * * * * * * * * * * * *")
-        logger.debug(f"\t environments {environments}")
-        logger.debug(f"\t environment files: {self._environment_files}")
-        logger.debug(f"\t default files {self._default_files}")
-        logger.debug(f"\t default root: {self._defaults_root}")
-        logger.debug(f"\t common files {self._common_files}")
-        logger.debug(f"\t common root: {self._common_files_root}")
-        logger.debug(f"\t deploy files {self._deploy_files}")
-        logger.debug(f"\t deploy root: {self._deploy_root}")
-        logger.debug(f"* * * * * * * * * * Setting Files * * * * * * * * * * * *")
+        logger.debug("* * * * * * * * * * Setting Files * * * * * * * * * * * *")
+        logger.debug("\t environments %s", environments)
+        logger.debug("\t environment files: %s", self._environment_files)
+        logger.debug("\t default files %s", self._default_files)
+        logger.debug("\t default root: %s", self._defaults_root)
+        logger.debug("\t common files %s", self._common_files)
+        logger.debug("\t common root: %s", self._common_files_root)
+        logger.debug("\t deploy files %s", self._deploy_files)
+        logger.debug("\t deploy root: %s", self._deploy_root)
+        logger.debug("* * * * * * * * * * Setting Files * * * * * * * * * * * *")
+
+    def close(self):
+        # unmaps a bundle opened from a file name; compiling from it afterwards fails
+        if self._owned_bundle is not None:
+            self._owned_bundle.close()
+            self._owned_bundle = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _set_environments(self, environments):
+        # environments are either plain names or {name: [variable files]} /
+        # {name: {'files': [...], 'overrides': {...}}} overlays
+        self.environments = []
+        self.environment_overlays = {}
+        for environment in environments:
+            if isinstance(environment, str):
+                self.environments.append(environment)
+                continue
+            for name, spec in environment.items():
+                if isinstance(spec, dict):
+                    files, overrides = spec.get('files') or [], spec.get('overrides') or {}
+                else:
+                    files, overrides = spec or [], {}
+                self.environments.append(name)
+                self.environment_overlays[name] = {
+                    'files': [self.get_single_file(f) for f in files],
+                    'overrides': overrides,
+                }
 
     def get_configs(self):
         return self.configs
 
-    def process_configs(self):
-        logger.debug(f"* * * * * * * * * * Retrieving files * * * * * * * * * * *")
-        self._get_files_by_directory_root()
-        logger.debug(f"* * * * * * * * * * Processing Configs * * * * * * * * * *")
+    def compile_base(self):
+        # defaults, common and deploy layers are compiled once; environments are
+        # applied on top of this base with forked merge engines so it never changes
+        overlay_files = {os.path.normpath(f) for overlay in self.environment_overlays.values() for f in overlay['files']}
+        self.process_configs(exclude_variable_files=overlay_files)
+        self.environment_configs = {}
+        self.environment_variables = {}
+        self.environment_mergers = {}
+        self._base = {
+            'configs': self.configs,
+            'variables': self.variables,
+            'template_paths': TemplateEngine.index(self.configs),
+        }
+        return self._base
+
+    def compile_environment(self, name, variable_files=None, overrides=None):
+        if self._base is None:
+            self.compile_base()
+        overlay = self.environment_overlays.get(name, {})
+        variable_files = overlay.get('files', []) if variable_files is None else variable_files
+        overrides = overlay.get('overrides', {}) if overrides is None else overrides
+
+        variables_merger = self.mergers['variables'].fork()
+        variables = self._base['variables']
+        for yaml_file, new_variables in zip(variable_files, self.parse_config_files(variable_files)):
+            variables = variables_merger.merge(variables, new_variables, source=yaml_file)
+
+        configs_merger = self.mergers['configs'].fork()
+        configs = configs_merger.merge(self._base['configs'], overrides, source=f'{name} overrides')
+        variables_merger.seal()
+        configs_merger.seal()
+        template_paths = self._base['template_paths']
+        if overrides:
+            template_paths = template_paths + TemplateEngine.index(overrides)
+        with span('variables', environment=name):
+            configs = TemplateEngine(variables).resolve_paths(configs, template_paths)
+        configs = self._freeze(configs, name)
+
+        self.environment_configs[name] = configs
+        self.environment_variables[name] = variables
+        self.environment_mergers[name] = {'configs': configs_merger, 'variables': variables_merger}
+        return configs
+
+    def compile_stack_configs(self, default_environment):
+        # environment name -> compiled configs, in build order
+        if self.environment_overlays:
+            self.compile_base()
+            self.compile_environments()
+            return {name: self.environment_configs.get(name, self.configs) for name in self.environments}
+        self.process_configs()
+        self.resolve_variables()
+        self.configs = self._freeze(self.configs, default_environment)
+        return {name: self.configs for name in self.environments or [default_environment]}
+
+    def _freeze(self, configs, environment):
+        if self.interner is None:
+            return configs
+        with span('freeze', environment=environment):
+            return self.interner.freeze(configs)
+
+    def dependency_graph(self, environment_names):
+        # input files behind each environment's compiled config and each of its
+        # construct keys; variable files count for every key holding a ${...}
+        template_paths = self._base['template_paths'] if self._base else self._template_paths
+        templated_keys = {path[0] for path in template_paths}
+        graph = {}
+        for name in environment_names:
+            mergers = self.environment_mergers.get(name, self.mergers)
+            configs = self.environment_configs.get(name, self.configs)
+            variable_files = mergers['variables'].sources_under()
+            overrides = self.environment_overlays.get(name, {}).get('overrides') or {}
+            environment_templated_keys = templated_keys.union(
+                path[0] for path in TemplateEngine.index(overrides))
+            constructs = {}
+            for key in configs:
+                files = mergers['configs'].sources_under((key,))
+                if key in environment_templated_keys:
+                    files |= variable_files
+                constructs[key] = sorted(files)
+            files = set(variable_files)
+            for construct_files in constructs.values():
+                files.update(construct_files)
+            graph[name] = {'files': sorted(files), 'constructs': constructs}
+        return graph
+
+    def validate(self, environment_configs):
+        errors = {}
+        for name, configs in environment_configs.items():
+            mergers = self.environment_mergers.get(name, self.mergers)
+            with span('validate', environment=name):
+                environment_errors = validate_configs(configs, source_of=mergers['configs'].source_of)
+            if environment_errors:
+                errors[name] = environment_errors
+        with span('cidr', environments=len(environment_configs)):
+            cidr_errors, cidr_warnings = check_cidrs(environment_configs, source_of=self._environment_source_of)
+        for name, environment_warnings in cidr_warnings.items():
+            for warning in environment_warnings:
+                logger.warning('%s: %s', name, warning)
+        for name, environment_errors in cidr_errors.items():
+            errors.setdefault(name, []).extend(environment_errors)
+        return errors
+
+    def _environment_source_of(self, environment, path):
+        return self.environment_mergers.get(environment, self.mergers)['configs'].source_of(path)
+
+    def compile_environments(self):
+        if self._base is None:
+            self.compile_base()
+        # one interner scope, so the subtrees environments share are frozen once
+        with self.interner.scope() if self.interner is not None else contextlib.nullcontext():
+            for name in self.environments:
+                self.compile_environment(name)
+        return self.environment_configs
+
+    def process_configs(self, exclude_variable_files=None):
+        # every call compiles from scratch, so a configured compiler can be reused
+        self.configs = {}
+        self.variables = {}
+        self.mergers = {'configs': MergeEngine(), 'variables': MergeEngine()}
+        self._template_paths = []
+        logger.debug("* * * * * * * * * * Retrieving files * * * * * * * * * * *")
+        with span('discovery'):
+            self._get_files_by_directory_root()
+        if exclude_variable_files:
+            self._environment_files = [
+                f for f in self._environment_files if f not in exclude_variable_files]
+        cache_key = None
+        if self._cache:
+            # a bundle's digest already covers every file in it
+            cache_key = self._cache.make_key(self._configure_args, {} if self._bundle else {
+                file_list: getattr(self, file_list) for file_list in (
+                    '_environment_files', '_default_files', '_common_files', '_deploy_files')
+            })
+            cached = self._cache.load(cache_key)
+            if cached is not None:
+                logger.info('loaded compiled configs from cache %s', cache_key)
+                self.configs = cached['configs']
+                self.variables = cached['variables']
+                self.mergers = {store: MergeEngine(origins) for store, origins in cached['origins'].items()}
+                return
+        logger.debug("* * * * * * * * * * Processing Configs * * * * * * * * * *")
         config_files = {
             '_environment_files': 'variables',
             '_default_files': 'configs',
@@ -82,161 +353,181 @@ class ConfigsCompiler(object):
         }
         for file_list, config_store in config_files.items():
             if getattr(self, file_list):
-                logger.debug(f'# # # # # # # # loading {file_list} to {config_store} # # # # # # # #')
+                logger.debug('# # # # # # # # loading %s to %s # # # # # # # #', file_list, config_store)
                 self.load_config_files(
                     getattr(self, file_list),
                     config_store
                 )
             else:
-                logger.debug(f"# # # # # # # # NO {file_list} files found # # # # # # # # ")
+                logger.debug("# # # # # # # # NO %s files found # # # # # # # # ", file_list)
+        for merger in self.mergers.values():
+            merger.seal()
+        if cache_key:
+            self._cache.store(cache_key, {
+                'configs': self.configs,
+                'variables': self.variables,
+                'origins': {store: merger.origins for store, merger in self.mergers.items()},
+            })
 
-    def process_variables(self, values):
-        if not self.variables:
-            logger.debug('No variables to process')
-            return
+    def source_of(self, path, store='configs'):
+        return self.mergers[store].source_of(path)
 
-        logger.debug('processing variables')
+    def process_variables(self, values):
+        if not isinstance(values, (str, dict, list)):
+            raise TypeError(f'Could not identify type of object when evaluating variables: {values}')
+        return TemplateEngine(self.variables).resolve(values)
 
-        if isinstance(values, str):
-            logger.debug(f'processing string variables {values}')
-            return self._replace_str_variables(values)
-        elif isinstance(values, dict):
-            logger.debug(f'processing dictionary variables {values}')
-            return self._replace_dict_variable(values)
-        elif isinstance(values, list):
-            logger.debug(f'processing list variables {values}')
-            return self._replace_list_variables(values)
-        raise TypeError(f'Could not identify type of object when evaluating variables: {values}')
+    def resolve_variables(self):
+        logger.debug('resolving variables in compiled configs')
+        with span('variables'):
+            self._template_paths = TemplateEngine.index(self.configs)
+            # merged configs share subtrees with the parsed files, so copy on the
+            # resolved paths instead of rendering in place
+            self.configs = TemplateEngine(self.variables).resolve_paths(self.configs, self._template_paths)
+        return self.configs
 
     def _format_dir_path(self, path, attribute):
         if isabs(path):
-            logger.info(f'setting {attribute} attribute to {path}')
+            logger.info('setting %s attribute to %s', attribute, path)
             new_path = dirname(path)
             return new_path
         else:
             new_path = os.path.join(self.base_path, path)
-            logger.info(f'setting {attribute} attribute to {new_path}')
+            logger.info('setting %s attribute to %s', attribute, new_path)
             return new_path
 
-    def _get_files_by_directory_root(self):
-        # logger.debug(f'deploy_root: {self._deploy_root}')
+    def input_files(self):
+        # every file a compile of the base reads, by kind, after discovery;
+        # environment overlay files are in environment_overlays
+        with span('discovery'):
+            self._get_files_by_directory_root()
+        return {
+            'environment': list(self._environment_files),
+            'default': list(self._default_files),
+            'common': list(self._common_files),
+            'deploy': list(self._deploy_files),
+        }
 
+    def _get_files_by_directory_root(self):
+        if self._bundle is not None:
+            # discovery already ran when the bundle was packed
+            for source_type, destination in (('environment', '_environment_files'), ('default', '_default_files'),
+                                             ('common', '_common_files'), ('deploy', '_deploy_files')):
+                setattr(self, destination, list(self._configured_files[source_type]))
+            return
         recursive_file_roots = [
-            {'source_attribute': self._environment_files_root,
-             'source_type': 'environment',
-             'destination_attribute': self._environment_files,
-             'directory_exclusions': None
-             },
-            {'source_attribute': self._defaults_root,
-             'source_type': 'default',
-             'destination_attribute': self._default_files,
-             'directory_exclusions': [
-                 self._deploy_root,
-                 self._environment_files_root,
-             ]},
-            {'source_attribute': self._common_files_root,
-             'source_type': 'common',
-             'destination_attribute': self._common_files,
-             'directory_exclusions': [
-                 self._deploy_root,
-                 self._environment_files_root,
-             ]},
-            {'source_attribute': self._deploy_root,
-             'source_type': 'deploy',
-             'destination_attribute': self._deploy_files,
-             'directory_exclusions': [
-                 self._common_files_root,
-                 self._defaults_root,
-                 self._environment_files_root
-             ]}
+            ('environment', self._environment_files_root, '_environment_files', None),
+            ('default', self._defaults_root, '_default_files', [
+                self._deploy_root,
+                self._environment_files_root,
+            ]),
+            ('common', self._common_files_root, '_common_files', [
+                self._deploy_root,
+                self._environment_files_root,
+            ]),
+            ('deploy', self._deploy_root, '_deploy_files', [
+                self._common_files_root,
+                self._defaults_root,
+                self._environment_files_root,
+            ]),
         ]
 
-        for dir_root in recursive_file_roots:
-            source = dir_root['source_attribute']
-            source_type = dir_root['source_type']
-            destination = dir_root['destination_attribute']
-            exclusions = [
-                item for item in dir_root['directory_exclusions'] if item] if dir_root.get(
-                'directory_exclusions', None) else None
-            logger.debug(f"\t source type: {source_type}")
-            logger.debug(f"\t source: {source}")
-            logger.debug(f"\t destination: {destination}")
+        discovery = FileDiscovery(ignore_patterns=self._load_ignore_patterns())
+        for source_type, source, _destination, exclusions in recursive_file_roots:
             if source:
-                logger.info(f'loading {source_type} files from {source}')
-                logger.debug(f'preparing exclusions: {exclusions}')
-                all_files_found = self.get_files_recursively(
-                        source,
-                        exclusions
-                    )
-                destination.extend(all_files_found)
+                logger.info('loading %s files from %s', source_type, source)
+                logger.debug('preparing exclusions: %s', exclusions)
+                discovery.add_bucket(source_type, source, exclusions)
             else:
-                logger.debug(f'no values found for {source_type}')
+                logger.debug('no values found for %s', source_type)
+
+        all_files_found = discovery.discover()
+        for source_type, _source, destination, _exclusions in recursive_file_roots:
+            setattr(self, destination, self._configured_files[source_type] + all_files_found.get(source_type, []))
+
+    def _load_ignore_patterns(self):
+        ignore_file = self._ignore_file
+        if not ignore_file:
+            default_ignore_file = join(self.base_path, DEFAULT_IGNORE_FILE)
+            ignore_file = default_ignore_file if isfile(default_ignore_file) else None
+        if not ignore_file:
+            return IgnorePatterns()
+        logger.info('loading ignore patterns from %s', ignore_file)
+        return IgnorePatterns.from_file(ignore_file)
 
     @staticmethod
     def get_files_recursively(base_dir, exclusions=None):
         # exclusions = [item for item in maybe_exclude if item] if maybe_exclude else None
-        logger.info(f'getting files recursively for directory {base_dir} with exclusions: {str(exclusions)}')
+        logger.info('getting files recursively for directory %s with exclusions: %s', base_dir, str(exclusions))
         all_file_list = glob.glob(base_dir + '/**/*.yaml', recursive=True)
-        logger.debug(f'initial file lists: {all_file_list}')
+        logger.debug('initial file lists: %s', all_file_list)
         if not exclusions:
-            logger.debug(f'no file exclusions, returning file list: {all_file_list}')
+            logger.debug('no file exclusions, returning file list: %s', all_file_list)
             filtered_list = all_file_list
         else:
-            logger.info(f'excluding the following directories: {exclusions}')
+            logger.info('excluding the following directories: %s', exclusions)
             filtered_list = [file for file in all_file_list if not any(match in file for match in exclusions)]
-            logger.debug(f'returning files: {filtered_list}')
+            logger.debug('returning files: %s', filtered_list)
         return filtered_list
 
-    @staticmethod
-    def get_single_file(file_name):
-        if file_name[0] != '/' or file_name[0] != '\\':
-            return join(getcwd(), file_name)
-        else:
-            return file_name
+    def get_single_file(self, file_name):
+        # join() keeps absolute paths as they are
+        return join(self.base_path, file_name)
 
     @staticmethod
     def get_directory_files(base_dir):
         return [f for f in listdir(base_dir) if isfile(join(base_dir, f)) and '.yaml' in f]
 
-    def _replace_str_variables(self, value: str) -> str:
-        if '${' not in value:
-            return value
-        left_delimiter = value.find('${')
-        extract = value[left_delimiter + 2]
-        if '${' in extract:
-            substring = extract[extract.find('${'):]
-            value = value.replace(substring, self._replace_str_variables(substring))
-        right_delimiter = value.find('}') + 1
-        string_to_replace = value[left_delimiter: right_delimiter]
-        variable_key = string_to_replace[2:-1]
-        try:
-            replacement_value = self.variables[variable_key]
-        except KeyError:
-            raise ValueError(f'Could not locate environment variable {variable_key} referenced.')
-        value = value.replace(string_to_replace, replacement_value)
-        return value
-
-    def _replace_dict_variable(self, config_dict):
-        for key, value in config_dict.items():
-            config_dict[key] = self.process_variables(value)
-        return config_dict
-
-    def _replace_list_variables(self, config_list):
-        for i in range(len(config_list)):
-            config_list[i] = self.process_variables(config_list[i])
-        return config_list
+    def parse_config_files(self, file_list):
+        # results come back in file_list order whatever order the workers finish in,
+        # so merging them afterwards is identical to the serial path
+        with span('parse', files=len(file_list)):
+            return self._parse_config_files(file_list)
+
+    def _parse_config_files(self, file_list):
+        if self.parsed_files is None:
+            return self._load_config_files(file_list)
+        missing = [yaml_file for yaml_file in file_list if yaml_file not in self.parsed_files]
+        if missing:
+            self.parsed_files.update(zip(missing, self._load_config_files(missing)))
+        return [self.parsed_files[yaml_file] for yaml_file in file_list]
+
+    def _load_config_files(self, file_list):
+        if self._bundle is not None:
+            return [self._bundle.load(yaml_file) for yaml_file in file_list]
+        workers = self.max_workers or os.cpu_count() or 1
+        if workers == 1 or len(file_list) < self._parallel_threshold:
+            return [load_yaml_file(yaml_file) for yaml_file in file_list]
+        # CSafeLoader holds the GIL while it builds the documents, so threads
+        # barely overlap; they are only for callers that cannot start processes
+        executor_class = (concurrent.futures.ProcessPoolExecutor if self.use_processes
+                          else concurrent.futures.ThreadPoolExecutor)
+        logger.debug('parsing %s files in %s workers with %s', len(file_list), workers, executor_class.__name__)
+        with executor_class(max_workers=workers) as executor:
+            chunksize = max(1, len(file_list) // (workers * 4))
+            return list(executor.map(load_yaml_file, file_list, chunksize=chunksize))
 
     def load_config_files(self, file_list, destination_store):
-        logger.debug(f'loading file list {file_list} to {destination_store}')
-        destination_dict = getattr(self, destination_store).copy()
-        for yaml_file in file_list:
-            try:
-                with open(yaml_file, "r") as stream:
-                    new_configs = yaml.safe_load(stream)
-                    logger.info(f" loading the following configs: {new_configs}")
-                    destination_dict = {**destination_dict, **new_configs}
-                    logger.info(f"combined dict: {destination_dict}")
-            except FileNotFoundError:
-                raise FileNotFoundError(f'cannot find file {yaml_file} in {str(os.getcwd())}')
-        logger.debug(f"saving combined dictionay to {destination_store}")
+        logger.debug('loading file list %s to %s', file_list, destination_store)
+        destination_dict = getattr(self, destination_store)
+        merger = self.mergers[destination_store]
+        parsed_files = self.parse_config_files(file_list)
+        with span('merge', store=destination_store, files=len(file_list)):
+            for yaml_file, new_configs in zip(file_list, parsed_files):
+                if not new_configs:
+                    logger.debug('%s is empty, skipping', yaml_file)
+                    continue
+                logger.debug("merging configs from %s", yaml_file)
+                destination_dict = merger.merge(destination_dict, new_configs, source=yaml_file)
+        logger.debug("saving combined dictionay to %s: %s", destination_store, destination_dict)
         setattr(self, destination_store, destination_dict)
+
+
+def compile_configs(compiler_arguments, default_environment, validate=True, **options):
+    # Reentrant one-shot compile: a private ConfigsCompiler per call, nothing
+    # shared between calls except the immutable compiled template cache.
+    # Returns (environment name -> configs, environment name -> [ConfigError]).
+    compiler = ConfigsCompiler(**options, **compiler_arguments)
+    environment_configs = compiler.compile_stack_configs(default_environment)
+    errors = compiler.validate(environment_configs) if validate else {}
+    return environment_configs, errors
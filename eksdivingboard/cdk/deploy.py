@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import random
+import fnmatch
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .parallel_synth import MANIFEST_FILE
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Deploys the stacks of a cloud assembly concurrently in dependency order.
+# A stack waits for the stacks its manifest entry depends on, for every stack
+# exporting a value its template imports with Fn::ImportValue, and for the
+# stacks an `after` rule puts before it; stacks matching one `serial` pattern
+# deploy one at a time. Failed deploys are retried with exponential backoff
+# and a stack that still fails skips everything that depends on it, while
+# unrelated stacks carry on.
+#
+#   graph = DeployGraph.from_assembly('cdk.out')
+#   report = DeployScheduler(graph, CdkCliExecutor('cdk.out'), concurrency=4,
+#                            rules=DeployRules(after={'prod*': ['staging*']})).run()
+#   print(report.summary())
+
+STACK_ARTIFACT = 'aws:cloudformation:stack'
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class DeployError(Exception):
+    # retryable=False for failures another attempt cannot fix, e.g. a rolled back template
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class DeployNode(object):
+    __slots__ = ('name', 'template_file', 'environment', 'dependencies', 'exports', 'imports')
+
+    def __init__(self, name, template_file=None, environment=None, dependencies=(), exports=(), imports=()):
+        self.name = name
+        self.template_file = template_file
+        self.environment = environment
+        self.dependencies = set(dependencies)
+        self.exports = set(exports)
+        self.imports = set(imports)
+
+    def __repr__(self):
+        return f'DeployNode({self.name!r})'
+
+
+def _template_references(template):
+    # (exported names, imported names) of a CloudFormation template; names
+    # built with Fn::Sub or Fn::Join cannot be matched and are skipped
+    exports = set()
+    for output in template.get('Outputs', {}).values():
+        name = output.get('Export', {}).get('Name')
+        if isinstance(name, str):
+            exports.add(name)
+    imports = set()
+    pending = [template.get('Resources', {}), template.get('Outputs', {}), template.get('Conditions', {})]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, dict):
+            value = node.get('Fn::ImportValue')
+            if isinstance(value, str):
+                imports.add(value)
+            pending.extend(node.values())
+        elif isinstance(node, list):
+            pending.extend(node)
+    return exports, imports
+
+
+class DeployGraph(object):
+
+    def __init__(self, nodes):
+        # name -> DeployNode, in the order the assembly lists the stacks
+        self.nodes = nodes
+        self._link_references()
+
+    @classmethod
+    def from_assembly(cls, outdir, stacks=None):
+        # stacks: names or fnmatch patterns to deploy, default every stack
+        with open(os.path.join(outdir, MANIFEST_FILE), 'r') as stream:
+            artifacts = json.load(stream).get('artifacts', {})
+        names = [name for name, artifact in artifacts.items() if artifact.get('type') == STACK_ARTIFACT]
+        if stacks:
+            unmatched = [pattern for pattern in stacks if not fnmatch.filter(names, pattern)]
+            if unmatched:
+                raise ValueError(f'no stacks in {outdir} match {", ".join(unmatched)}')
+            names = [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in stacks)]
+        nodes = {}
+        for name in names:
+            artifact = artifacts[name]
+            template_file = os.path.join(outdir, artifact['properties']['templateFile'])
+            with open(template_file, 'r') as stream:
+                exports, imports = _template_references(json.load(stream))
+            # dependencies outside the selection (assets, stacks not deployed now) are assumed in place
+            dependencies = [dependency for dependency in artifact.get('dependencies', []) if dependency in names]
+            nodes[name] = DeployNode(name, template_file, artifact.get('environment'), dependencies, exports, imports)
+        return cls(nodes)
+
+    def _link_references(self):
+        exporters = {}
+        for node in self.nodes.values():
+            for export in node.exports:
+                exporters[export] = node.name
+        for node in self.nodes.values():
+            node.dependencies.update(exporters[name] for name in node.imports if name in exporters)
+            node.dependencies.discard(node.name)
+
+    def copy(self):
+        return DeployGraph({name: DeployNode(node.name, node.template_file, node.environment, node.dependencies,
+                                             node.exports, node.imports)
+                            for name, node in self.nodes.items()})
+
+    def apply(self, rules):
+        # adds the ordering edges of a DeployRules
+        for node in self.nodes.values():
+            for pattern, before_patterns in rules.after.items():
+                if not fnmatch.fnmatchcase(node.name, pattern):
+                    continue
+                node.dependencies.update(
+                    name for name in self.nodes if name != node.name
+                    and any(fnmatch.fnmatchcase(name, before) for before in before_patterns))
+        self.order()
+        return self
+
+    def dependents(self):
+        dependents = {name: set() for name in self.nodes}
+        for node in self.nodes.values():
+            for dependency in node.dependencies:
+                dependents[dependency].add(node.name)
+        return dependents
+
+    def order(self):
+        # a topological order that keeps the assembly order among independent stacks
+        remaining = {name: set(node.dependencies) for name, node in self.nodes.items()}
+        ordered = []
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if not dependencies]
+            if not ready:
+                raise ValueError(f'stack dependencies form a cycle: {self._cycle(remaining)}')
+            for name in ready:
+                del remaining[name]
+                ordered.append(name)
+            for dependencies in remaining.values():
+                dependencies.difference_update(ready)
+        return ordered
+
+    @staticmethod
+    def _cycle(remaining):
+        name = next(iter(remaining))
+        seen = []
+        while name not in seen:
+            seen.append(name)
+            name = sorted(remaining[name])[0]
+        cycle = seen[seen.index(name):] + [name]
+        return ' -> '.join(cycle)
+
+
+class DeployRules(object):
+    # after: {stack pattern: [patterns of stacks that must deploy first]}
+    # serial: [patterns]; stacks matching the same pattern never deploy together
+
+    def __init__(self, after=None, serial=()):
+        self.after = dict(after or {})
+        self.serial = list(serial)
+
+    @classmethod
+    def parse(cls, after=(), serial=()):
+        # from command line values like 'prod*=staging*,qa*'
+        rules = {}
+        for rule in after:
+            pattern, _, before = rule.partition('=')
+            if not before:
+                raise ValueError(f'ordering rule {rule!r} must look like STACKS=STACKS_BEFORE')
+            rules.setdefault(pattern, []).extend(before.split(','))
+        return cls(rules, serial)
+
+    def serial_groups(self, name):
+        return [pattern for pattern in self.serial if fnmatch.fnmatchcase(name, pattern)]
+
+
+class DeployResult(object):
+    __slots__ = ('name', 'status', 'attempts', 'start', 'end', 'error')
+
+    def __init__(self, name, status=SKIPPED, attempts=0, start=None, end=None, error=None):
+        self.name = name
+        self.status = status
+        self.attempts = attempts
+        self.start = start
+        self.end = end
+        self.error = error
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.start is not None and self.end is not None else 0.0
+
+
+class DeployReport(object):
+
+    def __init__(self, graph, results, elapsed):
+        self.graph = graph
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return all(result.status == SUCCEEDED for result in self.results.values())
+
+    def failed(self):
+        return [name for name, result in self.results.items() if result.status == FAILED]
+
+    def skipped(self):
+        return [name for name, result in self.results.items() if result.status == SKIPPED]
+
+    def critical_path(self):
+        # the dependency chain with the longest total deploy time: no amount
+        # of concurrency finishes the deployment faster than this
+        longest = {}
+        for name in self.graph.order():
+            previous = max(self.graph.nodes[name].dependencies, key=lambda dependency: longest[dependency][0],
+                           default=None)
+            total = (longest[previous][0] if previous else 0.0) + self.results[name].duration
+            longest[name] = (total, previous)
+        if not longest:
+            return [], 0.0
+        name = max(longest, key=lambda key: longest[key][0])
+        total = longest[name][0]
+        path = []
+        while name:
+            path.append(name)
+            name = longest[name][1]
+        return path[::-1], total
+
+    def summary(self):
+        rows = [f"{'stack':<40} {'status':<10} {'attempts':>8} {'start s':>9} {'seconds':>9}"]
+        for name in self.graph.order():
+            result = self.results[name]
+            start = f'{result.start:.2f}' if result.start is not None else '-'
+            rows.append(f'{name:<40} {result.status:<10} {result.attempts:>8} {start:>9} {result.duration:>9.2f}')
+        path, total = self.critical_path()
+        serial = sum(result.duration for result in self.results.values())
+        rows.append(f'critical path {total:.2f}s: {" -> ".join(path)}')
+        rows.append(f'wall clock {self.elapsed:.2f}s for {serial:.2f}s of deploys')
+        for name in self.failed():
+            rows.append(f'failed {name}: {self.results[name].error}')
+        return '\n'.join(rows)
+
+
+class DeployScheduler(object):
+    # executor: any object with deploy(node) that raises on failure
+
+    def __init__(self, graph, executor, concurrency=4, rules=None, retries=2, backoff=5.0, max_backoff=120.0,
+                 jitter=0.1, sleep=time.sleep, clock=time.monotonic):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.rules = rules or DeployRules()
+        # the rules' edges go on a copy, the caller's graph is left as it was
+        self.graph = graph.copy().apply(self.rules)
+        self.executor = executor
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.sleep = sleep
+        self.clock = clock
+
+    def backoff_delay(self, attempt):
+        # seconds to wait after failed attempt number `attempt` (1-based)
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter)) if self.jitter else delay
+
+    def _deploy(self, node, result, origin):
+        result.start = self.clock() - origin
+        while True:
+            result.attempts += 1
+            try:
+                with span('deploy.stack', stack=node.name, attempt=result.attempts):
+                    self.executor.deploy(node)
+                result.status = SUCCEEDED
+                break
+            except Exception as error:
+                retryable = getattr(error, 'retryable', True)
+                if not retryable or result.attempts > self.retries:
+                    result.status = FAILED
+                    result.error = error
+                    logger.error('%s failed after %d attempts: %s', node.name, result.attempts, error)
+                    break
+                delay = self.backoff_delay(result.attempts)
+                logger.warning('%s attempt %d failed, retrying in %.1fs: %s', node.name, result.attempts, delay, error)
+                self.sleep(delay)
+        result.end = self.clock() - origin
+        return result
+
+    def run(self):
+        graph = self.graph
+        order = graph.order()
+        dependents = graph.dependents()
+        waiting = {name: set(graph.nodes[name].dependencies) for name in order}
+        results = {name: DeployResult(name) for name in order}
+        ready = [name for name in order if not waiting[name]]
+        busy_groups = set()
+        running = {}
+        origin = self.clock()
+
+        def skip(name):
+            # a failed stack takes everything downstream of it out of the run
+            for dependent in dependents[name]:
+                if dependent in waiting:
+                    del waiting[dependent]
+                    logger.warning('skipping %s, %s did not deploy', dependent, name)
+                    skip(dependent)
+
+        with span('deploy', stacks=len(order), concurrency=self.concurrency), \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='deploy') as pool:
+            while ready or running:
+                for name in list(ready):
+                    if len(running) >= self.concurrency:
+                        break
+                    groups = self.rules.serial_groups(name)
+                    if busy_groups.intersection(groups):
+                        continue
+                    ready.remove(name)
+                    del waiting[name]
+                    busy_groups.update(groups)
+                    logger.info('deploying %s', name)
+                    running[pool.submit(self._deploy, graph.nodes[name], results[name], origin)] = name
+                done, _pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    busy_groups.difference_update(self.rules.serial_groups(name))
+                    result = future.result()
+                    if result.status != SUCCEEDED:
+                        skip(name)
+                        continue
+                    for dependent in dependents[name]:
+                        if dependent in waiting:
+                            waiting[dependent].discard(name)
+                            if not waiting[dependent] and dependent not in ready:
+                                ready.append(dependent)
+                # keep assembly order among ready stacks
+                ready.sort(key=order.index)
+
+        report = DeployReport(graph, results, self.clock() - origin)
+        logger.info('deployed %d of %d stacks in %.1fs', len(order) - len(report.failed()) - len(report.skipped()),
+                    len(order), report.elapsed)
+        return report
+
+
+class CdkCliExecutor(object):
+    # Deploys one stack at a time from an assembly with the cdk toolkit;
+    # dependencies are already handled by the scheduler, hence --exclusively.
+
+    def __init__(self, outdir, cdk='cdk', extra_arguments=()):
+        self.outdir = outdir
+        self.cdk = cdk
+        self.extra_arguments = list(extra_arguments)
+
+    def deploy(self, node):
+        command = [self.cdk, 'deploy', '--app', self.outdir, '--exclusively', '--require-approval', 'never',
+                   *self.extra_arguments, node.name]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if completed.returncode != 0:
+            output = completed.stdout.strip().splitlines()
+            # throttling and concurrent-update errors go away on a later attempt; a rollback does not
+            retryable = not any('ROLLBACK' in line for line in output)
+            raise DeployError(output[-1] if output else f'cdk deploy exited {completed.returncode}', retryable)
+
+
+class FakeCloudFormation(object):
+    # In-process stand-in for CloudFormation, for tests and dry runs. Deploys
+    # take durations[name] seconds (default `duration`), the first
+    # failures[name] attempts fail with a retryable throttling error, and a
+    # template importing a value no deployed stack exports fails for good, the
+    # way CloudFormation rejects it.
+
+    def __init__(self, durations=None, duration=0.0, failures=None, sleep=time.sleep):
+        self.durations = dict(durations or {})
+        self.duration = duration
+        self.failures = dict(failures or {})
+        self.sleep = sleep
+        self.stacks = {}
+        self.exports = {}
+        self.deployed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def deploy(self, node):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failures = self.failures.get(node.name, 0)
+            if failures:
+                self.failures[node.name] = failures - 1
+        try:
+            self.sleep(self.durations.get(node.name, self.duration))
+            if failures:
+                raise DeployError(f'{node.name}: Rate exceeded (Service: CloudFormation, Status Code: 400)')
+            template = {}
+            if node.template_file:
+                with open(node.template_file, 'r') as stream:
+                    template = json.load(stream)
+            with self._lock:
+                missing = sorted(name for name in node.imports if name not in self.exports)
+                if missing:
+                    raise DeployError(f'{node.name}: ROLLBACK_COMPLETE, no export named {", ".join(missing)}',
+                                      retryable=False)
+                status = 'UPDATE_COMPLETE' if node.name in self.stacks else 'CREATE_COMPLETE'
+                self.stacks[node.name] = {'status': status, 'template': template}
+                self.exports.update((name, node.name) for name in node.exports)
+                self.deployed.append(node.name)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
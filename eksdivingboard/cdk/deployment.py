@@ -0,0 +1,91 @@
+import os
+from os.path import join, dirname, abspath, normpath, commonpath
+import logging
+from .compiler import load_yaml_file
+
+logger = logging.getLogger(__name__)
+
+
+class DeploymentDefinition(object):
+    # A deployment definition file such as deployments/example.yaml. Every path in
+    # it is relative to the directory holding the definition.
+
+    def __init__(self, definition_file, definition=None):
+        self.definition_file = abspath(definition_file)
+        self.base_path = dirname(self.definition_file)
+        self.definition = definition if definition is not None else (load_yaml_file(self.definition_file) or {})
+        self.name = os.path.splitext(os.path.basename(self.definition_file))[0]
+        self.environments = self._parse_environments(self.definition.get('environments') or [])
+
+    @classmethod
+    def load(cls, definition_file):
+        logger.info('loading deployment definition %s', definition_file)
+        return cls(definition_file)
+
+    def _path(self, relative_path):
+        return normpath(join(self.base_path, relative_path)) if relative_path else None
+
+    def _parse_environments(self, environments):
+        parsed = {}
+        for environment in environments:
+            if isinstance(environment, str):
+                parsed[environment] = {'files': [], 'overrides': {}}
+                continue
+            for name, spec in environment.items():
+                if isinstance(spec, dict):
+                    files = spec.get('files') or []
+                    overrides = spec.get('overrides') or {}
+                else:
+                    files = spec or []
+                    overrides = {}
+                parsed[name] = {'files': [self._path(f) for f in files], 'overrides': overrides}
+        return parsed
+
+    @property
+    def default_files_root(self):
+        return self._path(self.definition.get('default_files_root'))
+
+    @property
+    def common_files_root(self):
+        return self._path(self.definition.get('common_files_root'))
+
+    @property
+    def deploy_configs_root(self):
+        return self._path(self.definition.get('deploy_configs_root'))
+
+    @property
+    def environment_files_root(self):
+        if self.definition.get('environment_files_root'):
+            return self._path(self.definition['environment_files_root'])
+        # otherwise the directory holding every environment file, so deploy root
+        # discovery does not pick environment files up as configs
+        directories = {dirname(f) for spec in self.environments.values() for f in spec['files']}
+        if not directories:
+            return None
+        root = commonpath(list(directories))
+        if root in (self.deploy_configs_root, self.default_files_root, self.common_files_root):
+            return None
+        return root
+
+    def _files(self, key):
+        return [self._path(f) for f in self.definition.get(key) or []]
+
+    def compiler_arguments(self):
+        return {
+            'defaults_root': _as_dir(self.default_files_root),
+            'default_files': self._files('default_files'),
+            'common_files_root': _as_dir(self.common_files_root),
+            'common_files': self._files('common_files'),
+            'deploy_root': _as_dir(self.deploy_configs_root),
+            'deploy_files': self._files('deploy_files'),
+            'environments_root': _as_dir(self.environment_files_root),
+            'environments': [
+                {name: {'files': spec['files'], 'overrides': spec['overrides']}}
+                for name, spec in self.environments.items()
+            ],
+        }
+
+
+def _as_dir(path):
+    # ConfigsCompiler takes the dirname of absolute roots, so keep the trailing separator
+    return join(path, '') if path else None
@@ -0,0 +1,138 @@
+import os
+import fnmatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IGNORE_FILE = '.eksdiveignore'
+
+
+class IgnorePatterns(object):
+
+    def __init__(self, patterns=None):
+        self.dir_patterns = []
+        self.file_patterns = []
+        for pattern in patterns or []:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            if pattern.endswith('/'):
+                self.dir_patterns.append(pattern.rstrip('/'))
+            else:
+                self.dir_patterns.append(pattern)
+                self.file_patterns.append(pattern)
+
+    @classmethod
+    def from_file(cls, ignore_file):
+        with open(ignore_file, 'r') as stream:
+            return cls(stream.readlines())
+
+    @staticmethod
+    def _matches(patterns, name, relative_path):
+        return any(
+            fnmatch.fnmatchcase(relative_path, pattern) if '/' in pattern
+            else fnmatch.fnmatchcase(name, pattern)
+            for pattern in patterns
+        )
+
+    def ignores_dir(self, name, relative_path):
+        return bool(self.dir_patterns) and self._matches(self.dir_patterns, name, relative_path)
+
+    def ignores_file(self, name, relative_path):
+        return bool(self.file_patterns) and self._matches(self.file_patterns, name, relative_path)
+
+
+class FileDiscovery(object):
+    # Walks the union of all bucket roots once. Each bucket is a root plus the
+    # directories excluded from it; while descending we track which buckets are
+    # active for the current directory and prune any subtree where none are and
+    # no other root lies below it.
+
+    def __init__(self, extension='.yaml', ignore_patterns=None):
+        self.extension = extension
+        self.ignore_patterns = ignore_patterns or IgnorePatterns()
+        self._buckets = []
+
+    def add_bucket(self, name, root, exclusions=None):
+        if not root:
+            return
+        root = os.path.normpath(os.path.abspath(root))
+        excluded = {
+            os.path.normpath(os.path.abspath(exclusion)) for exclusion in exclusions or [] if exclusion
+        }
+        # a bucket is never excluded from its own root
+        excluded.discard(root)
+        self._buckets.append((name, root, excluded))
+
+    def discover(self):
+        found = {name: [] for name, _root, _excluded in self._buckets}
+        if not self._buckets:
+            return found
+
+        roots = {}
+        exclusions = {}
+        for name, root, excluded in self._buckets:
+            roots.setdefault(root, []).append(name)
+            for directory in excluded:
+                exclusions.setdefault(directory, []).append(name)
+
+        # every directory that leads to a root must be walked even if nothing is active in it
+        root_ancestors = set()
+        for root in roots:
+            parent = os.path.dirname(root)
+            while parent not in root_ancestors and parent != os.path.dirname(parent):
+                root_ancestors.add(parent)
+                parent = os.path.dirname(parent)
+
+        start_dirs = sorted(
+            root for root in roots
+            if not any(parent in roots for parent in self._parents(root))
+        )
+        logger.debug('discovering %s files under %s', self.extension, start_dirs)
+        visited = set()
+        for start_dir in start_dirs:
+            self._walk(start_dir, start_dir, frozenset(), roots, exclusions, root_ancestors, found, visited)
+        return found
+
+    @staticmethod
+    def _parents(path):
+        parent = os.path.dirname(path)
+        while parent != path:
+            yield parent
+            path, parent = parent, os.path.dirname(parent)
+
+    def _walk(self, directory, start_dir, active, roots, exclusions, root_ancestors, found, visited):
+        if directory in exclusions:
+            active = active.difference(exclusions[directory])
+        if directory in roots:
+            active = active.union(roots[directory])
+        if not active and directory not in root_ancestors:
+            return
+
+        real_path = os.path.realpath(directory)
+        if real_path in visited:
+            return
+        visited.add(real_path)
+
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            logger.debug('%s does not exist, skipping', directory)
+            return
+
+        sub_dirs = []
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            relative_path = os.path.relpath(entry.path, start_dir)
+            if entry.is_dir():
+                if not self.ignore_patterns.ignores_dir(entry.name, relative_path):
+                    sub_dirs.append(entry.path)
+            elif active and entry.name.endswith(self.extension):
+                if not self.ignore_patterns.ignores_file(entry.name, relative_path):
+                    for name in active:
+                        found[name].append(entry.path)
+
+        for sub_dir in sub_dirs:
+            self._walk(sub_dir, start_dir, active, roots, exclusions, root_ancestors, found, visited)
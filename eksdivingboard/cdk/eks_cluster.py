@@ -1,37 +1,69 @@
-from aws_cdk import (
-    aws_eks as eks,
-)
-
 import logging
+from .lazy import lazy_import
 from .structures import StackConstruct
+from .schemas import SCHEMAS
+from .registry import register_construct
+from functools import lru_cache
+
+eks = lazy_import('aws_cdk.aws_eks')
+ec2 = lazy_import('aws_cdk.aws_ec2')
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def accepted_versions():
+    return {
+        'v1.18': eks.KubernetesVersion.V1_18,
+        'v1.19': eks.KubernetesVersion.V1_19,
+        'v1.20': eks.KubernetesVersion.V1_20,
+        'v1.21': eks.KubernetesVersion.V1_21,
+    }
+
+
+@lru_cache(maxsize=None)
+def endpoint_access_for(name):
+    return getattr(eks.EndpointAccess, name.upper())
+
+
+@lru_cache(maxsize=None)
+def capacity_type_for(name):
+    return getattr(eks.DefaultCapacityType, name.upper())
+
+
+@register_construct('eks_cluster')
 class EKSCluster(StackConstruct):
+    schema = SCHEMAS['eks_cluster']
+
     def __init__(self, scope, configs):
         super().__init__(scope, configs)
         self.construct_type = 'eks'
         self.base_construct = eks.Cluster
 
-    def set_defaults(self):
-        self.configs.setdefault('version', 'v1.21')
+    @staticmethod
+    def set_defaults(options):
+        return {'version': 'v1.21', **options}
 
     @staticmethod
     def version(version):
-        accepted_versions = {
-            'v1.18': eks.KubernetesVersion.V1_18,
-            'v1.19': eks.KubernetesVersion.V1_19,
-            'v1.20': eks.KubernetesVersion.V1_20,
-            'v1.21': eks.KubernetesVersion.V1_21,
-        }
-
         try:
-            return accepted_versions[version[0:5]]
+            return accepted_versions()[version[0:5]]
 
         except KeyError:
             error_message = "".join([
                 f"the EKS cluster version {version} was not found. ",
-                f"Valid EKS platform versions are: {accepted_versions.keys()}.",
+                f"Valid EKS platform versions are: {accepted_versions().keys()}.",
             ])
             raise ValueError(error_message)
+
+    @staticmethod
+    def endpoint_access(name):
+        return endpoint_access_for(name)
+
+    @staticmethod
+    def default_capacity_type(name):
+        return capacity_type_for(name)
+
+    @staticmethod
+    def default_capacity_instance(instance_type):
+        return ec2.InstanceType(instance_type)
@@ -0,0 +1,343 @@
+import re
+import hashlib
+import logging
+from functools import lru_cache
+from .cidr import AGNOSTIC_AZS, DEFAULT_MAX_AZS, Network, mask_length, parse_cidr
+from .specs import VPC_SPEC
+
+logger = logging.getLogger(__name__)
+
+# Renders the CloudFormation the jsii constructs would synthesize for a compiled
+# environment config, in plain Python, for the options StackConstruct passes
+# through. Logical ids follow CDK's makeUniqueId so templates from either
+# backend are interchangeable for `cdk deploy` and `cdk diff`.
+
+HIDDEN_ID = 'Default'
+HIDDEN_FROM_HUMAN_ID = 'Resource'
+PATH_SEP = '/'
+HASH_LEN = 8
+MAX_HUMAN_LEN = 240
+MAX_ID_LEN = 255
+_NON_ALPHANUMERIC = re.compile('[^A-Za-z0-9]')
+
+
+class EmitterError(ValueError):
+    pass
+
+
+def _path_hash(components):
+    return hashlib.md5(PATH_SEP.join(components).encode('utf-8')).hexdigest()[:HASH_LEN].upper()
+
+
+def _remove_dupes(components):
+    deduped = []
+    for component in components:
+        if not deduped or not deduped[-1].endswith(component):
+            deduped.append(component)
+    return deduped
+
+
+@lru_cache(maxsize=65536)
+def _alphanumeric(component):
+    return _NON_ALPHANUMERIC.sub('', component)
+
+
+def make_unique_id(components):
+    # CDK's logical id for the construct path below a stack
+    components = [component for component in components if component != HIDDEN_ID]
+    if not components:
+        raise EmitterError('unable to calculate a unique id for an empty set of components')
+    if len(components) == 1:
+        candidate = _alphanumeric(components[0])
+        if len(candidate) <= MAX_ID_LEN:
+            return candidate
+    human = ''.join(
+        _alphanumeric(component)
+        for component in _remove_dupes(components) if component != HIDDEN_FROM_HUMAN_ID
+    )
+    return human[:MAX_HUMAN_LEN] + _path_hash(components)
+
+
+def ref(logical_id):
+    return {'Ref': logical_id}
+
+
+def get_att(logical_id, attribute):
+    return {'Fn::GetAtt': [logical_id, attribute]}
+
+
+class Template(object):
+    # Resources of one stack. Constructs are kept as a tree so the template and
+    # tree.json list them depth first in creation order, as CDK synthesizes them.
+
+    def __init__(self, stack_name, path_metadata=True):
+        self.stack_name = stack_name
+        self.path_metadata = path_metadata
+        self.resources = {}
+        self.tree = {}
+
+    def path(self, components):
+        return PATH_SEP.join((self.stack_name,) + tuple(components))
+
+    def add(self, components, resource_type, properties, depends_on=None):
+        logical_id = make_unique_id(list(components))
+        resource = {'Type': resource_type, 'Properties': properties}
+        if depends_on:
+            resource['DependsOn'] = sorted(depends_on)
+        return self.insert(components, logical_id, resource)
+
+    def insert(self, components, logical_id, resource):
+        # a rendered resource; Metadata carries the construct path when path_metadata is on
+        if logical_id in self.resources:
+            raise EmitterError(f'duplicate logical id {logical_id} for {self.path(components)}')
+        if self.path_metadata:
+            resource['Metadata'] = {'aws:cdk:path': self.path(components)}
+        self.resources[logical_id] = resource
+        children = self.tree
+        for component in components[:-1]:
+            children = children.setdefault(component, {}).setdefault('children', {})
+        children[components[-1]] = {'logical_id': logical_id}
+        return logical_id
+
+    def name_tag(self, components):
+        return {'Key': 'Name', 'Value': self.path(components)}
+
+    def logical_ids(self):
+        # construct path -> logical id, in synth order
+        return dict(self._logical_ids((), self.tree))
+
+    def _logical_ids(self, components, children):
+        for construct_id, node in children.items():
+            path = components + (construct_id,)
+            if 'logical_id' in node:
+                yield self.path(path), node['logical_id']
+            else:
+                yield from self._logical_ids(path, node.get('children', {}))
+
+    def render(self):
+        ordered = [logical_id for _path, logical_id in self._logical_ids((), self.tree)]
+        if not ordered:
+            return {}
+        return {'Resources': {logical_id: self.resources[logical_id] for logical_id in ordered}}
+
+    def construct_tree(self):
+        return self._construct_tree((), self.tree)
+
+    def _construct_tree(self, components, children):
+        nodes = {}
+        for construct_id, node in children.items():
+            path = components + (construct_id,)
+            entry = {'id': construct_id, 'path': self.path(path)}
+            if 'logical_id' in node:
+                resource = self.resources[node['logical_id']]
+                entry['attributes'] = {'aws:cdk:cloudformation:type': resource['Type']}
+            else:
+                entry['children'] = self._construct_tree(path, node.get('children', {}))
+            nodes[construct_id] = entry
+        return nodes
+
+
+SUBNET_TYPE_NAMES = {'public': 'Public', 'private': 'Private', 'isolated': 'Isolated'}
+DEFAULT_SUBNETS = [
+    {'Public': {'subnet_type': 'public'}},
+    {'Private': {'subnet_type': 'private'}},
+]
+MIN_SUBNET_MASK = 16
+MAX_SUBNET_MASK = 28
+VPC_OPTIONS = frozenset((
+    'cidr', 'max_azs', 'nat_gateways', 'subnet_configuration',
+    'enable_dns_hostnames', 'enable_dns_support', 'default_instance_tenancy', 'vpc_name',
+))
+
+
+def availability_zone(index):
+    return {'Fn::Select': [index, {'Fn::GetAZs': ''}]}
+
+
+def _subnet_configurations(configuration):
+    # mirrors AwsVpc.subnet_configuration: only name, type and mask reach ec2.Vpc
+    subnets = []
+    for entry in configuration:
+        for name, options in entry.items():
+            options = options or {}
+            subnet_type = options.get('subnet_type')
+            if subnet_type not in SUBNET_TYPE_NAMES:
+                raise EmitterError(f'subnet {name} needs a subnet_type of {", ".join(SUBNET_TYPE_NAMES)}')
+            mask = options.get('cidr_mask')
+            subnets.append((name, subnet_type, mask_length(mask) if mask is not None else None))
+    return subnets
+
+
+def _nat_gateway_count(requested, subnets, zones):
+    has_private = any(subnet_type == 'private' for _name, subnet_type, _mask in subnets)
+    has_public = any(subnet_type == 'public' for _name, subnet_type, _mask in subnets)
+    count = min(requested, zones) if requested is not None else (zones if has_private else 0)
+    if count == 0 and has_private:
+        raise EmitterError("If you do not want NAT gateways (natGateways=0), make sure you don't configure "
+                           "any PRIVATE subnets in 'subnetConfiguration' (make them PUBLIC or ISOLATED instead)")
+    if count > 0 and not has_public:
+        raise EmitterError("If you configure PRIVATE subnets in 'subnetConfiguration', "
+                           "you must also configure PUBLIC subnets to put the NAT gateways into")
+    return count
+
+
+class _NetworkBuilder(object):
+    # ec2.Vpc's NetworkBuilder: aligned blocks handed out in order from the VPC cidr
+
+    def __init__(self, network):
+        self.network = network
+        self.next_address = network.start
+
+    def add(self, mask, count):
+        if not MIN_SUBNET_MASK <= mask <= MAX_SUBNET_MASK:
+            raise EmitterError(f'x.x.x.x/{mask} is not a valid network mask')
+        size = 1 << (32 - mask)
+        address = self.next_address
+        blocks = []
+        for _ in range(count):
+            address = (address + size - 1) & ~(size - 1)
+            blocks.append(Network(address, mask))
+            address += size
+        if address - 1 > self.network.end:
+            raise EmitterError(f'{count} of /{mask} exceeds remaining space of {self.network}')
+        self.next_address = address
+        return blocks
+
+    def mask_for_remaining(self, count):
+        size = (self.network.end - self.next_address + 1) // count
+        if size <= 0:
+            raise EmitterError(f'no space left in {self.network} for {count} more subnets')
+        return 32 - (size.bit_length() - 1)
+
+
+def emit_vpc(template, construct_id, options):
+    unsupported = sorted(set(options) - VPC_OPTIONS)
+    if unsupported:
+        raise EmitterError(f'vpc {construct_id} uses options the Python backend does not render: '
+                           f'{", ".join(unsupported)}')
+    network = parse_cidr(options.get('cidr', VPC_SPEC.defaults['cidr']))
+    zones = min(options.get('max_azs', DEFAULT_MAX_AZS), AGNOSTIC_AZS)
+    subnets = _subnet_configurations(options.get('subnet_configuration') or DEFAULT_SUBNETS)
+    nat_gateways = _nat_gateway_count(options.get('nat_gateways'), subnets, zones)
+
+    vpc_path = (construct_id,)
+    # vpc_name replaces the path in the Name tag of the VPC-level resources only;
+    # subnet resources keep their own path
+    vpc_name_tag = template.name_tag(vpc_path)
+    if options.get('vpc_name'):
+        vpc_name_tag = {'Key': 'Name', 'Value': options['vpc_name']}
+    vpc_id = template.add(vpc_path + ('Resource',), 'AWS::EC2::VPC', {
+        'CidrBlock': str(network),
+        'EnableDnsHostnames': options.get('enable_dns_hostnames', True),
+        'EnableDnsSupport': options.get('enable_dns_support', True),
+        'InstanceTenancy': options.get('default_instance_tenancy', 'default'),
+        'Tags': [vpc_name_tag],
+    })
+
+    builder = _NetworkBuilder(network)
+    created = []
+    # subnets without a mask share whatever space the masked ones leave
+    remaining = [subnet for subnet in subnets if subnet[2] is None]
+    ordered = [subnet for subnet in subnets if subnet[2] is not None]
+    remaining_mask = None
+    for name, subnet_type, mask in ordered + remaining:
+        if mask is None:
+            if remaining_mask is None:
+                remaining_mask = builder.mask_for_remaining(len(remaining) * zones)
+            mask = remaining_mask
+        for zone, block in enumerate(builder.add(mask, zones)):
+            subnet_path = vpc_path + (f'{name}Subnet{zone + 1}',)
+            subnet_id = template.add(subnet_path + ('Subnet',), 'AWS::EC2::Subnet', {
+                'CidrBlock': str(block),
+                'VpcId': ref(vpc_id),
+                'AvailabilityZone': availability_zone(zone),
+                'MapPublicIpOnLaunch': subnet_type == 'public',
+                'Tags': [
+                    {'Key': 'aws-cdk:subnet-name', 'Value': name},
+                    {'Key': 'aws-cdk:subnet-type', 'Value': SUBNET_TYPE_NAMES[subnet_type]},
+                    template.name_tag(subnet_path),
+                ],
+            })
+            route_table_id = template.add(subnet_path + ('RouteTable',), 'AWS::EC2::RouteTable', {
+                'VpcId': ref(vpc_id),
+                'Tags': [template.name_tag(subnet_path)],
+            })
+            template.add(subnet_path + ('RouteTableAssociation',), 'AWS::EC2::SubnetRouteTableAssociation', {
+                'RouteTableId': ref(route_table_id),
+                'SubnetId': ref(subnet_id),
+            })
+            created.append((subnet_path, subnet_type, zone, subnet_id, route_table_id))
+
+    public = [subnet for subnet in created if subnet[1] == 'public']
+    if not public:
+        return
+    gateway_id = template.add(vpc_path + ('IGW',), 'AWS::EC2::InternetGateway', {
+        'Tags': [vpc_name_tag],
+    })
+    attachment_id = template.add(vpc_path + ('VPCGW',), 'AWS::EC2::VPCGatewayAttachment', {
+        'VpcId': ref(vpc_id),
+        'InternetGatewayId': ref(gateway_id),
+    })
+    for subnet_path, _type, _zone, _subnet_id, route_table_id in public:
+        template.add(subnet_path + ('DefaultRoute',), 'AWS::EC2::Route', {
+            'RouteTableId': ref(route_table_id),
+            'DestinationCidrBlock': '0.0.0.0/0',
+            'GatewayId': ref(gateway_id),
+        }, depends_on=[attachment_id])
+
+    # NatProvider.gateway(): one gateway in each of the first public subnets, and
+    # every private subnet routes through its zone's gateway or, failing that,
+    # the others in turn
+    gateways = {}
+    for subnet_path, _type, zone, subnet_id, _route_table_id in public[:nat_gateways]:
+        eip_id = template.add(subnet_path + ('EIP',), 'AWS::EC2::EIP', {
+            'Domain': 'vpc',
+            'Tags': [template.name_tag(subnet_path)],
+        })
+        gateways.setdefault(zone, template.add(subnet_path + ('NATGateway',), 'AWS::EC2::NatGateway', {
+            'SubnetId': ref(subnet_id),
+            'AllocationId': get_att(eip_id, 'AllocationId'),
+            'Tags': [template.name_tag(subnet_path)],
+        }))
+    turn = 0
+    for subnet_path, subnet_type, zone, _subnet_id, route_table_id in created:
+        if subnet_type != 'private':
+            continue
+        nat_gateway_id = gateways.get(zone)
+        if nat_gateway_id is None:
+            nat_gateway_id = list(gateways.values())[turn % len(gateways)]
+            turn += 1
+        template.add(subnet_path + ('DefaultRoute',), 'AWS::EC2::Route', {
+            'RouteTableId': ref(route_table_id),
+            'DestinationCidrBlock': '0.0.0.0/0',
+            'NatGatewayId': ref(nat_gateway_id),
+        })
+
+
+def emit_eks_cluster(template, construct_id, options):
+    # EKSCluster never calls build(), so the jsii backend synthesizes nothing
+    # for it either; kept so eks_cluster configs are accepted by this backend.
+    return None
+
+
+EMITTERS = {
+    'vpc': emit_vpc,
+    'eks_cluster': emit_eks_cluster,
+}
+
+
+def emit_stack(stack_name, configs, path_metadata=True, fragments=None):
+    # fragments: a FragmentCache, so constructs already rendered with the same
+    # options are copied in instead of rendered again
+    template = Template(stack_name, path_metadata)
+    for key, constructs in configs.items():
+        emitter = EMITTERS.get(key)
+        if emitter is None:
+            raise EmitterError(f'the Python backend cannot render {key}, supported keys are {sorted(EMITTERS)}')
+        for construct_id, options in constructs.items():
+            if fragments is not None:
+                fragments.emit(template, key, emitter, construct_id, options or {})
+            else:
+                emitter(template, construct_id, options or {})
+    logger.debug('emitted %d resources for %s', len(template.resources), stack_name)
+    return template
@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from importlib import metadata
+from .emitter import PATH_SEP, make_unique_id
+from .frozen import json_default, thaw
+from .parallel_synth import MANIFEST_FILE
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Memoizes the CloudFormation a construct renders to. The same VPC shape is
+# built for many environments and deployments; a fragment holds its resources
+# once, with logical ids and construct paths relative to the construct, and is
+# copied into another stack by recomputing the logical ids for the new path and
+# rewriting every Ref, Fn::GetAtt and DependsOn to match.
+#
+# Fragments are keyed by a hash of the normalized options, the construct class,
+# the backend (python, or jsii with the aws-cdk.core version) and the construct
+# code, kept in an LRU in memory and optionally in a directory shared between
+# runs. The python backend fills the cache as it renders.
+#
+# With jsii a hit replaces the construct with plain CfnResources (and its
+# Outputs and Parameters), and a miss builds it as usual and is read back from
+# the assembly by harvest() after the synth. A hit is not the construct's own
+# class, so only construct types listed in jsii_constructs use it: ones that
+# create nothing outside their own scope and whose object no other construct
+# uses. That is vpc, as long as its options name none of
+# AwsVpc.fragment_excluded_options; eks_cluster passes its Vpc to eks.Cluster.
+
+FRAGMENT_CACHE_ENV = 'EKSDIVE_FRAGMENT_CACHE'
+# comma separated config keys replacing JSII_CONSTRUCTS, empty for none
+FRAGMENT_CONSTRUCTS_ENV = 'EKSDIVE_FRAGMENT_CONSTRUCTS'
+FRAGMENT_VERSION = 2
+DEFAULT_MAXSIZE = 1024
+# config keys of the construct types a jsii synth may replace with a fragment
+JSII_CONSTRUCTS = frozenset({'vpc'})
+SECTIONS = ('Resources', 'Outputs', 'Parameters')
+# construct paths in a stored fragment start with this instead of <stack>/<construct id>
+CANONICAL_PREFIX = '{stack}/{construct}'
+_PLACEHOLDERS = re.compile(r'"\{construct\}(\d+)"|"\{stack\}/\{construct\}(?=["/])')
+_ATTRIBUTES = ('Properties', 'DependsOn', 'Condition', 'DeletionPolicy', 'UpdateReplacePolicy', 'UpdatePolicy',
+               'CreationPolicy')
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    from .incremental import code_fingerprint
+    return code_fingerprint()
+
+
+@lru_cache(maxsize=None)
+def library_version(backend):
+    if backend == 'python':
+        return 'python'
+    try:
+        return f'{backend}:{metadata.version("aws-cdk.core")}'
+    except metadata.PackageNotFoundError:
+        return f'{backend}:unknown'
+
+
+def fragment_key(config_key, construct_class, options, backend='python', environment=None):
+    payload = json.dumps([FRAGMENT_VERSION, library_version(backend), code_version(), config_key, construct_class,
+                          environment, options], sort_keys=True, separators=(',', ':'), default=json_default)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _remap(value, logical_ids, old_prefix, new_prefix):
+    # copy of a rendered value with logical ids and construct paths moved to another construct
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if 'Ref' in value and value['Ref'] in logical_ids:
+                return {'Ref': logical_ids[value['Ref']]}
+            if 'Fn::GetAtt' in value and value['Fn::GetAtt'][0] in logical_ids:
+                return {'Fn::GetAtt': [logical_ids[value['Fn::GetAtt'][0]]] + list(value['Fn::GetAtt'][1:])}
+        return {key: _remap(item, logical_ids, old_prefix, new_prefix) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_remap(item, logical_ids, old_prefix, new_prefix) for item in value]
+    if isinstance(value, str):
+        if value == old_prefix or value.startswith(old_prefix + PATH_SEP):
+            return new_prefix + value[len(old_prefix):]
+    return value
+
+
+def _remap_resource(resource, logical_ids, old_prefix, new_prefix):
+    remapped = _remap(resource, logical_ids, old_prefix, new_prefix)
+    depends_on = resource.get('DependsOn')
+    if isinstance(depends_on, str):
+        remapped['DependsOn'] = logical_ids.get(depends_on, depends_on)
+    elif depends_on:
+        remapped['DependsOn'] = [logical_ids.get(logical_id, logical_id) for logical_id in depends_on]
+    return remapped
+
+
+class Fragment(object):
+    # entries: [(components below the construct, logical id, element, section)]
+    # in synth order, section being one of SECTIONS; logical ids are the
+    # placeholders {construct}0, {construct}1... and construct paths start with
+    # CANONICAL_PREFIX. Applying it is one substitution over the encoded
+    # elements and one json.loads.
+    __slots__ = ('entries', '_encoded', '_logical_ids')
+
+    def __init__(self, entries):
+        self.entries = entries
+        self._encoded = json.dumps([element for _components, _logical_id, element, _section in entries])
+        # construct path -> logical ids; they do not depend on the stack name
+        self._logical_ids = {}
+
+    @classmethod
+    def capture(cls, stack_name, construct_path, entries):
+        # entries as rendered in stack_name for the construct at construct_path
+        canonical = {logical_id: f'{{construct}}{index}' for index, (_components, logical_id, _element, _section)
+                     in enumerate(entries)}
+        prefix = PATH_SEP.join((stack_name, construct_path))
+        captured = []
+        for components, logical_id, element, section in entries:
+            if section == 'Resources':
+                element = _remap_resource(
+                    {'Type': element['Type'], **{key: element[key] for key in _ATTRIBUTES if key in element}},
+                    canonical, prefix, CANONICAL_PREFIX)
+            else:
+                element = _remap(element, canonical, prefix, CANONICAL_PREFIX)
+            captured.append((tuple(components), canonical[logical_id], element, section))
+        return cls(captured)
+
+    def logical_ids(self, construct_path):
+        logical_ids = self._logical_ids.get(construct_path)
+        if logical_ids is None:
+            base = construct_path.split(PATH_SEP)
+            logical_ids = [make_unique_id(base + list(components)) for components, _id, _element, _section
+                           in self.entries]
+            self._logical_ids[construct_path] = logical_ids
+        return logical_ids
+
+    def apply(self, stack_name, construct_path):
+        # (components below the stack, logical id, element, section) for the
+        # construct at construct_path in stack_name; a new copy every call
+        base = tuple(construct_path.split(PATH_SEP))
+        logical_ids = self.logical_ids(construct_path)
+        prefix = json.dumps(PATH_SEP.join((stack_name, construct_path)))[:-1]
+
+        def substitute(match):
+            index = match.group(1)
+            return f'"{logical_ids[int(index)]}"' if index is not None else prefix
+
+        elements = json.loads(_PLACEHOLDERS.sub(substitute, self._encoded))
+        return [
+            (base + components, logical_ids[index], element, section)
+            for index, ((components, _logical_id, _element, section), element)
+            in enumerate(zip(self.entries, elements))
+        ]
+
+    def to_json(self):
+        return [[list(components), logical_id, element, section]
+                for components, logical_id, element, section in self.entries]
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls([(tuple(components), logical_id, element, section)
+                    for components, logical_id, element, section in payload])
+
+
+class FragmentCache(object):
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, directory=None, jsii_constructs=JSII_CONSTRUCTS):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.jsii_constructs = frozenset(jsii_constructs)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # (stack name, construct id, key) built by jsii this run, for harvest()
+        self.pending = []
+        self._fragments = OrderedDict()
+        # id(options) -> (options, config key, fragment key), at most maxsize of them
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, environ=os.environ):
+        # EKSDIVE_FRAGMENT_CACHE=1 for memory only, or a directory to share fragments between runs
+        value = environ.get(FRAGMENT_CACHE_ENV)
+        if not value:
+            return None
+        constructs = environ.get(FRAGMENT_CONSTRUCTS_ENV)
+        if constructs is None:
+            constructs = JSII_CONSTRUCTS
+        else:
+            constructs = {key.strip() for key in constructs.split(',') if key.strip()}
+        return cls(directory=None if value == '1' else value, jsii_constructs=constructs)
+
+    def _file_name(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+        if self.directory:
+            try:
+                with open(self._file_name(key), 'r') as stream:
+                    fragment = Fragment.from_json(json.load(stream))
+            except (FileNotFoundError, ValueError):
+                fragment = None
+            if fragment is not None:
+                self._remember(key, fragment)
+                with self._lock:
+                    self.disk_hits += 1
+                return fragment
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, fragment):
+        self._remember(key, fragment)
+        if self.directory:
+            file_name = self._file_name(key)
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+            descriptor, staging = tempfile.mkstemp(prefix='.fragment-', dir=os.path.dirname(file_name))
+            with os.fdopen(descriptor, 'w') as stream:
+                json.dump(fragment.to_json(), stream)
+            os.replace(staging, file_name)
+
+    def _remember(self, key, fragment):
+        with self._lock:
+            self._fragments[key] = fragment
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.maxsize:
+                self._fragments.popitem(last=False)
+
+    def emit(self, template, config_key, emitter, construct_id, options):
+        # emit_stack's path: copy the construct in from its fragment, or render it and keep one
+        # compiled configs share option nodes between environments, so most lookups skip hashing
+        key = self._options_key(options, config_key)
+        if key is None:
+            key = fragment_key(config_key, emitter.__name__, thaw(options))
+            self._remember_key(options, config_key, key)
+        fragment = self.get(key)
+        if fragment is None:
+            scratch = type(template)(template.stack_name, path_metadata=False)
+            emitter(scratch, construct_id, options)
+            fragment = Fragment.capture(template.stack_name, construct_id, [
+                (tuple(path.split(PATH_SEP)[2:]), logical_id, scratch.resources[logical_id], 'Resources')
+                for path, logical_id in scratch.logical_ids().items()
+            ])
+            self.put(key, fragment)
+        # the python emitter only renders resources
+        for components, logical_id, resource, _section in fragment.apply(template.stack_name, construct_id):
+            template.insert(components, logical_id, resource)
+
+    def _options_key(self, options, config_key):
+        with self._lock:
+            memo = self._keys.get(id(options))
+            if memo is not None and memo[0] is options and memo[1] == config_key:
+                self._keys.move_to_end(id(options))
+                return memo[2]
+        return None
+
+    def _remember_key(self, options, config_key, key):
+        # the memo holds options, so its id is not reused while it is in there
+        with self._lock:
+            self._keys[id(options)] = (options, config_key, key)
+            self._keys.move_to_end(id(options))
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def build(self, construct, construct_id, options):
+        # StackConstruct's path under jsii: the CfnResources, Outputs and
+        # Parameters of a cached fragment, or None after noting the construct
+        # for harvest(); always None for types not in jsii_constructs
+        if construct.construct_type not in self.jsii_constructs:
+            return None
+        if not construct.fragment_excluded_options.isdisjoint(options):
+            return None
+        from aws_cdk import core
+        stack = core.Stack.of(construct.scope)
+        key = fragment_key(construct.construct_type, type(construct).__name__, thaw(construct.set_defaults(options)),
+                           'jsii', stack.environment)
+        fragment = self.get(key)
+        if fragment is None:
+            self.pending.append((stack.stack_name, _relative_path(stack, construct.scope, construct_id), key))
+            return None
+        root = core.Construct(construct.scope, construct_id)
+        stack_name, construct_path = stack.stack_name, _relative_path(stack, construct.scope, construct_id)
+        included = {}
+        for components, logical_id, element, section in fragment.apply(stack_name, construct_path):
+            if section != 'Resources':
+                included.setdefault(section, {})[logical_id] = element
+                continue
+            resource = element
+            parent = root
+            for component in components[len(construct_path.split(PATH_SEP)):-1]:
+                parent = parent.node.try_find_child(component) or core.Construct(parent, component)
+            cfn_resource = core.CfnResource(parent, components[-1], type=resource['Type'],
+                                            properties=resource.get('Properties'))
+            cfn_resource.override_logical_id(logical_id)
+            for attribute, value in resource.items():
+                if attribute not in ('Type', 'Properties'):
+                    cfn_resource.add_override(attribute, value)
+        if included:
+            # merged into the template as they are; their logical ids are already the construct's
+            core.CfnInclude(root, 'FragmentOutputs', template=included)
+        return root
+
+    def harvest(self, outdir):
+        # after a jsii synth: keeps a fragment for every construct built on a miss
+        if not self.pending:
+            return 0
+        with open(os.path.join(outdir, MANIFEST_FILE), 'r') as stream:
+            artifacts = json.load(stream).get('artifacts', {})
+        templates = {}
+        harvested = 0
+        with span('fragments.harvest', constructs=len(self.pending)):
+            for stack_name, construct_path, key in self.pending:
+                artifact = artifacts.get(stack_name)
+                if artifact is None:
+                    continue
+                if stack_name not in templates:
+                    with open(os.path.join(outdir, artifact['properties']['templateFile']), 'r') as stream:
+                        template = json.load(stream)
+                    # logical id -> (element, section); CfnOutputs and CfnParameters carry logical ids too
+                    templates[stack_name] = {logical_id: (element, section) for section in SECTIONS
+                                             for logical_id, element in template.get(section, {}).items()}
+                elements = templates[stack_name]
+                prefix = f'/{stack_name}/{construct_path}/'
+                entries = [
+                    (tuple(path[len(prefix):].split(PATH_SEP)), entry['data']) + elements[entry['data']]
+                    for path, entries in artifact.get('metadata', {}).items() if path.startswith(prefix)
+                    for entry in entries
+                    if entry.get('type') == 'aws:cdk:logicalId' and entry['data'] in elements
+                ]
+                if entries:
+                    self.put(key, Fragment.capture(stack_name, construct_path, entries))
+                    harvested += 1
+        self.pending = []
+        logger.info('kept %d construct fragments from %s', harvested, outdir)
+        return harvested
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'fragments': len(self._fragments)}
+
+
+def _relative_path(stack, scope, construct_id):
+    # construct path below the stack, e.g. 'vpc' or 'nested/vpc'
+    scope_path = scope.node.path
+    stack_path = stack.node.path
+    relative = scope_path[len(stack_path):].strip(PATH_SEP)
+    return PATH_SEP.join(part for part in (relative, construct_id) if part)
@@ -0,0 +1,317 @@
+import sys
+import keyword
+import logging
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from .schemas import SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+# Immutable, hashable compiled configs. Mappings become FrozenDicts, or slotted
+# records when they hold the options of a known construct, lists become tuples
+# and strings are interned. An Interner stores structurally identical subtrees
+# once, so a fleet of environments sharing most of their settings shares the
+# nodes too, and frozen trees can be handed to any number of threads.
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class FrozenDict(Mapping):
+    __slots__ = ('_items', '_hash')
+
+    def __init__(self, items=()):
+        object.__setattr__(self, '_items', dict(items))
+        object.__setattr__(self, '_hash', None)
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key, default=None):
+        return self._items.get(key, default)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(frozenset(self._items.items())))
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return FrozenDict, (self._items,)
+
+    def __repr__(self):
+        return f'FrozenDict({self._items!r})'
+
+
+class ConfigRecord(Mapping):
+    # The options of one construct, one slot per option its spec declares.
+    # Options the config does not set stay unset slots and are not iterated.
+    __slots__ = ('_hash',)
+    _fields = ()
+    _field_set = frozenset()
+    _record_key = None
+
+    def __init__(self, items=()):
+        object.__setattr__(self, '_hash', None)
+        for key, value in dict(items).items():
+            if key not in self._field_set:
+                raise KeyError(f'{type(self).__name__} has no option {key}')
+            object.__setattr__(self, key, value)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self._field_set and hasattr(self, key)
+
+    def __iter__(self):
+        for field in self._fields:
+            if hasattr(self, field):
+                yield field
+
+    def __len__(self):
+        return sum(1 for _field in self)
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(frozenset(self.items())))
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise TypeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return _rebuild_record, (self._record_key, dict(self))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+
+_RECORD_TYPES = {}
+_RECORD_LOCK = threading.Lock()
+_RESERVED = frozenset(dir(ConfigRecord))
+
+
+def record_type(name, fields):
+    # None when an option name cannot be a slot; those constructs use FrozenDicts
+    fields = tuple(fields)
+    key = (name, fields)
+    record = _RECORD_TYPES.get(key)
+    if record is not None:
+        return record
+    if not all(field.isidentifier() and not keyword.iskeyword(field) and field not in _RESERVED
+               for field in fields):
+        return None
+    with _RECORD_LOCK:
+        record = _RECORD_TYPES.get(key)
+        if record is None:
+            record = type(name, (ConfigRecord,), {
+                '__slots__': fields,
+                '__module__': __name__,
+                '_fields': fields,
+                '_field_set': frozenset(fields),
+                '_record_key': key,
+            })
+            _RECORD_TYPES[key] = record
+    return record
+
+
+def _rebuild_record(key, items):
+    return record_type(*key)(items)
+
+
+def _camel_case(name):
+    return ''.join(part[:1].upper() + part[1:] for part in name.split('_'))
+
+
+def _intern(key):
+    return sys.intern(key) if type(key) is str else key
+
+
+def _token(value):
+    # scalars compare by exact type and value, so 1, 1.0 and True stay distinct;
+    # children are already interned, so containers compare by identity
+    if isinstance(value, _SCALARS):
+        return type(value), value
+    return id(value)
+
+
+class Interner(object):
+    # Hash-consing table for frozen nodes. Share one between compiles to share
+    # subtrees across deployments; the table only holds what it has interned,
+    # so dropping the Interner leaves the frozen trees as they are.
+    #
+    # Compiled environments share every subtree they did not change with the
+    # base config, so within a scope() sources are also remembered by identity:
+    # a subtree already frozen for one environment is not walked again for the
+    # next. Sources must not be changed inside the scope, which the compiler's
+    # copy-on-write merges guarantee. Only the node table outlives the scope,
+    # the mutable source trees are let go when it ends.
+
+    def __init__(self, schemas=None):
+        self.schemas = SCHEMAS if schemas is None else schemas
+        self._nodes = {}
+        # (id(source), position) -> (source, frozen); the source is kept so its id stays unique
+        self._frozen = {}
+        self._scopes = 0
+        self.shared = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def clear(self):
+        self._nodes.clear()
+        self._frozen.clear()
+
+    @contextmanager
+    def scope(self):
+        # one compile: sources are remembered until the outermost scope ends
+        self._scopes += 1
+        try:
+            yield self
+        finally:
+            self._scopes -= 1
+            if not self._scopes:
+                self._frozen.clear()
+
+    def freeze(self, configs):
+        # configs: {config key: {construct name: options}}
+        with self.scope():
+            if not isinstance(configs, Mapping):
+                return self._freeze(configs)
+            frozen = {}
+            for key, constructs in configs.items():
+                schema = self.schemas.get(key)
+                if schema is not None and isinstance(constructs, Mapping):
+                    constructs = self._remembered(constructs, key, self._constructs, schema.spec)
+                else:
+                    constructs = self._freeze(constructs)
+                frozen[_intern(key)] = constructs
+            return self._mapping(FrozenDict, frozen)
+
+    def _remembered(self, source, position, freeze, context=None):
+        # position names where in the tree source sits, since that decides its record type
+        key = (id(source), position)
+        known = self._frozen.get(key)
+        if known is not None:
+            self.shared += 1
+            return known[1]
+        frozen = freeze(source, context)
+        self._frozen[key] = (source, frozen)
+        return frozen
+
+    def _constructs(self, constructs, spec):
+        context = (spec.options, spec.construct_class, record_type(f'{spec.construct_class}Options', spec.options))
+        return self._mapping(FrozenDict, {
+            _intern(name): self._remembered(value, spec.construct_class, self._options, context)
+            for name, value in constructs.items()
+        })
+
+    def _options(self, options, context):
+        option_specs, prefix, record = context
+        if not isinstance(options, Mapping):
+            return self._freeze(options)
+        values = {}
+        for option, value in options.items():
+            option_spec = option_specs.get(option)
+            if option_spec is not None and option_spec.items and isinstance(value, (list, tuple)):
+                item_prefix = prefix + _camel_case(option)
+                item_context = (option_spec.items, item_prefix, record_type(f'{item_prefix}Options', option_spec.items))
+                value = self._remembered(value, item_prefix, self._entries, item_context)
+            else:
+                value = self._freeze(value)
+            values[_intern(option)] = value
+        if record is None or not record._field_set.issuperset(values):
+            return self._mapping(FrozenDict, values)
+        return self._mapping(record, {field: values[field] for field in record._fields if field in values})
+
+    def _entries(self, entries, context):
+        # single named entries, e.g. subnet_configuration: [{public: {...}}]
+        prefix = context[1]
+        return self._sequence([
+            self._mapping(FrozenDict, {
+                _intern(name): self._remembered(options, prefix, self._options, context)
+                for name, options in entry.items()
+            }) if isinstance(entry, Mapping) else self._freeze(entry)
+            for entry in entries
+        ])
+
+    def _freeze(self, value):
+        value_type = type(value)
+        if value_type is str:
+            return sys.intern(value)
+        if value_type in _SCALARS:
+            return value
+        if value_type is dict or value_type is list:
+            return self._remembered(value, None, self._freeze_container)
+        return self._freeze_container(value)
+
+    def _freeze_container(self, value, _context=None):
+        if isinstance(value, Mapping):
+            return self._mapping(FrozenDict, {_intern(key): self._freeze(item) for key, item in value.items()})
+        if isinstance(value, (list, tuple)):
+            return self._sequence([self._freeze(item) for item in value])
+        if isinstance(value, str):
+            return sys.intern(value)
+        return value
+
+    def _mapping(self, node_type, values):
+        token = (node_type, tuple((key, _token(value)) for key, value in values.items()))
+        node = self._nodes.get(token)
+        if node is None:
+            # setdefault keeps the first node when two threads intern the same subtree
+            node = self._nodes.setdefault(token, node_type(values))
+        else:
+            self.shared += 1
+        return node
+
+    def _sequence(self, items):
+        token = (tuple, tuple(_token(item) for item in items))
+        node = self._nodes.get(token)
+        if node is None:
+            node = self._nodes.setdefault(token, tuple(items))
+        else:
+            self.shared += 1
+        return node
+
+
+def freeze(configs, interner=None):
+    return (interner if interner is not None else Interner()).freeze(configs)
+
+
+def thaw(value):
+    # plain dicts and lists again, for callers (jsii, yaml) that need them
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def json_default(value):
+    # json.dumps(default=...) hook that serializes frozen mappings like dicts
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
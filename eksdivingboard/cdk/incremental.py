@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from .cache import hash_file
+from .frozen import json_default
+from .blobstore import BLOB_DIR
+from .parallel_synth import synth_environments, MANIFEST_FILE, TREE_FILE
+
+logger = logging.getLogger(__name__)
+
+GRAPH_FILE = '.eksdive-graph.json'
+GRAPH_VERSION = 2
+_CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_fingerprint():
+    # any change to the construct code invalidates every stack
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(_CODE_DIR)):
+        if file_name.endswith('.py'):
+            digest.update(file_name.encode())
+            digest.update(hash_file(os.path.join(_CODE_DIR, file_name)).encode())
+    return digest.hexdigest()
+
+
+def config_fingerprint(configs):
+    return hashlib.sha256(json.dumps(configs, sort_keys=True, default=json_default).encode()).hexdigest()
+
+
+class DependencyGraph(object):
+
+    def __init__(self, environments=None, files=None, code=None, order=None, context=None):
+        self.environments = environments or {}
+        self.files = files or {}
+        self.code = code
+        self.order = order or list(self.environments)
+        # fingerprint of the context handed to cdk.App, cached lookups included
+        self.context = context
+
+    @classmethod
+    def from_compiler(cls, compiler, environment_configs, context=None):
+        environments = compiler.dependency_graph(list(environment_configs))
+        files = {}
+        for name, entry in environments.items():
+            entry['config_hash'] = config_fingerprint(environment_configs[name])
+            for file_name in entry['files']:
+                if file_name not in files:
+                    files[file_name] = hash_file(file_name) if os.path.isfile(file_name) else None
+        return cls(environments, files, code_fingerprint(), list(environment_configs),
+                   config_fingerprint(context or {}))
+
+    @classmethod
+    def load(cls, outdir):
+        try:
+            with open(os.path.join(outdir, GRAPH_FILE), 'r') as stream:
+                payload = json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return cls()
+        if payload.get('version') != GRAPH_VERSION:
+            return cls()
+        return cls(payload['environments'], payload['files'], payload['code'], payload['order'], payload['context'])
+
+    def save(self, outdir):
+        with open(os.path.join(outdir, GRAPH_FILE), 'w') as stream:
+            json.dump({
+                'version': GRAPH_VERSION,
+                'code': self.code,
+                'context': self.context,
+                'order': self.order,
+                'files': self.files,
+                'environments': self.environments,
+            }, stream, indent=2, sort_keys=True)
+
+    def changed_files(self, previous):
+        return {
+            file_name for file_name in set(self.files) | set(previous.files)
+            if self.files.get(file_name) != previous.files.get(file_name)
+        }
+
+    def affected(self, previous, outdir):
+        # environment -> construct keys that need rebuilding ('*' for the whole stack)
+        # stacks rendered before a lookup was cached hold dummy values for it
+        if self.code != previous.code or self.context != previous.context:
+            return {name: ['*'] for name in self.order}
+        manifest = _read_manifest(outdir)
+        changed = self.changed_files(previous)
+        affected = {}
+        for name in self.order:
+            entry = self.environments[name]
+            old_entry = previous.environments.get(name)
+            if old_entry is None or name not in manifest.get('artifacts', {}):
+                affected[name] = ['*']
+            elif set(entry['constructs']) != set(old_entry['constructs']):
+                affected[name] = ['*']
+            else:
+                # a variables file nothing references does not change the template
+                keys = sorted(
+                    key for key, files in entry['constructs'].items()
+                    if changed.intersection(files) or files != old_entry['constructs'][key]
+                )
+                if keys:
+                    affected[name] = keys
+                elif entry['config_hash'] != old_entry['config_hash']:
+                    affected[name] = ['*']
+        return affected
+
+
+def _read_manifest(outdir):
+    try:
+        with open(os.path.join(outdir, MANIFEST_FILE), 'r') as stream:
+            return json.load(stream)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def incremental_synth(compiler, environment_configs, outdir, max_workers=None, root_stack_id=None, context=None):
+    graph = DependencyGraph.from_compiler(compiler, environment_configs, context)
+    previous = DependencyGraph.load(outdir)
+    affected = graph.affected(previous, outdir)
+    removed = [name for name in previous.order if name not in environment_configs]
+    for name, keys in affected.items():
+        logger.info('rebuilding %s: %s changed', name, ", ".join(keys))
+    if not affected and not removed:
+        logger.info('all %s stacks are up to date in %s', len(graph.order), outdir)
+        graph.save(outdir)
+        return []
+
+    previous_manifest = _read_manifest(outdir)
+    rebuild_root = root_stack_id and root_stack_id not in previous_manifest.get('artifacts', {})
+    # the empty root stack leads the manifest, as in the serial cdk.App output
+    stack_order = [root_stack_id] + graph.order if root_stack_id else graph.order
+    os.makedirs(outdir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.incremental-', dir=outdir)
+    try:
+        if affected:
+            synth_environments(
+                {name: environment_configs[name] for name in affected},
+                staging,
+                max_workers=max_workers,
+                root_stack_id=root_stack_id if rebuild_root else None,
+                context=context,
+            )
+            merge_assemblies(staging, outdir, stack_order, removed)
+        else:
+            merge_assemblies(None, outdir, stack_order, removed)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    graph.save(outdir)
+    return list(affected)
+
+
+def merge_assemblies(staging, outdir, stack_order, removed):
+    # Swaps the rebuilt stacks from staging into the assembly in outdir,
+    # reusing every other stack's template and manifest entry as-is.
+    manifest = _read_manifest(outdir)
+    artifacts = manifest.get('artifacts', {})
+    tree_file = os.path.join(outdir, TREE_FILE)
+    tree = None
+    if os.path.exists(tree_file):
+        with open(tree_file, 'r') as stream:
+            tree = json.load(stream)
+
+    for name in removed:
+        artifact = artifacts.pop(name, None)
+        template = (artifact or {}).get('properties', {}).get('templateFile')
+        # blobs can be shared with other stacks; dedupe_assembly(prune=True) removes unused ones
+        if template and not template.startswith(BLOB_DIR + '/') and os.path.exists(os.path.join(outdir, template)):
+            os.unlink(os.path.join(outdir, template))
+        if tree:
+            tree['tree'].get('children', {}).pop(name, None)
+
+    staged_manifest = _read_manifest(staging) if staging else {}
+    staged_artifacts = staged_manifest.get('artifacts', {})
+    if not manifest:
+        manifest = {key: value for key, value in staged_manifest.items() if key not in ('artifacts', 'missing')}
+    # lookups check_lookups reports: the rebuilt stacks' own, and the ones kept
+    # stacks could have made. The manifest does not say which stack made a
+    # lookup, so those are the ones for an account and region a kept stack uses.
+    kept_environments = {artifact.get('environment') for name, artifact in artifacts.items()
+                         if name not in staged_artifacts and artifact.get('type') == 'aws:cloudformation:stack'}
+    missing = {item['key']: item for item in manifest.get('missing', [])
+               if _lookup_environment(item) in kept_environments}
+    missing.update((item['key'], item) for item in staged_manifest.get('missing', []))
+    if missing:
+        manifest['missing'] = list(missing.values())
+    else:
+        manifest.pop('missing', None)
+
+    if staging:
+        artifacts.update(staged_artifacts)
+        staged_tree_file = os.path.join(staging, TREE_FILE)
+        if os.path.exists(staged_tree_file):
+            with open(staged_tree_file, 'r') as stream:
+                staged_tree = json.load(stream)
+            if tree is None:
+                tree = staged_tree
+            else:
+                tree['tree'].setdefault('children', {}).update(staged_tree['tree'].get('children', {}))
+        for entry in os.scandir(staging):
+            if entry.name in (MANIFEST_FILE, TREE_FILE):
+                continue
+            destination = os.path.join(outdir, entry.name)
+            if entry.is_dir():
+                shutil.rmtree(destination, ignore_errors=True)
+                shutil.copytree(entry.path, destination)
+            else:
+                shutil.copyfile(entry.path, destination)
+
+    # the listed stacks are put in stack_order; other artifacts (the tree) keep their place
+    listed = set(stack_order)
+    ordered = iter([name for name in stack_order if name in artifacts])
+    manifest['artifacts'] = {}
+    for name in list(artifacts):
+        name = next(ordered) if name in listed else name
+        manifest['artifacts'][name] = artifacts[name]
+    with open(os.path.join(outdir, MANIFEST_FILE), 'w') as stream:
+        json.dump(manifest, stream, indent=2)
+    if tree is not None:
+        with open(tree_file, 'w') as stream:
+            json.dump(tree, stream, indent=2)
+
+
+def _lookup_environment(item):
+    props = item.get('props', {})
+    return f'aws://{props.get("account")}/{props.get("region")}'
@@ -1,18 +1,24 @@
 import logging
 from aws_cdk.core import Stack
 from .compiler import ConfigsCompiler
+from .schemas import SchemaValidationError
+from .registry import registry
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
 
 class InfrastructureStack(Stack):
 
-    def __init__(self, scope, id, configs_root_path, defaults_root_path=None, environments_root_path=None, **kwargs):
+    def __init__(self, scope, id, configs_root_path, defaults_root_path=None, environments_root_path=None,
+                 common_root_path=None, environments=None, validate=True, bundle=None, **kwargs):
         super().__init__(scope, id, **kwargs)
         self.scope = scope
         self.id = id
         self.configs = None
         self.environments = []
+        self.environment_configs = {}
+        self.validate = validate
         self.defaults = None
         self._config_compiler = ConfigsCompiler()
         self._defaults_compiler = None
@@ -21,39 +27,67 @@ class InfrastructureStack(Stack):
         self.load_configs(
             configs_path=configs_root_path,
             defaults_root=defaults_root_path,
-            environments_root=environments_root_path
+            environments_root=environments_root_path,
+            common_files_root=common_root_path,
+            environments=environments,
+            bundle=bundle,
         )
 
         self.build_stacks()
 
+    @classmethod
+    def from_deployment_file(cls, scope, id, deployment_file, **kwargs):
+        from .deployment import DeploymentDefinition
+        definition = DeploymentDefinition.load(deployment_file)
+        arguments = definition.compiler_arguments()
+        return cls(
+            scope,
+            id,
+            configs_root_path=arguments['deploy_root'],
+            defaults_root_path=arguments['defaults_root'],
+            environments_root_path=arguments['environments_root'],
+            common_root_path=arguments['common_files_root'],
+            environments=arguments['environments'],
+            **kwargs
+        )
+
     def load_configs(self, configs_path, **kwargs):
-        logger.debug(f"============== Beginning Configuration Load ==================")
+        logger.debug("============== Beginning Configuration Load ==================")
         defaults_path = kwargs.get('defaults_root', 'not defined')
-        logger.info(f'loading stack configs from {configs_path} with defaults {defaults_path}')
+        logger.info('loading stack configs from %s with defaults %s', configs_path, defaults_path)
+        # with a bundle the roots are ignored, it names every file itself
         self._config_compiler.configure(
             deploy_root=configs_path,
             **kwargs
         )
-        self._config_compiler.process_configs()
-        logger.debug(f"!!!!!! COMPILER CONFIGS !!!!!! {self._config_compiler.get_configs()}")
+        self.environment_configs = self._config_compiler.compile_stack_configs(f"{self.id}DefaultStack")
+        # every environment is compiled; nothing reads the bundle after this
+        self._config_compiler.close()
+        if self.validate:
+            errors = self._config_compiler.validate(self.environment_configs)
+            if errors:
+                raise SchemaValidationError([
+                    error for environment_errors in errors.values() for error in environment_errors])
+        logger.debug("!!!!!! COMPILER CONFIGS !!!!!! %s", self._config_compiler.get_configs())
         self.configs = self._config_compiler.get_configs()
-        logger.debug(f"####### configs ##########\n\t{self.configs}")
+        logger.debug("####### configs ##########\n\t%s", self.configs)
         bob = """logger.debug(f"")
         if defaults_path:
             logger.debug(f"######## LOAD DEFAULTS ########")
             self._defaults_compiler = ConfigsCompiler()
             self._defaults_compiler.configure()
             self.defaults = ConfigsCompiler(defaults_path)"""
-        self.environments = self._config_compiler.environments
-        logger.debug(f"================= End Configuration Load =====================")
+        self.environments = list(self.environment_configs)
+        logger.debug("================= End Configuration Load =====================")
 
     def build_stacks(self):
         logger.info('building stack from configs')
         if not self.environments:
             self.environments = [f"{self.id}DefaultStack"]
-        logger.info(f"building environments: {self.environments}")
+        logger.info("building environments: %s", self.environments)
         for environment in self.environments:
-            stack = EnvironmentStack(self.scope, environment, self.configs)
+            configs = self.environment_configs.get(environment, self.configs)
+            stack = EnvironmentStack(self.scope, environment, configs)
             stack.build_stack()
             self.stacks[environment] = stack
 
@@ -67,16 +101,8 @@ class EnvironmentStack(Stack):
         self.constructs = {}
 
     def build_stack(self):
-        logger.debug(f"configs: {self.configs}")
-        for key, value in self.configs.items():
-            self.constructs[key] = getattr(self, key)(self.configs[key])
-
-    def vpc(self, configs):
-        logger.debug('beginning processing vpc items')
-        from .vpc import AwsVpc
-        return AwsVpc(self, configs)
-
-    def eks_cluster(self, configs):
-        logger.debug('beginning processing eks clusters')
-        from .eks_cluster import EKSCluster
-        return EKSCluster(self, configs)
+        logger.debug("configs: %s", self.configs)
+        with span('build_stack', stack=self.id):
+            for key, value in self.configs.items():
+                logger.debug('beginning processing %s items', key)
+                self.constructs[key] = registry.get(key)(self, value)
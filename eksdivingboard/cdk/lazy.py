@@ -0,0 +1,30 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    # Stands in for a module until one of its attributes is first used, so
+    # `from aws_cdk import aws_ec2 as ec2` style names cost nothing at import time.
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        value = getattr(self._load(), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    return LazyModule(name)
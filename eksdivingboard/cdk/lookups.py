@@ -0,0 +1,318 @@
+import os
+import json
+import logging
+from datetime import datetime, timezone
+from .lazy import lazy_import
+from .parallel_synth import MANIFEST_FILE
+from .tracing import span
+
+boto3 = lazy_import('boto3')
+
+logger = logging.getLogger(__name__)
+
+# Context lookups (ec2.Vpc.from_lookup and friends) without AWS calls at synth
+# time. A synth records every lookup it could not answer in the manifest's
+# `missing` list; those are answered in one batch from a versioned local cache
+# file, or fetched together from a backend and written to the cache, and the
+# cached values are handed to cdk.App as context on the next synth.
+#
+#   cache = LookupCache.load(LOOKUP_CACHE_FILE)
+#   app = cdk.App(context=cache.context())
+#   ...synth...
+#   check_lookups(outdir, cache)              # raises MissingLookupsError
+#   prefetch_lookups(outdir, cache, AwsBackend())
+
+LOOKUP_CACHE_FILE = 'cdk.lookups.json'
+LOOKUP_CACHE_VERSION = 1
+VPC_PROVIDER = 'vpc-provider'
+
+
+def _colon_quote(value):
+    return value.replace('$', '$$').replace(':', '$:')
+
+
+def _props_to_array(props, prefix=''):
+    # core/lib/context-provider.ts propsToArray
+    items = []
+    for key, value in props.items():
+        if value is None:
+            continue
+        if isinstance(value, dict):
+            items.extend(_props_to_array(value, f'{prefix}{key}.'))
+        elif isinstance(value, str):
+            items.append(f'{prefix}{key}={_colon_quote(value)}')
+        else:
+            items.append(f'{prefix}{key}={json.dumps(value)}')
+    return sorted(items)
+
+
+def context_key(provider, props):
+    # the key aws-cdk.core 1.x stores a lookup under; props include account and region
+    return f'{provider}:{":".join(_props_to_array(props))}'
+
+
+def vpc_lookup_props(account, region, vpc_id=None, filters=None, subnet_group_name_tag=None):
+    # the props ec2.Vpc.from_lookup sends to the vpc-provider
+    lookup_filter = dict(filters or {})
+    if vpc_id:
+        lookup_filter['vpc-id'] = vpc_id
+    return {
+        'account': account,
+        'region': region,
+        'filter': lookup_filter,
+        'returnAsymmetricSubnets': True,
+        'subnetGroupNameTag': subnet_group_name_tag,
+    }
+
+
+class LookupRequest(object):
+    __slots__ = ('key', 'provider', 'props')
+
+    def __init__(self, provider, props, key=None):
+        self.provider = provider
+        self.props = props
+        self.key = key or context_key(provider, props)
+
+    @classmethod
+    def vpc(cls, account, region, vpc_id=None, **kwargs):
+        return cls(VPC_PROVIDER, vpc_lookup_props(account, region, vpc_id, **kwargs))
+
+    def __repr__(self):
+        return f'LookupRequest({self.key!r})'
+
+
+class MissingLookupsError(Exception):
+
+    def __init__(self, requests, reasons=None):
+        self.requests = requests
+        self.keys = [request.key for request in requests]
+        self.reasons = reasons or {}
+        lines = [f'{key}: {self.reasons[key]}' if key in self.reasons else key for key in self.keys]
+        super().__init__(f'{len(lines)} context lookups have no cached value, run `python3 lookups.py prefetch` '
+                         f'with AWS credentials or add them to {LOOKUP_CACHE_FILE}:\n\t' + '\n\t'.join(lines))
+
+
+class LookupCache(object):
+    # key -> {'provider', 'props', 'value', 'fetched'}; a file from another
+    # cache version is ignored rather than trusted
+
+    def __init__(self, file_name=None, entries=None):
+        self.file_name = file_name
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def load(cls, file_name):
+        try:
+            with open(file_name, 'r') as stream:
+                payload = json.load(stream)
+        except FileNotFoundError:
+            return cls(file_name)
+        if payload.get('version') != LOOKUP_CACHE_VERSION:
+            logger.warning('ignoring %s, it was written by lookup cache version %s', file_name, payload.get('version'))
+            return cls(file_name)
+        return cls(file_name, payload.get('entries', {}))
+
+    def save(self, file_name=None):
+        file_name = file_name or self.file_name
+        staging = f'{file_name}.tmp'
+        with open(staging, 'w') as stream:
+            json.dump({'version': LOOKUP_CACHE_VERSION, 'entries': self.entries}, stream, indent=2, sort_keys=True)
+        os.replace(staging, file_name)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return entry['value'] if entry else None
+
+    def put(self, request, value):
+        self.entries[request.key] = {
+            'provider': request.provider,
+            'props': request.props,
+            'value': value,
+            'fetched': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+
+    def context(self):
+        # cdk.App(context=...) answers every cached lookup without a provider call
+        return {key: entry['value'] for key, entry in self.entries.items()}
+
+
+def missing_lookups(outdir):
+    # the lookups a synth of the assembly in outdir could not answer
+    try:
+        with open(os.path.join(outdir, MANIFEST_FILE), 'r') as stream:
+            manifest = json.load(stream)
+    except FileNotFoundError:
+        return []
+    return [LookupRequest(item['provider'], item.get('props', {}), item['key']) for item in manifest.get('missing', [])]
+
+
+def resolve_lookups(requests, cache, backend=None):
+    # Answers every request from the cache, then fetches the rest from the
+    # backend in one batch. Raises MissingLookupsError listing every key
+    # still unanswered, so a build fails on its first synth, not its last.
+    pending = {}
+    for request in requests:
+        if cache.get(request.key) is None:
+            pending.setdefault(request.key, request)
+    pending = list(pending.values())
+    if not pending:
+        return {}
+    if backend is None:
+        raise MissingLookupsError(pending)
+    with span('lookups.fetch', lookups=len(pending)):
+        values, reasons = backend.lookup(pending)
+    for request in pending:
+        if request.key in values:
+            cache.put(request, values[request.key])
+    unanswered = [request for request in pending if request.key not in values]
+    if unanswered:
+        raise MissingLookupsError(unanswered, reasons)
+    logger.info('fetched %d context lookups', len(values))
+    return values
+
+
+def check_lookups(outdir, cache):
+    # after a synth: fail with the full list instead of deploying dummy lookup values
+    missing = [request for request in missing_lookups(outdir) if cache.get(request.key) is None]
+    if missing:
+        raise MissingLookupsError(missing)
+
+
+def prefetch_lookups(outdir, cache, backend):
+    # whatever the backend answered is saved even when some lookups failed
+    try:
+        return resolve_lookups(missing_lookups(outdir), cache, backend)
+    finally:
+        if cache.file_name:
+            cache.save()
+
+
+def vpc_context_response(vpc_id, cidr, subnet_groups, account=None, vpn_gateway_id=None):
+    # cx-api VpcContextResponse for returnAsymmetricSubnets lookups;
+    # subnet_groups: [{'name', 'type': Public|Private|Isolated, 'subnets': [
+    #     {'subnetId', 'cidr', 'availabilityZone', 'routeTableId'}]}]
+    response = {
+        'vpcId': vpc_id,
+        'vpcCidrBlock': cidr,
+        'availabilityZones': [],
+        'subnetGroups': subnet_groups,
+    }
+    if account:
+        response['ownerAccountId'] = account
+    if vpn_gateway_id:
+        response['vpnGatewayId'] = vpn_gateway_id
+    return response
+
+
+class StaticBackend(object):
+    # Answers lookups from values held in memory: context key -> value, and
+    # vpc id -> vpc_context_response(...). For tests and sandboxed builds.
+
+    def __init__(self, values=None, vpcs=None):
+        self.values = dict(values or {})
+        self.vpcs = dict(vpcs or {})
+        self.calls = 0
+
+    def lookup(self, requests):
+        self.calls += 1
+        values = {}
+        reasons = {}
+        for request in requests:
+            vpc_id = request.props.get('filter', {}).get('vpc-id') if request.provider == VPC_PROVIDER else None
+            if request.key in self.values:
+                values[request.key] = self.values[request.key]
+            elif vpc_id in self.vpcs:
+                values[request.key] = self.vpcs[vpc_id]
+            else:
+                reasons[request.key] = 'no stand-in value'
+        return values, reasons
+
+
+class AwsBackend(object):
+    # Live vpc-provider lookups with boto3, batched: one DescribeVpcs,
+    # DescribeSubnets and DescribeRouteTables per account and region however
+    # many VPCs are looked up. Credentials for each account come from the
+    # default boto3 chain.
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or (lambda account, region: boto3.session.Session(region_name=region))
+
+    def lookup(self, requests):
+        values = {}
+        reasons = {}
+        by_environment = {}
+        for request in requests:
+            lookup_filter = request.props.get('filter', {})
+            if request.provider != VPC_PROVIDER:
+                reasons[request.key] = f'the {request.provider} provider is not supported'
+            elif set(lookup_filter) != {'vpc-id'}:
+                reasons[request.key] = 'only lookups by vpc-id are supported'
+            else:
+                environment = (request.props.get('account'), request.props.get('region'))
+                by_environment.setdefault(environment, []).append(request)
+        for (account, region), environment_requests in by_environment.items():
+            with span('lookups.aws', account=account, region=region, lookups=len(environment_requests)):
+                client = self.session_factory(account, region).client('ec2')
+                vpcs = self._describe_vpcs(client, sorted({
+                    request.props['filter']['vpc-id'] for request in environment_requests}))
+            for request in environment_requests:
+                vpc_id = request.props['filter']['vpc-id']
+                if vpc_id in vpcs:
+                    values[request.key] = vpcs[vpc_id](request.props.get('subnetGroupNameTag'))
+                else:
+                    reasons[request.key] = f'{vpc_id} was not found in {account}/{region}'
+        return values, reasons
+
+    @staticmethod
+    def _paginate(client, operation, key, **kwargs):
+        for page in client.get_paginator(operation).paginate(**kwargs):
+            yield from page[key]
+
+    def _describe_vpcs(self, client, vpc_ids):
+        vpc_filter = [{'Name': 'vpc-id', 'Values': vpc_ids}]
+        vpcs = {vpc['VpcId']: vpc for vpc in self._paginate(client, 'describe_vpcs', 'Vpcs', Filters=vpc_filter)}
+        subnets = list(self._paginate(client, 'describe_subnets', 'Subnets', Filters=vpc_filter))
+        route_tables = list(self._paginate(client, 'describe_route_tables', 'RouteTables', Filters=vpc_filter))
+        gateways = list(self._paginate(client, 'describe_vpn_gateways', 'VpnGateways', Filters=[
+            {'Name': 'attachment.vpc-id', 'Values': vpc_ids}, {'Name': 'state', 'Values': ['available']}]))
+
+        subnet_tables = {}
+        main_tables = {}
+        for table in route_tables:
+            public = any(route.get('GatewayId', '').startswith('igw-') for route in table.get('Routes', []))
+            for association in table.get('Associations', []):
+                if association.get('Main'):
+                    main_tables[table['VpcId']] = (table['RouteTableId'], public)
+                elif association.get('SubnetId'):
+                    subnet_tables[association['SubnetId']] = (table['RouteTableId'], public)
+        vpn_gateways = {attachment['VpcId']: gateway['VpnGatewayId'] for gateway in gateways
+                        for attachment in gateway.get('VpcAttachments', [])}
+
+        def response_for(vpc):
+            # vpcs.ts: subnet type and group name come from the aws-cdk tags,
+            # otherwise from whether the subnet routes through an internet gateway
+            def build(name_tag):
+                name_tag = name_tag or 'aws-cdk:subnet-name'
+                groups = {}
+                for subnet in subnets:
+                    if subnet['VpcId'] != vpc['VpcId']:
+                        continue
+                    tags = {tag['Key']: tag['Value'] for tag in subnet.get('Tags', [])}
+                    table_id, public = subnet_tables.get(
+                        subnet['SubnetId'], main_tables.get(vpc['VpcId'], (None, False)))
+                    subnet_type = tags.get('aws-cdk:subnet-type') or ('Public' if public else 'Private')
+                    name = tags.get(name_tag) or subnet_type
+                    group = groups.setdefault(name, {'name': name, 'type': subnet_type, 'subnets': []})
+                    group['subnets'].append({
+                        'subnetId': subnet['SubnetId'],
+                        'cidr': subnet['CidrBlock'],
+                        'availabilityZone': subnet['AvailabilityZone'],
+                        'routeTableId': table_id,
+                    })
+                for group in groups.values():
+                    group['subnets'].sort(key=lambda item: item['availabilityZone'])
+                return vpc_context_response(vpc['VpcId'], vpc['CidrBlock'], list(groups.values()),
+                                            vpc.get('OwnerId'), vpn_gateways.get(vpc['VpcId']))
+            return build
+
+        return {vpc_id: response_for(vpc) for vpc_id, vpc in vpcs.items()}
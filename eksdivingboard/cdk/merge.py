@@ -0,0 +1,105 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class Origin(object):
+    # Which file set a key. Nodes mirror the merged config only down to the level
+    # where a file replaced a value; everything below belongs to that node's source.
+    __slots__ = ('source', 'children')
+
+    def __init__(self, source=None, children=None):
+        self.source = source
+        self.children = children if children is not None else {}
+
+    def __getstate__(self):
+        return self.source, self.children
+
+    def __setstate__(self, state):
+        self.source, self.children = state
+
+
+class MergeEngine(object):
+    # Key-level deep merge with copy-on-write structural sharing. Only dicts on
+    # the path to a changed key are copied, and only the first time this engine
+    # writes to them; untouched subtrees and values taken from a file are shared
+    # by reference. A fork() shares everything merged so far and copies on its
+    # own first write, so the parent's results are never modified.
+
+    def __init__(self, origins=None):
+        self.origins = origins if origins is not None else Origin()
+        # id -> the dicts and Origins this engine copied and may still write to
+        self._owned = {}
+
+    def fork(self):
+        return MergeEngine(self.origins)
+
+    def merge(self, base, overlay, source=None):
+        if base is None:
+            base = {}
+        if not overlay:
+            return base
+        if not isinstance(overlay, dict):
+            raise ValueError(f'{source} must contain a mapping at the top level, found {type(overlay).__name__}')
+        merged, self.origins = self._merge(base, overlay, self.origins, source)
+        return merged
+
+    def _merge(self, base, overlay, origin, source):
+        base = self._writable(base)
+        origin = self._writable(origin)
+        children = origin.children
+        for key, value in overlay.items():
+            current = base.get(key, _MISSING)
+            if isinstance(value, dict) and isinstance(current, dict):
+                child_origin = children.get(key)
+                if child_origin is None:
+                    child_origin = Origin(origin.source)
+                base[key], children[key] = self._merge(current, value, child_origin, source)
+            else:
+                base[key] = value
+                children[key] = Origin(source)
+        return base, origin
+
+    def seal(self):
+        # done merging for now: forgets the copies it owns, so a later merge
+        # copies again instead of writing to results already handed out
+        self._owned = {}
+
+    def _writable(self, item):
+        if id(item) in self._owned:
+            return item
+        if isinstance(item, Origin):
+            item = Origin(item.source, dict(item.children))
+        else:
+            item = dict(item)
+        self._owned[id(item)] = item
+        return item
+
+    def source_of(self, path):
+        node = self.origins
+        source = node.source
+        for key in path:
+            node = node.children.get(key)
+            if node is None:
+                break
+            source = node.source or source
+        return source
+
+    def sources_under(self, path=()):
+        node = self.origins
+        inherited = node.source
+        for key in path:
+            node = node.children.get(key)
+            if node is None:
+                return {inherited} if inherited else set()
+            inherited = node.source or inherited
+        sources = {inherited} if inherited else set()
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if node.source:
+                sources.add(node.source)
+            pending.extend(node.children.values())
+        return sources
@@ -0,0 +1,150 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+WORKERS_ENV = 'EKSDIVE_SYNTH_WORKERS'
+MANIFEST_FILE = 'manifest.json'
+TREE_FILE = 'tree.json'
+# written by every cdk.App synth; regenerated for the stitched assembly
+_ASSEMBLY_FILES = {MANIFEST_FILE, TREE_FILE, 'cdk.out'}
+
+
+def configured_workers(default=1):
+    value = os.environ.get(WORKERS_ENV)
+    if not value:
+        return default
+    if value == 'auto':
+        return os.cpu_count() or 1
+    return int(value)
+
+
+def group_environments(environment_names, max_workers):
+    # contiguous groups keep each worker's stacks in serial build order
+    max_workers = max(1, min(max_workers, len(environment_names)))
+    size, remainder = divmod(len(environment_names), max_workers)
+    groups = []
+    start = 0
+    for index in range(max_workers):
+        end = start + size + (1 if index < remainder else 0)
+        groups.append(environment_names[start:end])
+        start = end
+    return [group for group in groups if group]
+
+
+def _synth_group(worker_outdir, environments, root_stack_id=None, context=None):
+    # runs in a fresh interpreter with its own jsii kernel and cdk.App
+    from aws_cdk import core as cdk
+    from .infrastructure_stack import EnvironmentStack
+
+    app = cdk.App(outdir=worker_outdir, context=context)
+    if root_stack_id:
+        cdk.Stack(app, root_stack_id)
+    for name, configs in environments:
+        EnvironmentStack(app, name, configs).build_stack()
+    with span('synth', outdir=worker_outdir):
+        app.synth()
+    return worker_outdir
+
+
+def synth_environments(environment_configs, outdir, max_workers=None, root_stack_id=None, context=None):
+    # Callers must run behind an `if __name__ == '__main__':` guard: the spawned
+    # workers import the caller's main module before they run _synth_group.
+    # The first worker also writes the empty root stack a serial synth has.
+    names = list(environment_configs)
+    max_workers = max_workers or configured_workers(os.cpu_count() or 1)
+    groups = group_environments(names, max_workers)
+    logger.info('synthesizing %s environments in %s worker processes', len(names), len(groups))
+
+    os.makedirs(outdir, exist_ok=True)
+    staging_root = tempfile.mkdtemp(prefix='.synth-', dir=outdir)
+    try:
+        # jsii's node child process does not survive fork, so always spawn
+        with ProcessPoolExecutor(max_workers=len(groups),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [
+                executor.submit(
+                    _synth_group,
+                    os.path.join(staging_root, f'worker-{index}'),
+                    [(name, environment_configs[name]) for name in group],
+                    root_stack_id if index == 0 else None,
+                    context,
+                )
+                for index, group in enumerate(groups)
+            ]
+            worker_outdirs = [future.result() for future in futures]
+        with span('stitch', workers=len(worker_outdirs)):
+            stitch_assemblies(worker_outdirs, outdir)
+    finally:
+        shutil.rmtree(staging_root, ignore_errors=True)
+    return outdir
+
+
+def _read_json(file_name):
+    with open(file_name, 'r') as stream:
+        return json.load(stream)
+
+
+def _write_json(file_name, payload):
+    with open(file_name, 'w') as stream:
+        json.dump(payload, stream, indent=2)
+
+
+def stitch_assemblies(worker_outdirs, outdir):
+    # Combines per-worker cloud assemblies into one whose manifest lists the
+    # artifacts in the order a single serial cdk.App would have produced them.
+    manifest = None
+    tree = None
+    tree_artifact = None
+    for worker_outdir in worker_outdirs:
+        worker_manifest = _read_json(os.path.join(worker_outdir, MANIFEST_FILE))
+        if manifest is None:
+            manifest = {key: value for key, value in worker_manifest.items() if key != 'artifacts'}
+            manifest['artifacts'] = {}
+            # cdk.App lists the tree artifact before the stacks
+            first = next(iter(worker_manifest.get('artifacts', {}).values()), {})
+            tree_first = first.get('type') == 'cdk:tree'
+        for artifact_id, artifact in worker_manifest.get('artifacts', {}).items():
+            if artifact.get('type') == 'cdk:tree':
+                tree_artifact = (artifact_id, artifact)
+                continue
+            if artifact_id in manifest['artifacts']:
+                raise ValueError(f'artifact {artifact_id} was synthesized by more than one worker')
+            manifest['artifacts'][artifact_id] = artifact
+
+        worker_tree_file = os.path.join(worker_outdir, TREE_FILE)
+        if os.path.exists(worker_tree_file):
+            worker_tree = _read_json(worker_tree_file)
+            if tree is None:
+                tree = worker_tree
+            else:
+                tree['tree'].setdefault('children', {}).update(worker_tree['tree'].get('children', {}))
+
+        for entry in os.scandir(worker_outdir):
+            if entry.name in _ASSEMBLY_FILES:
+                continue
+            destination = os.path.join(outdir, entry.name)
+            if entry.is_dir():
+                shutil.rmtree(destination, ignore_errors=True)
+                shutil.copytree(entry.path, destination)
+            else:
+                shutil.copyfile(entry.path, destination)
+
+    if manifest is None:
+        raise ValueError('no worker assemblies to stitch')
+    if tree is not None:
+        _write_json(os.path.join(outdir, TREE_FILE), tree)
+    if tree_artifact:
+        stacks = manifest['artifacts']
+        manifest['artifacts'] = {tree_artifact[0]: tree_artifact[1]} if tree_first else {}
+        manifest['artifacts'].update(stacks)
+        manifest['artifacts'].setdefault(tree_artifact[0], tree_artifact[1])
+    _write_json(os.path.join(outdir, MANIFEST_FILE), manifest)
+    shutil.copyfile(os.path.join(worker_outdirs[0], 'cdk.out'), os.path.join(outdir, 'cdk.out'))
+    return manifest
@@ -0,0 +1,99 @@
+import inspect
+import logging
+import importlib
+from .specs import CONSTRUCT_SPECS
+from .schemas import SCHEMAS
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_ENTRY_POINT_GROUP = 'eksdivingboard.constructs'
+
+
+def _static_converter(function):
+    def convert(_construct, value):
+        return function(value)
+    return convert
+
+
+def build_converters(construct_class):
+    # option name -> converter(construct, value), resolved once per class.
+    # An option is converted when the class defines a method of the same name
+    # (the convention StackConstruct subclasses already follow).
+    options = set(getattr(construct_class, 'option_converters', ()))
+    schema = getattr(construct_class, 'schema', None)
+    if schema is not None:
+        options.update(schema.spec.options)
+    converters = {}
+    for option in options:
+        attribute = inspect.getattr_static(construct_class, option, None)
+        if isinstance(attribute, staticmethod):
+            converters[option] = _static_converter(attribute.__func__)
+        elif isinstance(attribute, classmethod):
+            converters[option] = _static_converter(getattr(construct_class, option))
+        elif callable(attribute):
+            converters[option] = attribute
+    return converters
+
+
+class ConstructRegistry(object):
+
+    def __init__(self, builtin_modules=None):
+        self._constructs = {}
+        self._builtin_modules = dict(builtin_modules or {})
+        self._plugins_loaded = False
+
+    def register(self, config_key, construct_class=None):
+        def _register(cls):
+            cls._converters = build_converters(cls)
+            self._constructs[config_key] = cls
+            schema = getattr(cls, 'schema', None)
+            if schema is not None:
+                SCHEMAS.setdefault(config_key, schema)
+            logger.debug('registered %s for %s with converters %s', cls.__name__, config_key, sorted(cls._converters))
+            return cls
+
+        if construct_class is not None:
+            return _register(construct_class)
+        return _register
+
+    def get(self, config_key):
+        construct_class = self._constructs.get(config_key)
+        if construct_class is not None:
+            return construct_class
+        module = self._builtin_modules.get(config_key)
+        if module:
+            importlib.import_module(f'{__package__}.{module}')
+        elif not self._plugins_loaded:
+            self.load_plugins()
+        try:
+            return self._constructs[config_key]
+        except KeyError:
+            raise ValueError(f'no StackConstruct is registered for config key {config_key}. '
+                             f'Registered keys are: {sorted(self.keys())}')
+
+    def keys(self):
+        return set(self._constructs) | set(self._builtin_modules)
+
+    def load_plugins(self):
+        # third party construct types register themselves when their entry point module is imported
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:
+            return
+        discovered = entry_points()
+        if hasattr(discovered, 'select'):
+            discovered = discovered.select(group=PLUGIN_ENTRY_POINT_GROUP)
+        else:
+            discovered = discovered.get(PLUGIN_ENTRY_POINT_GROUP, [])
+        for entry_point in discovered:
+            logger.info('loading construct plugin %s from %s', entry_point.name, entry_point.value)
+            loaded = entry_point.load()
+            if inspect.isclass(loaded) and entry_point.name not in self._constructs:
+                self.register(entry_point.name, loaded)
+
+
+registry = ConstructRegistry({key: spec.module for key, spec in CONSTRUCT_SPECS.items()})
+register_construct = registry.register
@@ -0,0 +1,134 @@
+import logging
+from collections.abc import Mapping
+from .specs import CONSTRUCT_SPECS
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigError(object):
+    __slots__ = ('path', 'message', 'source')
+
+    def __init__(self, path, message, source=None):
+        self.path = path
+        self.message = message
+        self.source = source
+
+    @property
+    def key_path(self):
+        return '.'.join(str(part) for part in self.path)
+
+    def __str__(self):
+        location = f'{self.source}: ' if self.source else ''
+        return f'{location}{self.key_path}: {self.message}'
+
+    def __repr__(self):
+        return f'ConfigError({self.key_path!r}, {self.message!r}, {self.source!r})'
+
+
+class SchemaValidationError(ValueError):
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('invalid configs:\n\t' + '\n\t'.join(str(error) for error in errors))
+
+
+def _type_names(types):
+    return ' or '.join(option_type.__name__ for option_type in types)
+
+
+def _compile_value(option_spec):
+    # Every check a value needs is decided here, once, so the returned
+    # function only does set lookups at validation time.
+    # frozen configs hold tuples for lists and read-only mappings for dicts
+    types = option_spec.types + ((tuple,) if list in option_spec.types else ()) + (
+        (Mapping,) if dict in option_spec.types else ())
+    accepted = frozenset(types)
+    bool_allowed = bool in accepted
+    expected = f'expected {_type_names(option_spec.types)}'
+    choices = frozenset(option_spec.choices) if option_spec.choices else None
+    choices_text = ', '.join(option_spec.choices) if option_spec.choices else ''
+    items = _compile_options(option_spec.items, 'option') if option_spec.items else None
+
+    def validate(value, path, errors):
+        value_type = type(value)
+        if value_type not in accepted and (
+                value_type is bool and not bool_allowed or not isinstance(value, types)):
+            errors.append(ConfigError(path, f'{expected}, found {value_type.__name__}'))
+            return
+        if choices is not None and value not in choices:
+            errors.append(ConfigError(path, f'{value!r} is not one of {choices_text}'))
+        if items is not None:
+            for index, item in enumerate(value):
+                item_path = path + (index,)
+                if not isinstance(item, Mapping) or len(item) != 1:
+                    errors.append(ConfigError(item_path, 'expected a single named entry'))
+                    continue
+                for item_name, item_options in item.items():
+                    items(item_options, item_path + (item_name,), errors)
+
+    return validate
+
+
+def _compile_options(option_specs, unknown_label, defaults=None):
+    validators = {option: _compile_value(option_spec) for option, option_spec in option_specs.items()}
+    required = tuple(
+        option for option, option_spec in option_specs.items()
+        if option_spec.required and option not in (defaults or {})
+    )
+
+    def validate(options, path, errors):
+        if not isinstance(options, Mapping):
+            errors.append(ConfigError(path, 'expected a mapping of options'))
+            return
+        for option in required:
+            if option not in options:
+                errors.append(ConfigError(path + (option,), 'required option is missing'))
+        for option, value in options.items():
+            validator = validators.get(option)
+            if validator is None:
+                errors.append(ConfigError(path + (option,), f'unknown {unknown_label}'))
+            else:
+                validator(value, path + (option,), errors)
+
+    return validate
+
+
+class Schema(object):
+    # The options one StackConstruct subclass accepts, compiled once into a
+    # validator for a single construct's options.
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.config_key = spec.config_key
+        self.validate_options = _compile_options(spec.options, f'{spec.base_construct} option', spec.defaults)
+
+    def validate(self, constructs, path, errors):
+        if not isinstance(constructs, Mapping):
+            errors.append(ConfigError(path, 'expected a mapping of construct names to options'))
+            return
+        for name, options in constructs.items():
+            self.validate_options(options, path + (name,), errors)
+
+
+SCHEMAS = {key: Schema(spec) for key, spec in CONSTRUCT_SPECS.items()}
+
+
+def validate_configs(configs, source_of=None, schemas=None):
+    # Checks the whole compiled tree in one pass and returns every error;
+    # source_of maps a key path to the file that set it.
+    if schemas is None:
+        # plugin constructs add their schemas to SCHEMAS when they register
+        from .registry import registry
+        registry.load_plugins()
+        schemas = SCHEMAS
+    errors = []
+    for key, constructs in configs.items():
+        schema = schemas.get(key)
+        if schema is None:
+            errors.append(ConfigError((key,), 'no StackConstruct is registered for this key'))
+        else:
+            schema.validate(constructs, (key,), errors)
+    if source_of is not None:
+        for error in errors:
+            error.source = source_of(error.path)
+    return errors
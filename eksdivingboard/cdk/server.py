@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import socket
+import logging
+import tempfile
+import threading
+import socketserver
+import multiprocessing
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from .compiler import compile_configs
+from .deployment import DeploymentDefinition
+from .schemas import SchemaValidationError
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# A long-lived synth service. Requests are JSON lines over a Unix socket:
+#
+#   {"deployment": "/abs/deployments/example.yaml", "environments": ["dev"],
+#    "outdir": "/abs/cdk.out", "backend": "jsii", "context": {}}
+#
+# and each gets one JSON line back: {"ok": true, "outdir": ..., "stacks": [...]}
+# or {"ok": false, "error": ..., "errors": [...]}. Configs are compiled in the
+# connection's thread; jsii synths run in a pool of spawned workers that import
+# aws_cdk once and then build a fresh cdk.App per request.
+
+SOCKET_ENV = 'EKSDIVE_SYNTH_SOCKET'
+DEFAULT_SOCKET = '.eksdive-synth.sock'
+DEFAULT_ROOT_STACK = 'InfrastructureStack'
+BACKENDS = ('jsii', 'python')
+# the jsii runtime never frees objects an App created, so workers are replaced
+# after this many synths to keep a long-running server's memory flat
+RECYCLE_AFTER = 50
+
+
+def _warm_worker():
+    # pay the aws_cdk import and jsii kernel start once per worker
+    from aws_cdk import core  # noqa: F401
+    from . import vpc, eks_cluster  # noqa: F401
+    logger.info('synth worker %s is warm', os.getpid())
+
+
+def select_environments(environment_configs, environments):
+    if not environments:
+        return environment_configs
+    unknown = [name for name in environments if name not in environment_configs]
+    if unknown:
+        raise ValueError(f'unknown environments {unknown}, the deployment defines {list(environment_configs)}')
+    return {name: environment_configs[name] for name in environments}
+
+
+class SynthServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, max_workers=None, workdir=None, recycle_after=RECYCLE_AFTER):
+        self.socket_path = os.path.abspath(socket_path)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.workdir = workdir or tempfile.mkdtemp(prefix='eksdive-synth-')
+        os.makedirs(self.workdir, exist_ok=True)
+        self.recycle_after = recycle_after
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        super().__init__(self.socket_path, SynthRequestHandler)
+        logger.info('synth server listening on %s', self.socket_path)
+
+    def pool(self):
+        # created on the first jsii request so python-backend-only servers never start node
+        with self._pool_lock:
+            if self._pool is None:
+                options = {}
+                if self.recycle_after and sys.version_info >= (3, 11):
+                    options['max_tasks_per_child'] = self.recycle_after
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_warm_worker,
+                    **options
+                )
+            return self._pool
+
+    def warm(self):
+        # start every worker now rather than on the first requests
+        pool = self.pool()
+        for future in [pool.submit(os.getpid) for _ in range(self.max_workers)]:
+            future.result()
+
+    def handle_request_payload(self, request):
+        command = request.get('command', 'synth')
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid()}
+        if command == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True}
+        if command != 'synth':
+            raise ValueError(f'unknown command {command}')
+        return self.synth(request)
+
+    def synth(self, request):
+        started = perf_counter()
+        backend = request.get('backend', 'jsii')
+        if backend not in BACKENDS:
+            raise ValueError(f'unknown backend {backend}, expected one of {", ".join(BACKENDS)}')
+        deployment = request['deployment']
+        if not os.path.isabs(deployment):
+            raise ValueError(f'deployment must be an absolute path, got {deployment}')
+        root_stack_id = request.get('root_stack_id', DEFAULT_ROOT_STACK)
+
+        with span('server.compile', deployment=deployment):
+            definition = DeploymentDefinition.load(deployment)
+            environment_configs, errors = compile_configs(
+                definition.compiler_arguments(), f'{root_stack_id}DefaultStack',
+                base_path=os.path.dirname(deployment))
+        if errors:
+            raise SchemaValidationError([error for environment_errors in errors.values() for error in environment_errors])
+        environment_configs = select_environments(environment_configs, request.get('environments'))
+        outdir = request.get('outdir') or tempfile.mkdtemp(prefix='assembly-', dir=self.workdir)
+
+        with span('server.synth', deployment=deployment, backend=backend):
+            if backend == 'python':
+                from .assembly import synth_configs
+                synth_configs(environment_configs, outdir, root_stack_id=root_stack_id)
+            else:
+                from .parallel_synth import _synth_group
+                self.pool().submit(
+                    _synth_group, outdir, list(environment_configs.items()), root_stack_id, request.get('context')
+                ).result()
+        return {
+            'ok': True,
+            'outdir': outdir,
+            'stacks': ([root_stack_id] if root_stack_id else []) + list(environment_configs),
+            'elapsed': perf_counter() - started,
+        }
+
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class SynthRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = self.server.handle_request_payload(json.loads(line))
+            except SchemaValidationError as error:
+                response = {'ok': False, 'error': 'invalid configs', 'errors': [str(item) for item in error.errors]}
+            except (ValueError, KeyError, OSError) as error:
+                logger.error('synth request failed: %s', error)
+                response = {'ok': False, 'error': f'{type(error).__name__}: {error}'}
+            except Exception as error:  # every failure goes back to the caller
+                logger.exception('synth request failed')
+                response = {'ok': False, 'error': f'{type(error).__name__}: {error}'}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class SynthError(Exception):
+
+    def __init__(self, response):
+        self.response = response
+        self.errors = response.get('errors', [])
+        super().__init__('\n\t'.join([response.get('error', 'synth failed')] + self.errors))
+
+
+class SynthClient(object):
+
+    def __init__(self, socket_path=None, timeout=None):
+        self.socket_path = socket_path or os.environ.get(SOCKET_ENV, DEFAULT_SOCKET)
+        self.timeout = timeout
+
+    def request(self, payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            connection.connect(self.socket_path)
+            connection.sendall(json.dumps(payload).encode() + b'\n')
+            with connection.makefile('rb') as stream:
+                response = json.loads(stream.readline())
+        if not response.get('ok'):
+            raise SynthError(response)
+        return response
+
+    def ping(self):
+        return self.request({'command': 'ping'})
+
+    def shutdown(self):
+        return self.request({'command': 'shutdown'})
+
+    def synth(self, deployment, environments=None, outdir=None, backend='jsii', context=None,
+              root_stack_id=DEFAULT_ROOT_STACK):
+        return self.request({
+            'command': 'synth',
+            'deployment': os.path.abspath(deployment),
+            'environments': environments,
+            'outdir': os.path.abspath(outdir) if outdir else None,
+            'backend': backend,
+            'context': context,
+            'root_stack_id': root_stack_id,
+        })
@@ -0,0 +1,89 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pure-Python description of every StackConstruct type and the options its
+# CDK construct accepts, so configs can be checked without importing aws_cdk.
+
+
+class OptionSpec(object):
+
+    def __init__(self, types, choices=None, items=None, required=False):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.choices = choices
+        self.items = items
+        self.required = required
+
+
+class ConstructSpec(object):
+
+    def __init__(self, config_key, construct_class, base_construct, options, defaults=None, module=None):
+        self.config_key = config_key
+        self.construct_class = construct_class
+        self.base_construct = base_construct
+        self.options = options
+        self.defaults = defaults or {}
+        self.module = module
+
+
+SUBNET_TYPES = ('public', 'private', 'isolated')
+TENANCIES = ('default', 'dedicated')
+EKS_VERSIONS = ('v1.18', 'v1.19', 'v1.20', 'v1.21')
+
+SUBNET_OPTIONS = {
+    'subnet_type': OptionSpec(str, choices=SUBNET_TYPES),
+    'cidr_mask': OptionSpec((int, str)),
+    'reserved': OptionSpec(bool),
+}
+
+VPC_SPEC = ConstructSpec(
+    config_key='vpc',
+    construct_class='AwsVpc',
+    base_construct='aws_ec2.Vpc',
+    module='vpc',
+    defaults={'cidr': '10.0.0.0/16'},
+    options={
+        'cidr': OptionSpec(str),
+        'default_instance_tenancy': OptionSpec(str, choices=TENANCIES),
+        'enable_dns_hostnames': OptionSpec(bool),
+        'enable_dns_support': OptionSpec(bool),
+        'flow_logs': OptionSpec(dict),
+        'gateway_endpoints': OptionSpec(dict),
+        'max_azs': OptionSpec(int),
+        'nat_gateways': OptionSpec(int),
+        'nat_gateway_subnets': OptionSpec(dict),
+        'subnet_configuration': OptionSpec(list, items=SUBNET_OPTIONS),
+        'vpc_name': OptionSpec(str),
+        'vpn_connections': OptionSpec(dict),
+        'vpn_gateway': OptionSpec(bool),
+        'vpn_gateway_asn': OptionSpec(int),
+        'vpn_route_propagation': OptionSpec(list),
+    },
+)
+
+EKS_CLUSTER_SPEC = ConstructSpec(
+    config_key='eks_cluster',
+    construct_class='EKSCluster',
+    base_construct='aws_eks.Cluster',
+    module='eks_cluster',
+    defaults={'version': 'v1.21'},
+    options={
+        'version': OptionSpec(str, choices=EKS_VERSIONS),
+        'cluster_name': OptionSpec(str),
+        'default_capacity': OptionSpec(int),
+        'default_capacity_instance': OptionSpec(str),
+        'default_capacity_type': OptionSpec(str, choices=('nodegroup', 'ec2')),
+        'endpoint_access': OptionSpec(str, choices=('public', 'private', 'public_and_private')),
+        'kubectl_environment': OptionSpec(dict),
+        'output_cluster_name': OptionSpec(bool),
+        'output_config_command': OptionSpec(bool),
+        'output_masters_role_arn': OptionSpec(bool),
+        'place_cluster_handler_in_vpc': OptionSpec(bool),
+        'prune': OptionSpec(bool),
+        'service_ipv4_cidr': OptionSpec(str),
+        'tags': OptionSpec(dict),
+    },
+)
+
+CONSTRUCT_SPECS = {spec.config_key: spec for spec in (VPC_SPEC, EKS_CLUSTER_SPEC)}
+
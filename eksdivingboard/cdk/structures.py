@@ -1,11 +1,19 @@
 import logging
-
-import aws_cdk.core
+from .frozen import thaw
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
 
 class StackConstruct(object):
+    # option name -> converter(construct, value); filled in by ConstructRegistry.register
+    _converters = {}
+    # a fragments.FragmentCache shared by every construct, see configure_fragments
+    fragments = None
+    # options that create resources outside the construct's scope; a jsii
+    # fragment cannot stand in for a construct built with any of them
+    fragment_excluded_options = frozenset()
+
     def __init__(self, scope, configs):
         self.scope = scope
         self.configs = configs
@@ -20,30 +28,32 @@ class StackConstruct(object):
         return options
 
     def build(self):
-        logger.debug(f'building {self.construct_type}s')
+        logger.debug('building %ss', self.construct_type)
         for key, options in self.configs.items():
-            logger.debug(f'building {self.construct_type} {key}: {options}')
-            params = self._construct_params(options)
-            self.constructs[key] = self.base_construct(
-                self.scope,
-                key,
-                **params
-            )
+            logger.debug('building %s %s: %s', self.construct_type, key, options)
+            with span('construct.build', construct=self.construct_type, construct_id=key):
+                self.constructs[key] = self._build_construct(key, options)
 
         return self.constructs
 
-    def __getattr__(self, attr):
-        if not super(StackConstruct, self).__getattribute__(attr):
-            return self.options.get(attr, None)
-        else:
-            return getattr(self, attr)
+    def _build_construct(self, key, options):
+        if self.fragments is not None:
+            cached = self.fragments.build(self, key, options)
+            if cached is not None:
+                return cached
+        return self.base_construct(self.scope, key, **self._construct_params(options))
 
     def _construct_params(self, params):
-        logger.debug(f'parsing params: {params}')
+        logger.debug('parsing params: %s', params)
+        converters = self._converters
         compiled_params = {}
         for key, values in self.set_defaults(params).items():
-            if getattr(self, key, None):
-                compiled_params[key] = getattr(self, key)(values)
-            else:
-                compiled_params[key] = values
+            converter = converters.get(key)
+            # aws_cdk wants plain dicts and lists, not frozen config nodes
+            compiled_params[key] = converter(self, values) if converter else thaw(values)
         return compiled_params
+
+
+def configure_fragments(cache):
+    # cache rendered constructs for every StackConstruct built from now on; None turns it off
+    StackConstruct.fragments = cache
@@ -0,0 +1,179 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+OPEN = '${'
+CLOSE = '}'
+_MISSING = object()
+
+
+class UndefinedVariablesError(ValueError):
+
+    def __init__(self, missing):
+        self.missing = missing
+        references = ', '.join(
+            f"{name} (at {'.'.join(str(part) for part in location) or '<root>'})"
+            for name, location in missing
+        )
+        super().__init__(f'Could not locate environment variables referenced: {references}')
+
+
+class VariableReference(object):
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+
+@lru_cache(maxsize=65536)
+def compile_template(source):
+    # Tokenizes source once into a tuple of literal strings and VariableReference
+    # parts; a reference's own parts may contain further references (${a_${b}}).
+    # Returns None for strings without any references.
+    if OPEN not in source:
+        return None
+    stack = [[]]
+    literal_start = 0
+    position = 0
+    length = len(source)
+    while position < length:
+        if source.startswith(OPEN, position):
+            if position > literal_start:
+                stack[-1].append(source[literal_start:position])
+            stack.append([])
+            position += len(OPEN)
+            literal_start = position
+        elif source[position] == CLOSE and len(stack) > 1:
+            if position > literal_start:
+                stack[-1].append(source[literal_start:position])
+            reference = VariableReference(tuple(stack.pop()))
+            stack[-1].append(reference)
+            position += 1
+            literal_start = position
+        else:
+            position += 1
+    if literal_start < length:
+        stack[-1].append(source[literal_start:])
+    # unterminated references are kept as literal text
+    while len(stack) > 1:
+        unclosed = stack.pop()
+        stack[-1].append(OPEN + ''.join(_source_text(part) for part in unclosed))
+    return tuple(stack[0])
+
+
+def _source_text(part):
+    if isinstance(part, VariableReference):
+        return OPEN + ''.join(_source_text(inner) for inner in part.parts) + CLOSE
+    return part
+
+
+class TemplateEngine(object):
+
+    def __init__(self, variables):
+        self.variables = variables
+
+    def render(self, source):
+        missing = []
+        value = self._render_value(source, missing, ())
+        if missing:
+            raise UndefinedVariablesError(missing)
+        return value
+
+    def _render_parts(self, parts, missing, location):
+        # a string that is exactly one reference keeps the variable's own type
+        if len(parts) == 1 and isinstance(parts[0], VariableReference):
+            return self._lookup(parts[0], missing, location)
+        rendered = []
+        for part in parts:
+            if isinstance(part, VariableReference):
+                value = self._lookup(part, missing, location)
+                rendered.append(_source_text(part) if value is _MISSING else str(value))
+            else:
+                rendered.append(part)
+        return ''.join(rendered)
+
+    def _lookup(self, reference, missing, location):
+        already_missing = len(missing)
+        name = self._render_parts(reference.parts, missing, location)
+        if name is _MISSING or len(missing) > already_missing:
+            return _MISSING
+        value = self.variables.get(str(name), _MISSING)
+        if value is _MISSING:
+            missing.append((name, location))
+        return value
+
+    def resolve(self, tree):
+        # resolves every string in tree in place with one visit per node and
+        # reports every undefined variable together
+        if isinstance(tree, str):
+            return self.render(tree)
+        missing = []
+        pending = [(tree, ())]
+        while pending:
+            container, location = pending.pop()
+            items = container.items() if isinstance(container, dict) else enumerate(container)
+            for key, value in items:
+                value_type = type(value)
+                if value_type is str:
+                    if OPEN in value:
+                        container[key] = self._render_value(value, missing, location + (key,))
+                elif value_type is dict or value_type is list:
+                    pending.append((value, location + (key,)))
+        if missing:
+            raise UndefinedVariablesError(missing)
+        return tree
+
+    def _render_value(self, source, missing, location):
+        template = compile_template(source)
+        if template is None:
+            return source
+        value = self._render_parts(template, missing, location)
+        return source if value is _MISSING else value
+
+    @staticmethod
+    def index(tree, location=()):
+        # key paths of every templated string in tree, so a shared base can be
+        # resolved per environment without walking it again
+        paths = []
+        pending = [(tree, location)]
+        while pending:
+            container, container_location = pending.pop()
+            items = container.items() if isinstance(container, dict) else enumerate(container)
+            for key, value in items:
+                value_type = type(value)
+                if value_type is str:
+                    if OPEN in value:
+                        paths.append(container_location + (key,))
+                elif value_type is dict or value_type is list:
+                    pending.append((value, container_location + (key,)))
+        return paths
+
+    def resolve_paths(self, tree, paths):
+        # like resolve() but leaves tree untouched: containers on the path to a
+        # rendered value are copied once and every other subtree is shared
+        missing = []
+        owned = set()
+        for path in paths:
+            value = tree
+            try:
+                for key in path:
+                    value = value[key]
+            except (KeyError, IndexError, TypeError):
+                continue
+            if type(value) is not str:
+                continue
+            rendered = self._render_value(value, missing, path)
+            if rendered is not value:
+                tree = self._assign(tree, path, rendered, owned)
+        if missing:
+            raise UndefinedVariablesError(missing)
+        return tree
+
+    def _assign(self, container, path, value, owned):
+        if id(container) not in owned:
+            container = dict(container) if isinstance(container, dict) else list(container)
+            owned.add(id(container))
+        key = path[0]
+        container[key] = value if len(path) == 1 else self._assign(container[key], path[1:], value, owned)
+        return container
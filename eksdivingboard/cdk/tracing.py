@@ -0,0 +1,171 @@
+import os
+import sys
+import glob
+import json
+import atexit
+import logging
+import threading
+from time import perf_counter_ns
+
+logger = logging.getLogger(__name__)
+
+TRACE_ENV = 'EKSDIVE_TRACE'
+# pid of the process that owns the trace file; spawned workers inherit both
+# variables, write their events to <output>.<pid>.part and leave the trace
+# file and the summary to the owner, which merges the parts when it exits
+TRACE_OWNER_ENV = 'EKSDIVE_TRACE_OWNER'
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.start, perf_counter_ns() - self.start, self.args)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class Tracer(object):
+    # Records phase spans for compile and synth. While disabled span() hands back
+    # one shared no-op context manager, so instrumented code pays a single
+    # attribute check.
+
+    def __init__(self):
+        self.enabled = False
+        self.output = None
+        self.events = []
+        self._lock = threading.Lock()
+        self._origin = perf_counter_ns()
+        self._exit_hook = False
+        self.worker = False
+
+    def enable(self, output=None):
+        self.enabled = True
+        self.output = output
+        owner = os.environ.get(TRACE_OWNER_ENV)
+        self.worker = owner is not None and owner != str(os.getpid())
+        if not self.worker:
+            os.environ[TRACE_OWNER_ENV] = str(os.getpid())
+        if not self._exit_hook:
+            atexit.register(self.finish)
+            self._exit_hook = True
+        logger.info('phase tracing enabled, writing to %s', output or '<memory>')
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def record(self, name, start, duration, args):
+        event = (name, start, duration, os.getpid(), threading.get_ident(), args)
+        with self._lock:
+            self.events.append(event)
+
+    def chrome_trace(self):
+        return {
+            'traceEvents': [
+                {
+                    'name': name,
+                    'cat': 'eksdivingboard',
+                    'ph': 'X',
+                    'ts': (start - self._origin) / 1000,
+                    'dur': duration / 1000,
+                    'pid': pid,
+                    'tid': tid,
+                    'args': {key: str(value) for key, value in args.items()},
+                }
+                for name, start, duration, pid, tid, args in self.events
+            ],
+            'displayTimeUnit': 'ms',
+        }
+
+    def export(self, output):
+        with open(output, 'w') as stream:
+            json.dump(self.chrome_trace(), stream)
+        logger.info('wrote %d trace events to %s', len(self.events), output)
+
+    def summary(self):
+        totals = {}
+        for name, _start, duration, _pid, _tid, _args in self.events:
+            count, total, longest = totals.get(name, (0, 0, 0))
+            totals[name] = (count + 1, total + duration, max(longest, duration))
+        rows = [f"{'phase':<32} {'count':>7} {'total ms':>10} {'mean ms':>10} {'max ms':>10}"]
+        for name, (count, total, longest) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            rows.append(f'{name:<32} {count:>7} {total / 1e6:>10.2f} {total / count / 1e6:>10.3f} '
+                        f'{longest / 1e6:>10.3f}')
+        return '\n'.join(rows)
+
+    def write_part(self):
+        # a worker's events, start times on the shared monotonic clock
+        with open(f'{self.output}.{os.getpid()}.part', 'w') as stream:
+            json.dump([[name, start, duration, pid, tid, {key: str(value) for key, value in args.items()}]
+                       for name, start, duration, pid, tid, args in self.events], stream)
+
+    def merge_parts(self):
+        merged = 0
+        for part_file in glob.glob(f'{glob.escape(self.output)}.*.part'):
+            try:
+                with open(part_file, 'r') as stream:
+                    events = json.load(stream)
+            except (OSError, ValueError) as error:
+                logger.warning('skipping unreadable trace part %s: %s', part_file, error)
+                continue
+            with self._lock:
+                self.events.extend(tuple(event) for event in events)
+            os.unlink(part_file)
+            merged += 1
+        return merged
+
+    def finish(self):
+        # each event is written once, however often this runs
+        if self.worker:
+            if self.output and self.events:
+                self.write_part()
+            self.events = []
+            return
+        if self.output:
+            self.merge_parts()
+        if not self.events:
+            return
+        if self.output:
+            self.export(self.output)
+        print(self.summary(), file=sys.stderr)
+        self.events = []
+
+
+tracer = Tracer()
+span = tracer.span
+
+if os.environ.get(TRACE_ENV):
+    tracer.enable(None if os.environ[TRACE_ENV] == '1' else os.environ[TRACE_ENV])
@@ -1,14 +1,34 @@
-from aws_cdk import (
-    aws_ec2 as ec2,
-    aws_logs as logs,
-)
+from .lazy import lazy_import
 from .structures import StackConstruct
+from .schemas import SCHEMAS
+from .registry import register_construct
+from .cidr import mask_length
+from functools import lru_cache
+from .tracing import span
 import logging
 
+ec2 = lazy_import('aws_cdk.aws_ec2')
+logs = lazy_import('aws_cdk.aws_logs')
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def subnet_type_for(name):
+    return getattr(ec2.SubnetType, name.upper())
+
+
+@lru_cache(maxsize=None)
+def instance_tenancy(name):
+    return getattr(ec2.DefaultInstanceTenancy, name.upper())
+
+
+@register_construct('vpc')
 class AwsVpc(StackConstruct):
+    schema = SCHEMAS['vpc']
+    # the flow log's LogGroup is created in the stack, not under the Vpc
+    fragment_excluded_options = frozenset({'flow_logs'})
+
     def __init__(self, scope, configs):
         super().__init__(scope, configs)
         self.constructs = {}
@@ -18,27 +38,23 @@ class AwsVpc(StackConstruct):
 
     @staticmethod
     def set_defaults(options):
-        options.setdefault('cidr', '10.0.0.0/16')
-        return options
+        # a new mapping: compiled configs are shared between environments and may be frozen
+        return {'cidr': '10.0.0.0/16', **options}
 
     def build(self):
-        logger.debug(f'building {self.construct_type}')
+        logger.debug('building %s', self.construct_type)
         for key in self.configs:
             options = self.configs[key]
             # for key, options in self.configs.items():
-            logger.debug(f'building {self.construct_type} {key}')
-            params = self._construct_params(options)
-            self.constructs[key] = self.base_construct(
-                self.scope,
-                key,
-                **params
-            )
+            logger.debug('building %s %s', self.construct_type, key)
+            with span('construct.build', construct=self.construct_type, construct_id=key):
+                self.constructs[key] = self._build_construct(key, options)
 
         return self.constructs
 
     @staticmethod
     def default_instance_tenancy(string_value):
-        return getattr(ec2.DefaultInstanceTenancy, string_value.upper())
+        return instance_tenancy(string_value)
 
     def flow_logs(self, destination=None, traffic_type=None):
         def _to_cloud_watch_logs(**kwargs):
@@ -79,13 +95,11 @@ class AwsVpc(StackConstruct):
         for subnet in configuration:
             for k, v in subnet.items():
                 config_name = k
-                subnet_type = getattr(
-                        ec2.SubnetType, v['subnet_type'].upper()
-                    ) if v.get('subnet_type') else None
+                subnet_type = subnet_type_for(v['subnet_type']) if v.get('subnet_type') else None
                 mask = v.get('cidr_mask', None)
-                if isinstance(mask, str):
-                    mask = int(mask[v['cidr_mask'].find('/')+1:]) if mask.find('/') else int(mask)
-                logger.debug(f"Subnet {config_name} mask {mask}")
+                if mask is not None:
+                    mask = mask_length(mask)
+                logger.debug("Subnet %s mask %s", config_name, mask)
                 subnets.append(
                     ec2.SubnetConfiguration(
                         name=config_name,
@@ -0,0 +1,328 @@
+import os
+import sys
+import errno
+import struct
+import select
+import logging
+from time import monotonic, sleep
+from .compiler import ConfigsCompiler
+from .incremental import config_fingerprint
+from .emitter import emit_stack
+from .assembly import write_assembly
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+# editors write a file in several steps; changes arriving this close together
+# are handled as one batch
+DEBOUNCE_SECONDS = 0.05
+
+
+class Watcher(object):
+    # Reports changed files under a set of directory roots, plus single files
+    # watched through their parent directory. wait() blocks until something
+    # changes and returns the changed paths, or None when the change set was
+    # lost and the caller should rescan.
+
+    def __init__(self, roots, files=(), extension='.yaml'):
+        self.roots = sorted({os.path.normpath(os.path.abspath(root)) for root in roots if root})
+        self.files = {os.path.normpath(os.path.abspath(file_name)) for file_name in files if file_name}
+        self.extension = extension
+
+    def relevant(self, path):
+        return path in self.files or (path.endswith(self.extension) and any(
+            path.startswith(root + os.sep) for root in self.roots))
+
+    def directories(self):
+        for root in self.roots:
+            for directory, subdirectories, _files in os.walk(root):
+                subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+                yield directory
+        for file_name in self.files:
+            yield os.path.dirname(file_name)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(Watcher):
+
+    def __init__(self, roots, files=(), extension='.yaml'):
+        super().__init__(roots, files, extension)
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watches = {}
+        for directory in self.directories():
+            self._add_watch(directory)
+        logger.info('watching %d directories with inotify', len(self._watches))
+
+    def _add_watch(self, directory):
+        descriptor = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if descriptor < 0:
+            error = self._ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(error, f'inotify_add_watch {directory}: {os.strerror(error)}')
+        self._watches[descriptor] = directory
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return set(), False
+        changed = set()
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            directory = self._watches.get(descriptor)
+            if mask & IN_IGNORED:
+                self._watches.pop(descriptor, None)
+                continue
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    # files can land in a new directory before its watch exists
+                    for new_directory, subdirectories, files in os.walk(path):
+                        subdirectories[:] = [item for item in subdirectories if not item.startswith('.')]
+                        self._add_watch(new_directory)
+                        changed.update(os.path.join(new_directory, file_name) for file_name in files)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    overflow = True
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                overflow = overflow or any(path == root or path.startswith(root + os.sep) for root in self.roots)
+                continue
+            changed.add(path)
+        return {path for path in changed if self.relevant(path)}, overflow
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        changed = set()
+        overflow = False
+        while True:
+            if changed or overflow:
+                wait_for = DEBOUNCE_SECONDS
+            else:
+                wait_for = None if deadline is None else max(0, deadline - monotonic())
+            ready, _, _ = select.select([self.fd], [], [], wait_for)
+            if not ready:
+                if overflow:
+                    return None
+                if changed or deadline is not None:
+                    return changed
+                continue
+            batch, batch_overflow = self._read()
+            changed |= batch
+            overflow = overflow or batch_overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher(Watcher):
+    # Fallback for platforms without inotify: compares (mtime, size) snapshots.
+
+    def __init__(self, roots, files=(), extension='.yaml', interval=0.5):
+        super().__init__(roots, files, extension)
+        self.interval = interval
+        self._snapshot = self.snapshot()
+        logger.info('polling %d files every %ss', len(self._snapshot), interval)
+
+    def snapshot(self):
+        found = {}
+        for directory in set(self.directories()):
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_file() and self.relevant(entry.path):
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            snapshot = self.snapshot()
+            changed = {
+                path for path in set(snapshot) | set(self._snapshot)
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            if deadline is not None and monotonic() >= deadline:
+                return set()
+            sleep(self.interval)
+
+
+def create_watcher(roots, files=(), extension='.yaml', poll=False, interval=0.5):
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(roots, files, extension)
+        except (OSError, AttributeError) as error:
+            logger.warning('inotify is unavailable (%s), falling back to polling', error)
+    return PollingWatcher(roots, files, extension, interval)
+
+
+class WatchSession(object):
+    # Keeps a compiled deployment, every parsed file and the emitted templates
+    # in memory. update() re-parses only the changed files; when they are all
+    # environment overlays only those environments are recompiled on the
+    # existing base, and only stacks whose compiled config changed are
+    # re-emitted and rewritten.
+
+    def __init__(self, compiler_arguments, outdir, root_stack_id=None,
+                 default_environment='InfrastructureStackDefaultStack', path_metadata=True):
+        self.compiler_arguments = compiler_arguments
+        self.outdir = outdir
+        self.root_stack_id = root_stack_id
+        self.default_environment = default_environment
+        self.path_metadata = path_metadata
+        self.parsed_files = {}
+        self.compiler = None
+        self.environment_configs = {}
+        self.fingerprints = {}
+        self.templates = {}
+
+    def watched_roots(self):
+        compiler = self.compiler
+        roots = [compiler._defaults_root, compiler._common_files_root, compiler._deploy_root,
+                 compiler._environment_files_root]
+        roots.extend(os.path.dirname(file_name) for overlay in compiler.environment_overlays.values()
+                     for file_name in overlay['files'])
+        return [root for root in roots if root and os.path.isdir(root)]
+
+    def build(self):
+        compiler = ConfigsCompiler(parsed_files=self.parsed_files, **self.compiler_arguments)
+        environment_configs = compiler.compile_stack_configs(self.default_environment)
+        self.compiler = compiler
+        return self._apply(environment_configs, rebuild_all=not self.templates)
+
+    def update(self, changed):
+        # changed: paths reported by a Watcher, or None to rebuild from scratch
+        if changed is None:
+            self.parsed_files.clear()
+            return self.build()
+        changed = {os.path.normpath(path) for path in changed}
+        for path in changed:
+            self.parsed_files.pop(path, None)
+        overlay_environments = {
+            name for name, overlay in self.compiler.environment_overlays.items()
+            if changed.intersection(os.path.normpath(file_name) for file_name in overlay['files'])
+        }
+        overlay_files = {
+            os.path.normpath(file_name) for overlay in self.compiler.environment_overlays.values()
+            for file_name in overlay['files']
+        }
+        if changed <= overlay_files and all(os.path.isfile(path) for path in changed):
+            with span('watch.environments', environments=len(overlay_environments)):
+                environment_configs = dict(self.environment_configs)
+                for name in overlay_environments:
+                    environment_configs[name] = self.compiler.compile_environment(name)
+            return self._apply(environment_configs)
+        return self.build()
+
+    def _apply(self, environment_configs, rebuild_all=False):
+        errors = self.compiler.validate(environment_configs)
+        for name, environment_errors in errors.items():
+            for error in environment_errors:
+                logger.error('%s: %s', name, error)
+        changed_stacks = []
+        with span('watch.emit'):
+            for name, configs in environment_configs.items():
+                if name in errors:
+                    # keep serving the last good template for a broken environment
+                    if name in self.environment_configs:
+                        environment_configs[name] = self.environment_configs[name]
+                    continue
+                fingerprint = config_fingerprint(configs)
+                if not rebuild_all and self.fingerprints.get(name) == fingerprint and name in self.templates:
+                    continue
+                self.templates[name] = emit_stack(name, configs, self.path_metadata)
+                self.fingerprints[name] = fingerprint
+                changed_stacks.append(name)
+            if self.root_stack_id and self.root_stack_id not in self.templates:
+                self.templates[self.root_stack_id] = emit_stack(self.root_stack_id, {}, self.path_metadata)
+                changed_stacks.append(self.root_stack_id)
+
+        removed = [name for name in self.environment_configs if name not in environment_configs]
+        for name in removed:
+            self.templates.pop(name, None)
+            self.fingerprints.pop(name, None)
+            template_file = os.path.join(self.outdir, f'{name}.template.json')
+            if os.path.exists(template_file):
+                os.unlink(template_file)
+        self.environment_configs = environment_configs
+
+        if changed_stacks or removed:
+            order = ([self.root_stack_id] if self.root_stack_id else []) + list(environment_configs)
+            templates = [self.templates[name] for name in order if name in self.templates]
+            with span('watch.write', stacks=len(changed_stacks)):
+                write_assembly(templates, self.outdir, stacks=set(changed_stacks))
+        return changed_stacks
+
+
+def watch(session, poll=False, interval=0.5, extra_files=(), on_update=None):
+    # Runs until interrupted. extra_files (e.g. the deployment definition) are
+    # watched too; callers rebuild the session themselves when those change.
+    with span('watch.build'):
+        session.build()
+    logger.info('wrote %d stacks to %s, watching for changes', len(session.templates), session.outdir)
+    watcher = create_watcher(session.watched_roots(), files=extra_files, poll=poll, interval=interval)
+    try:
+        while True:
+            changed = watcher.wait()
+            if changed is not None and not changed:
+                continue
+            started = monotonic()
+            try:
+                stacks = on_update(changed) if on_update else session.update(changed)
+            except Exception as error:  # keep watching through broken edits
+                logger.error('rebuild failed: %s', error)
+                continue
+            logger.info('%s -> rewrote %s in %.0fms',
+                        ', '.join(sorted(changed)) if changed else 'rescan',
+                        ', '.join(stacks) if stacks else 'nothing', (monotonic() - started) * 1000)
+            roots = session.watched_roots()
+            if set(os.path.normpath(root) for root in roots) != set(watcher.roots):
+                watcher.close()
+                watcher = create_watcher(roots, files=extra_files, poll=poll, interval=interval)
+    finally:
+        watcher.close()
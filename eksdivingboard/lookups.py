@@ -0,0 +1,47 @@
+# Context lookups for sandboxed builds. After a synth has recorded the lookups
+# it needs, `prefetch` answers all of them in one batch of AWS calls and saves
+# them to cdk.lookups.json; app.py hands that file to cdk.App as context.
+#
+#   python3 lookups.py prefetch --outdir cdk.out    # needs AWS credentials
+#   python3 lookups.py check --outdir cdk.out       # lists every lookup missing from the cache
+#   python3 lookups.py list
+import sys
+import argparse
+from cdk import configure_logging
+from cdk.lookups import LOOKUP_CACHE_FILE, AwsBackend, LookupCache, MissingLookupsError, check_lookups, prefetch_lookups
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prefetch and check cached context lookups.')
+    parser.add_argument('--cache', default=LOOKUP_CACHE_FILE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command, description in (('prefetch', 'fetch every lookup the assembly is missing'),
+                                 ('check', 'fail when the assembly needs lookups the cache does not hold')):
+        command_parser = commands.add_parser(command, help=description)
+        command_parser.add_argument('--outdir', default='cdk.out', help='an assembly synthesized with the cache')
+    commands.add_parser('list', help='show the cached lookups')
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    cache = LookupCache.load(args.cache)
+    try:
+        if args.command == 'prefetch':
+            fetched = prefetch_lookups(args.outdir, cache, AwsBackend())
+            logger.info('%d lookups fetched, %d cached in %s', len(fetched), len(cache.entries), args.cache)
+        elif args.command == 'check':
+            check_lookups(args.outdir, cache)
+            logger.info('every lookup in %s is cached', args.outdir)
+        else:
+            for key, entry in sorted(cache.entries.items()):
+                print(f'{entry["fetched"]}  {key}')
+    except MissingLookupsError as error:
+        logger.error('%s', error)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
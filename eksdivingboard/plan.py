@@ -0,0 +1,89 @@
+# Compiles a deployment, resolves its variables and checks every construct's
+# options without importing aws_cdk, then prints the stacks and constructs
+# `cdk synth` would build. Exits non-zero when anything is invalid.
+#
+#   python3 plan.py                                  # same roots as app.py
+#   python3 plan.py --deployment ../deployments/example.yaml
+import sys
+import argparse
+from os import (
+    path, getcwd
+)
+from cdk.compiler import ConfigsCompiler
+from cdk.deployment import DeploymentDefinition
+from cdk.specs import CONSTRUCT_SPECS
+import logging
+
+logger = logging.getLogger(__name__)
+
+current_path = getcwd()
+configs_root = path.join(current_path, "../deployments/example/")
+defaults_root = path.join(current_path, "../deployments/defaults/")
+environments_root = path.join(current_path, "../deployments/example/environments/")
+
+
+def summarize_options(options):
+    summary = []
+    for option, value in options.items():
+        if isinstance(value, list):
+            summary.append(f'{option}=[{len(value)}]')
+        elif isinstance(value, dict):
+            summary.append(f'{option}={{{len(value)}}}')
+        else:
+            summary.append(f'{option}={value}')
+    return ' '.join(summary)
+
+
+def print_plan(environment_configs, stream=sys.stdout):
+    for environment, configs in environment_configs.items():
+        print(f'Stack {environment}', file=stream)
+        for key, constructs in configs.items():
+            spec = CONSTRUCT_SPECS.get(key)
+            description = f'{spec.construct_class} -> {spec.base_construct}' if spec else 'unknown construct'
+            print(f'  {key} ({description})', file=stream)
+            if isinstance(constructs, dict):
+                for name, options in constructs.items():
+                    if spec and isinstance(options, dict):
+                        options = {**spec.defaults, **options}
+                    print(f'    {name}: {summarize_options(options) if isinstance(options, dict) else options}',
+                          file=stream)
+
+
+def plan(compiler, default_environment="InfrastructureStackDefaultStack"):
+    environment_configs = compiler.compile_stack_configs(default_environment)
+    return environment_configs, compiler.validate(environment_configs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate configs and print the synth plan offline.')
+    parser.add_argument('--deployment', help='deployment definition file, e.g. ../deployments/example.yaml')
+    parser.add_argument('--deploy-root', default=configs_root)
+    parser.add_argument('--defaults-root', default=defaults_root)
+    parser.add_argument('--environments-root', default=environments_root)
+    parser.add_argument('--quiet', action='store_true', help='only report errors')
+    args = parser.parse_args(argv)
+
+    if args.deployment:
+        compiler = ConfigsCompiler(**DeploymentDefinition.load(args.deployment).compiler_arguments())
+    else:
+        compiler = ConfigsCompiler(
+            deploy_root=args.deploy_root,
+            defaults_root=args.defaults_root,
+            environments_root=args.environments_root,
+        )
+    try:
+        environment_configs, errors = plan(compiler)
+    except (ValueError, FileNotFoundError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print_plan(environment_configs)
+    for environment, environment_errors in errors.items():
+        for error in environment_errors:
+            print(f'error: {environment}: {error}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
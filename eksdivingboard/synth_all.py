@@ -0,0 +1,46 @@
+# Synthesizes a set of deployments in one process, one cloud assembly each,
+# parsing the defaults and common files they share only once.
+#
+#   python3 synth_all.py ../deployments                       # every *.yaml definition in the directory
+#   python3 synth_all.py ../deployments/example.yaml other.yaml --outdir cdk.out --backend python
+import sys
+import argparse
+from cdk import configure_logging
+from cdk.batch import BACKENDS, find_definitions, synth_all
+from cdk.fragments import FragmentCache
+from cdk.parallel_synth import configured_workers
+from cdk.schemas import SchemaValidationError
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Synthesize many deployment definitions in one process.')
+    parser.add_argument('definitions', nargs='+',
+                        help='deployment definition files, or directories holding them')
+    parser.add_argument('--outdir', default='cdk.out', help='each deployment is written to <outdir>/<name>')
+    parser.add_argument('--backend', choices=BACKENDS, default='jsii')
+    parser.add_argument('--workers', type=int, default=configured_workers(),
+                        help='synthesize deployments in this many jsii worker processes')
+    parser.add_argument('--freeze', action='store_true',
+                        help='compile to frozen configs that share identical subtrees across deployments')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='store each distinct template and file asset once per assembly')
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    definitions = find_definitions(args.definitions)
+    if not definitions:
+        parser.error('no deployment definitions found')
+    try:
+        synth_all(definitions, args.outdir, backend=args.backend, max_workers=args.workers,
+                  dedupe=args.dedupe, fragments=FragmentCache.from_environment(), freeze=args.freeze or None)
+    except SchemaValidationError as error:
+        logger.error('%s', error)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# Runs a long-lived synth server so repeated synths skip the aws_cdk import and
+# jsii start-up, and sends synth requests to it.
+#
+#   python3 synth_server.py serve --socket /tmp/eksdive.sock --workers 4
+#   python3 synth_server.py synth ../deployments/example.yaml --environments dev --outdir cdk.out
+import sys
+import json
+import argparse
+from cdk import configure_logging
+from cdk.server import SOCKET_ENV, DEFAULT_SOCKET, BACKENDS, RECYCLE_AFTER, SynthServer, SynthClient, SynthError
+from os import environ
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def serve(args):
+    server = SynthServer(args.socket, max_workers=args.workers, workdir=args.workdir,
+                         recycle_after=args.recycle_after)
+    if args.warm:
+        server.warm()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def synth(args):
+    client = SynthClient(args.socket)
+    try:
+        response = client.synth(args.deployment, environments=args.environments, outdir=args.outdir,
+                                backend=args.backend)
+    except SynthError as error:
+        logger.error('%s', error)
+        return 1
+    print(json.dumps(response, indent=2))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Synthesize deployments through a warm synth server.')
+    parser.add_argument('--socket', default=environ.get(SOCKET_ENV, DEFAULT_SOCKET))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='start the server')
+    serve_parser.add_argument('--workers', type=int, help='jsii worker processes, defaults to the cpu count')
+    serve_parser.add_argument('--workdir', help='where assemblies without an --outdir are written')
+    serve_parser.add_argument('--recycle-after', type=int, default=RECYCLE_AFTER,
+                              help='replace a jsii worker after this many synths, 0 to never')
+    serve_parser.add_argument('--warm', action='store_true', help='start every jsii worker before serving')
+    serve_parser.set_defaults(handler=serve)
+
+    synth_parser = commands.add_parser('synth', help='synthesize a deployment definition')
+    synth_parser.add_argument('deployment')
+    synth_parser.add_argument('--environments', nargs='*')
+    synth_parser.add_argument('--outdir')
+    synth_parser.add_argument('--backend', choices=BACKENDS, default='jsii')
+    synth_parser.set_defaults(handler=synth)
+
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# Keeps the deployment compiled in memory and rewrites cdk.out with the Python
+# backend whenever a config file changes, so `cdk deploy --app cdk.out` and
+# `cdk diff --app cdk.out` always see the current configs without a synth.
+#
+#   python3 watch.py                                   # same roots as app.py
+#   python3 watch.py --deployment ../deployments/example.yaml --outdir cdk.out
+import sys
+import argparse
+from os import (
+    path, getcwd
+)
+from cdk import configure_logging
+from cdk.deployment import DeploymentDefinition
+from cdk.watch import WatchSession, watch
+import logging
+
+logger = logging.getLogger(__name__)
+
+current_path = getcwd()
+configs_root = path.join(current_path, "../deployments/example/")
+defaults_root = path.join(current_path, "../deployments/defaults/")
+environments_root = path.join(current_path, "../deployments/example/environments/")
+
+
+def compiler_arguments(args):
+    if args.deployment:
+        return DeploymentDefinition.load(args.deployment).compiler_arguments()
+    return {
+        'deploy_root': args.deploy_root,
+        'defaults_root': args.defaults_root,
+        'environments_root': args.environments_root,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompile configs and rewrite templates as files change.')
+    parser.add_argument('--deployment', help='deployment definition file, e.g. ../deployments/example.yaml')
+    parser.add_argument('--deploy-root', default=configs_root)
+    parser.add_argument('--defaults-root', default=defaults_root)
+    parser.add_argument('--environments-root', default=environments_root)
+    parser.add_argument('--outdir', default='cdk.out')
+    parser.add_argument('--poll', action='store_true', help='poll for changes instead of using inotify')
+    parser.add_argument('--interval', type=float, default=0.5, help='polling interval in seconds')
+    args = parser.parse_args(argv)
+    configure_logging(logging.INFO)
+
+    session = WatchSession(compiler_arguments(args), args.outdir, root_stack_id="InfrastructureStack")
+    definition_file = path.normpath(path.abspath(args.deployment)) if args.deployment else None
+
+    def on_update(changed):
+        if definition_file and (changed is None or definition_file in changed):
+            session.compiler_arguments = compiler_arguments(args)
+            return session.update(None)
+        return session.update(changed)
+
+    try:
+        watch(session, poll=args.poll, interval=args.interval,
+              extra_files=[definition_file] if definition_file else (), on_update=on_update)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
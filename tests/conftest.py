@@ -1,20 +1,21 @@
 import pytest
-from aws_cdk import core as cdk
 import logging
-from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
 from os import (
     path, getcwd
 )
 logger = logging.getLogger(__name__)
 
 
+# aws_cdk is imported by the fixtures that need it, so the compiler tests run without it
 @pytest.fixture(scope="session")
 def app():
+    cdk = pytest.importorskip('aws_cdk.core')
     return cdk.App()
 
 
 @pytest.fixture(scope="session")
 def stack(app):
+    from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
     current_path = getcwd()
     configs_root = path.join(current_path, "tests/fixtures/example/")
     defaults_root = path.join(current_path, "tests/fixtures/defaults/")
@@ -0,0 +1,28 @@
+import os
+import sys
+import shutil
+import subprocess
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(TESTS_DIR, 'fixtures')
+APP = os.path.join(os.path.dirname(TESTS_DIR), 'eksdivingboard', 'app.py')
+
+
+def _app(tmp_path, **environ):
+    # app.py reads ../deployments/example from its working directory
+    shutil.copytree(FIXTURES, tmp_path / 'deployments')
+    (tmp_path / 'app').mkdir()
+    return lambda: subprocess.run([sys.executable, APP], cwd=tmp_path / 'app', capture_output=True, text=True,
+                                  env=dict(os.environ, **environ))
+
+
+@pytest.mark.parametrize('environ', [{'EKSDIVE_SYNTH_WORKERS': '2'}, {'EKSDIVE_INCREMENTAL': '1'}])
+def test_parallel_synth_rejects_invalid_configs(tmp_path, environ):
+    run = _app(tmp_path, CDK_OUTDIR=str(tmp_path / 'cdk.out'), **environ)
+    vpc_file = tmp_path / 'deployments' / 'example' / 'default_vpc.yaml'
+    vpc_file.write_text(vpc_file.read_text().replace('max_azs: 4', "max_azs: 'many'"))
+    result = run()
+    assert result.returncode == 1
+    assert 'SchemaValidationError' in result.stderr and 'max_azs' in result.stderr
+    assert not (tmp_path / 'cdk.out').exists()
@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import pytest
+from eksdivingboard.cdk import compiler
+from eksdivingboard.cdk.batch import BatchCompiler, find_definitions, synth_all
+from eksdivingboard.cdk.schemas import SchemaValidationError
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _estate(tmp_path):
+    # two deployments sharing the defaults tree
+    shutil.copytree(FIXTURES, tmp_path / 'deployments')
+    shutil.copy(tmp_path / 'deployments/example.yaml', tmp_path / 'deployments/staging.yaml')
+    return tmp_path / 'deployments'
+
+
+def test_shared_files_are_parsed_once(tmp_path, monkeypatch):
+    deployments = _estate(tmp_path)
+    parsed = []
+    load_yaml_file = compiler.load_yaml_file
+
+    def counting_load(file_name):
+        parsed.append(file_name)
+        return load_yaml_file(file_name)
+
+    monkeypatch.setattr(compiler, 'load_yaml_file', counting_load)
+
+    batch = BatchCompiler(find_definitions([str(deployments)]))
+    compiled = batch.compile()
+    assert list(compiled) == ['example', 'staging']
+    assert compiled['example'] == compiled['staging']
+    assert sorted(parsed) == sorted(set(parsed)) == sorted(batch.parsed_files)
+
+
+def test_each_deployment_gets_its_own_assembly(tmp_path):
+    deployments = _estate(tmp_path)
+    assemblies = synth_all(find_definitions([str(deployments)]), str(tmp_path / 'cdk.out'), backend='python')
+    assert assemblies == {name: str(tmp_path / 'cdk.out' / name) for name in ('example', 'staging')}
+    for assembly in assemblies.values():
+        with open(os.path.join(assembly, 'manifest.json')) as stream:
+            assert list(json.load(stream)['artifacts']) == ['InfrastructureStack', 'dev', 'test', 'prod', 'Tree']
+
+
+def test_errors_from_every_deployment_are_reported(tmp_path):
+    deployments = _estate(tmp_path)
+    vpc_file = deployments / 'example/default_vpc.yaml'
+    vpc_file.write_text(vpc_file.read_text().replace('max_azs: 4', "max_azs: 'many'"))
+    with pytest.raises(SchemaValidationError) as error:
+        BatchCompiler(find_definitions([str(deployments)])).compile()
+    assert {message.split('/')[0] for message in error.value.errors} == {'example', 'staging'}
+
+    with pytest.raises(ValueError, match='unique'):
+        BatchCompiler([str(deployments / 'example.yaml')] * 2)
+
+
+def test_interner_is_not_added_to_the_callers_options(tmp_path):
+    deployments = _estate(tmp_path)
+    options = {'freeze': True}
+    batch = BatchCompiler(find_definitions([str(deployments)]), **options)
+    assert options == {'freeze': True}
+    assert batch.compiler_options['interner'] is not None
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_jsii_assemblies_match_the_python_backend(tmp_path, max_workers):
+    pytest.importorskip('aws_cdk')
+    definitions = find_definitions([str(_estate(tmp_path))])
+    python = synth_all(definitions, str(tmp_path / 'python.out'), backend='python')
+    jsii = synth_all(definitions, str(tmp_path / 'jsii.out'), backend='jsii', max_workers=max_workers,
+                     context={'aws:cdk:enable-path-metadata': True})
+    for name, assembly in jsii.items():
+        with open(os.path.join(assembly, 'manifest.json')) as stream:
+            assert list(json.load(stream)['artifacts']) == ['Tree', 'InfrastructureStack', 'dev', 'test', 'prod']
+        for stack in ('dev', 'test', 'prod'):
+            with open(os.path.join(assembly, f'{stack}.template.json')) as stream:
+                template = json.load(stream)
+            with open(os.path.join(python[name], f'{stack}.template.json')) as stream:
+                assert template == json.load(stream)
@@ -0,0 +1,62 @@
+import os
+import json
+from eksdivingboard.cdk.assembly import synth_configs
+from eksdivingboard.cdk.blobstore import BLOB_DIR, BlobStore, dedupe_assembly, directory_uploader
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _synth(outdir):
+    definition = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml'))
+    environment_configs = ConfigsCompiler(**definition.compiler_arguments()).compile_stack_configs('default')
+    # a stack that renders to the same template as the root stack
+    environment_configs['empty'] = {}
+    synth_configs(environment_configs, str(outdir), root_stack_id='InfrastructureStack', path_metadata=False)
+
+
+def _templates(outdir):
+    with open(outdir / 'manifest.json') as stream:
+        artifacts = json.load(stream)['artifacts']
+    return {name: artifact['properties']['templateFile'] for name, artifact in artifacts.items()
+            if artifact['type'] == 'aws:cloudformation:stack'}
+
+
+def test_identical_templates_are_stored_once(tmp_path):
+    outdir = tmp_path / 'cdk.out'
+    _synth(outdir)
+    dev_template = (outdir / 'dev.template.json').read_text()
+    store = dedupe_assembly(str(outdir))
+
+    templates = _templates(outdir)
+    assert all(template.startswith(BLOB_DIR + '/') for template in templates.values())
+    assert templates['empty'] == templates['InfrastructureStack']
+    assert (outdir / templates['dev']).read_text() == dev_template
+    assert not list(outdir.glob('*.template.json'))
+    assert (store.stored, store.reused) == (4, 1)
+
+    # a second run rewrites nothing that is already stored
+    _synth(outdir)
+    store = dedupe_assembly(str(outdir), prune=True)
+    assert (store.stored, store.reused) == (0, 5)
+    assert _templates(outdir) == templates
+    assert len(store.keys()) == 4
+
+
+def test_uploads_skip_blobs_already_sent(tmp_path):
+    outdir = tmp_path / 'cdk.out'
+    _synth(outdir)
+    dedupe_assembly(str(outdir))
+    store = BlobStore(str(outdir / BLOB_DIR))
+    destination = str(tmp_path / 'artifacts')
+    sent = []
+
+    def upload(path, key):
+        sent.append(key)
+        directory_uploader(destination)(path, key)
+
+    assert store.upload(destination, upload) == sorted(store.keys())
+    assert store.upload(destination, upload) == []
+    assert len(sent) == 4
+    assert all(os.path.exists(os.path.join(destination, key)) for key in sent)
@@ -0,0 +1,66 @@
+import os
+import pickle
+import collections
+import pytest
+from eksdivingboard.cdk.bundle import Bundle, pack_bundle
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def test_bundle_compiles_like_the_source_tree(tmp_path):
+    bundle_file = pack_bundle(os.path.join(FIXTURES, 'example.yaml'), str(tmp_path / 'example.bundle'))
+    definition = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml'))
+    compiler = ConfigsCompiler(**definition.compiler_arguments())
+    expected = compiler.compile_stack_configs('default')
+
+    bundled_compiler = ConfigsCompiler(bundle=bundle_file)
+    assert bundled_compiler.compile_stack_configs('default') == expected
+    assert bundled_compiler.validate(expected) == {}
+    with Bundle.open(bundle_file) as bundle:
+        assert bundle.changed_sources() == []
+        assert bundle.name == 'example'
+
+
+def test_an_environment_reads_only_its_own_sections(tmp_path):
+    bundle_file = pack_bundle(os.path.join(FIXTURES, 'example.yaml'), str(tmp_path / 'example.bundle'))
+    bundle = Bundle.open(bundle_file)
+    compiler = ConfigsCompiler(bundle=bundle)
+    compiler.compile_environment('dev')
+    # two defaults, two deploy files and dev's variables; not test's or prod's
+    assert bundle.loaded == 5
+    bundle.close()
+
+    (tmp_path / 'other.bundle').write_bytes(b'not a bundle at all')
+    with pytest.raises(ValueError, match='not a deployment bundle'):
+        Bundle.open(str(tmp_path / 'other.bundle'))
+
+
+def test_changed_bundles_are_rejected_and_the_compiler_unmaps_its_bundle(tmp_path):
+    bundle_file = pack_bundle(os.path.join(FIXTURES, 'example.yaml'), str(tmp_path / 'example.bundle'))
+    with Bundle.open(bundle_file) as bundle:
+        path = next(iter(bundle._sections))
+        offset, length = bundle._sections[path]
+        start = bundle._data_start + offset
+    # a pickle spliced over a section is rejected before any section is decoded
+    payload = bytearray(open(bundle_file, 'rb').read())
+    payload[start:start + length] = pickle.dumps(collections.OrderedDict(a=1)).ljust(length, b'.')[:length]
+    (tmp_path / 'tampered.bundle').write_bytes(bytes(payload))
+    with pytest.raises(ValueError, match='digest'):
+        Bundle.open(str(tmp_path / 'tampered.bundle'))
+    (tmp_path / 'truncated.bundle').write_bytes(open(bundle_file, 'rb').read()[:-1])
+    with pytest.raises(ValueError, match='digest'):
+        Bundle.open(str(tmp_path / 'truncated.bundle'))
+
+    with ConfigsCompiler(bundle=bundle_file) as compiler:
+        bundle = compiler._bundle
+        compiler.compile_stack_configs('default')
+    with pytest.raises(ValueError):
+        bundle.load(path)
+
+    # a bundle passed in open stays open for its owner
+    with Bundle.open(bundle_file) as bundle:
+        with ConfigsCompiler(bundle=bundle) as compiler:
+            compiler.compile_stack_configs('default')
+        assert bundle.load(path)
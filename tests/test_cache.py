@@ -0,0 +1,72 @@
+import os
+import shutil
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _roots(tmp_path):
+    shutil.copytree(os.path.join(FIXTURES, 'example'), tmp_path / 'example')
+    shutil.copytree(os.path.join(FIXTURES, 'defaults'), tmp_path / 'defaults')
+    # absolute roots name a directory with a trailing separator
+    return {
+        'deploy_root': os.path.join(str(tmp_path), 'example', ''),
+        'defaults_root': os.path.join(str(tmp_path), 'defaults', ''),
+        'environments_root': os.path.join(str(tmp_path), 'example', 'environments', ''),
+    }
+
+
+def _entries(cache_dir):
+    return len([name for name in os.listdir(cache_dir) if name.endswith('.pickle')]) if cache_dir.exists() else 0
+
+
+def _compile(cache_dir, **arguments):
+    # (compiled configs, whether they came from the cache); a miss stores a new entry
+    compiler = ConfigsCompiler(cache_dir=str(cache_dir), **arguments)
+    stored = _entries(cache_dir)
+    compiler.process_configs()
+    return compiler.configs, _entries(cache_dir) == stored
+
+
+def test_cache_hits_until_an_input_changes(tmp_path):
+    roots = _roots(tmp_path)
+    cache_dir = tmp_path / 'cache'
+    deploy_root = tmp_path / 'example'
+
+    configs, hit = _compile(cache_dir, **roots)
+    assert not hit and configs['vpc']['default-vpc']['max_azs'] == 4
+    assert _compile(cache_dir, **roots) == (configs, True)
+
+    # added
+    (deploy_root / 'queue.yaml').write_text('queue:\n  jobs:\n    fifo: true\n')
+    configs, hit = _compile(cache_dir, **roots)
+    assert not hit and configs['queue'] == {'jobs': {'fifo': True}}
+    assert _compile(cache_dir, **roots) == (configs, True)
+
+    # renamed
+    os.rename(deploy_root / 'queue.yaml', deploy_root / 'queues.yaml')
+    configs, hit = _compile(cache_dir, **roots)
+    assert not hit and configs['queue'] == {'jobs': {'fifo': True}}
+
+    # edited
+    (deploy_root / 'queues.yaml').write_text('queue:\n  jobs:\n    fifo: false\n    retention: 60\n')
+    configs, hit = _compile(cache_dir, **roots)
+    assert not hit and configs['queue'] == {'jobs': {'fifo': False, 'retention': 60}}
+
+    # removed
+    os.unlink(deploy_root / 'default_vpc.yaml')
+    configs, hit = _compile(cache_dir, **roots)
+    assert not hit and configs['vpc']['default-vpc']['max_azs'] == 3
+
+    # configure() arguments
+    (tmp_path / '.eksdiveignore').write_text('queues.yaml\n')
+    configs, hit = _compile(cache_dir, ignore_file=str(tmp_path / '.eksdiveignore'), **roots)
+    assert not hit and 'queue' not in configs
+
+
+def test_cache_directory_from_the_environment(tmp_path, monkeypatch):
+    roots = _roots(tmp_path)
+    monkeypatch.setenv('EKSDIVE_CONFIG_CACHE', str(tmp_path / 'cache'))
+    ConfigsCompiler(**roots).process_configs()
+    assert _entries(tmp_path / 'cache') == 1
+    assert _compile(tmp_path / 'cache', **roots)[1]
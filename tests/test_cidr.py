@@ -0,0 +1,98 @@
+import os
+import yaml
+from eksdivingboard.cdk.cidr import (
+    CidrError, allocate_subnets, check_cidrs, mask_length, parse_cidr
+)
+
+DEFAULT_VPC = os.path.join(os.path.dirname(__file__), '../deployments/defaults/default_vpc.yaml')
+
+
+def _vpc(cidr, *subnets):
+    return {'cidr': cidr, 'subnet_configuration': [
+        {f'subnet_{index}': {'subnet_type': 'private', 'cidr_mask': mask}} for index, mask in enumerate(subnets)
+    ]}
+
+
+def test_parse_and_mask_length():
+    network = parse_cidr('10.0.114.0/20')
+    assert (network.prefix, network.aligned, str(network)) == (20, False, '10.0.114.0/20')
+    assert (network.start, network.end) == ((10 << 24) + (112 << 8), (10 << 24) + (127 << 8) + 255)
+    assert [mask_length(mask) for mask in (20, '20', '/20', '10.0.16.0/20')] == [20, 20, 20, 20]
+    for bad in ('10.0.0/16', '10.0.0.256/24', '10.0.0.0/33'):
+        try:
+            parse_cidr(bad)
+        except CidrError:
+            continue
+        raise AssertionError(f'{bad} should not parse')
+
+
+def test_allocate_subnets_aligns_each_block():
+    assert allocate_subnets('10.0.0.0/16', [24, 20, 24]) == ['10.0.0.0/24', '10.0.16.0/20', '10.0.32.0/24']
+    try:
+        allocate_subnets('10.0.0.0/24', [25, 25, 25])
+    except CidrError as error:
+        assert 'no free /25' in str(error)
+    else:
+        raise AssertionError('a /24 only holds two /25s')
+
+
+def test_default_vpc_is_aligned_and_disjoint():
+    with open(DEFAULT_VPC) as stream:
+        configs = yaml.safe_load(stream)
+    assert check_cidrs({'default': configs}) == ({}, {})
+
+
+def test_misaligned_outside_and_overlapping_networks_are_reported():
+    environment_configs = {
+        'test': {'vpc': {
+            'a': _vpc('10.0.0.0/16', '10.0.114.0/20', '10.0.0.0/20', '10.0.8.0/24', '10.1.0.0/24', 24),
+            'b': _vpc('10.0.128.0/17'),
+        }},
+        'prod': {'vpc': {
+            'a': _vpc('10.0.0.0/16', '10.0.0.0/20'),
+            'c': _vpc('10.0.0.0/8'),
+        }},
+    }
+    errors, warnings = check_cidrs(environment_configs, source_of=lambda environment, path: f'{environment}.yaml')
+
+    assert sorted((error.key_path, error.message) for error in errors['test']) == [
+        ('vpc.a.subnet_configuration.0.subnet_0.cidr_mask',
+         '10.0.114.0/20 is not aligned to /20, the network is 10.0.112.0/20'),
+        ('vpc.a.subnet_configuration.2.subnet_2.cidr_mask', '10.0.8.0/24 overlaps subnet subnet_1 (10.0.0.0/20)'),
+        ('vpc.a.subnet_configuration.3.subnet_3.cidr_mask', '10.1.0.0/24 is outside the VPC cidr 10.0.0.0/16'),
+        ('vpc.b.cidr', '10.0.128.0/17 overlaps vpc a (10.0.0.0/16) in test'),
+    ]
+    assert all(error.source == 'test.yaml' for error in errors['test'])
+    assert [str(error) for error in errors['prod']] == [
+        'prod.yaml: vpc.a.cidr: 10.0.0.0/16 overlaps vpc c (10.0.0.0/8) in prod']
+    # the same vpc "a" in both environments is expected, the /8 is not
+    assert [str(warning) for warning in warnings['test']] == [
+        'test.yaml: vpc.a.cidr: 10.0.0.0/16 overlaps vpc c (10.0.0.0/8) in prod',
+        'test.yaml: vpc.b.cidr: 10.0.128.0/17 overlaps vpc c (10.0.0.0/8) in prod',
+    ]
+
+
+def test_sweep_scales_to_tens_of_thousands_of_subnets():
+    environment_configs = {}
+    for environment in range(20):
+        vpcs = {}
+        for index in range(100):
+            base = (environment * 100 + index) * 16
+            cidr = f'10.{base // 256}.{base % 256}.0/20'
+            # 8 pinned /24s and 8 more for the second zone fill each /20
+            vpcs[f'vpc-{index}'] = _vpc(cidr, *[f'10.{base // 256}.{base % 256 + subnet}.0/24' for subnet in range(8)])
+        environment_configs[f'env{environment}'] = {'vpc': vpcs}
+    assert check_cidrs(environment_configs) == ({}, {})
+
+
+def test_every_subnet_is_reserved_once_per_availability_zone():
+    # three /24s fit a /22 in one zone, not in the two zones an agnostic stack gets
+    vpc = _vpc('10.0.0.0/22', 24, 24, 24)
+    assert check_cidrs({'test': {'vpc': {'a': dict(vpc, max_azs=1)}}}) == ({}, {})
+    errors, _warnings = check_cidrs({'test': {'vpc': {'a': dict(vpc, max_azs=4)}}})
+    assert [(error.key_path, error.message) for error in errors['test']] == [
+        ('vpc.a.subnet_configuration.2.subnet_2.cidr_mask', 'no free /24 left in 10.0.0.0/22 for 2 availability zones')]
+
+    # a pinned block is the first zone's; the second zone's lands after the pinned ones
+    errors, _warnings = check_cidrs({'test': {'vpc': {'a': _vpc('10.0.0.0/22', '10.0.0.0/24', '10.0.1.0/24', 24)}}})
+    assert [error.message for error in errors['test']] == ['no free /24 left in 10.0.0.0/22 for 2 availability zones']
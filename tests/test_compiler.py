@@ -1,10 +1,7 @@
-from aws_cdk import core as cdk
+import pytest
 import logging
-from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
-from eksdivingboard.cdk.infrastructure_stack import EnvironmentStack
-from os import (
-    path, getcwd
-)
+pytest.importorskip('aws_cdk')
+from eksdivingboard.cdk.infrastructure_stack import EnvironmentStack  # noqa: E402
 logger = logging.getLogger(__name__)
 
 
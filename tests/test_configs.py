@@ -0,0 +1,43 @@
+import os
+import pytest
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+ROOTS = dict(
+    deploy_root=os.path.join(FIXTURES, 'example', ''),
+    defaults_root=os.path.join(FIXTURES, 'defaults', ''),
+    environments_root=os.path.join(FIXTURES, 'example', 'environments', ''),
+)
+
+
+@pytest.mark.parametrize('use_processes', [True, False])
+def test_parallel_parse_matches_serial(use_processes):
+    serial = ConfigsCompiler(max_workers=1, **ROOTS)
+    serial.process_configs()
+    parallel = ConfigsCompiler(max_workers=4, use_processes=use_processes, **ROOTS)
+    parallel._parallel_threshold = 0
+    parallel.process_configs()
+    assert parallel.configs == serial.configs
+    assert parallel.variables == serial.variables
+
+
+def test_parse_workers_from_the_environment(monkeypatch):
+    monkeypatch.setenv('EKSDIVE_PARSE_WORKERS', '3')
+    assert ConfigsCompiler().max_workers == 3
+    assert ConfigsCompiler(max_workers=1).max_workers == 1
+
+
+def test_environment_overlays_share_compiled_base():
+    definition = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml'))
+    compiler = ConfigsCompiler(**definition.compiler_arguments())
+    compiler.environment_overlays['prod']['overrides'] = {'vpc': {'default-vpc': {'max_azs': '${account}'}}}
+    base = compiler.compile_base()
+    environments = compiler.compile_environments()
+
+    assert list(environments) == ['dev', 'test', 'prod']
+    assert compiler.environment_variables['dev'] == {'account': 90210, 'vpc_name': 'something'}
+    assert environments['dev'] is base['configs']
+    assert environments['prod']['vpc']['default-vpc']['max_azs'] == 90212
+    assert base['configs']['vpc']['default-vpc']['max_azs'] == 4
+    assert environments['prod']['eks_cluster'] is base['configs']['eks_cluster']
@@ -0,0 +1,76 @@
+import json
+import pytest
+from eksdivingboard.cdk.deploy import (
+    FAILED, SKIPPED, SUCCEEDED, DeployGraph, DeployRules, DeployScheduler, FakeCloudFormation,
+)
+
+
+def _assembly(tmp_path, stacks):
+    # stacks: name -> (manifest dependencies, exported names, imported names)
+    artifacts = {}
+    for name, (dependencies, exports, imports) in stacks.items():
+        template = {
+            'Resources': {f'Param{index}': {'Type': 'AWS::SSM::Parameter', 'Properties': {
+                'Value': {'Fn::ImportValue': imported}}} for index, imported in enumerate(imports)},
+            'Outputs': {f'Out{index}': {'Value': 'x', 'Export': {'Name': exported}}
+                        for index, exported in enumerate(exports)},
+        }
+        (tmp_path / f'{name}.template.json').write_text(json.dumps(template))
+        artifacts[name] = {'type': 'aws:cloudformation:stack', 'environment': 'aws://unknown-account/unknown-region',
+                           'properties': {'templateFile': f'{name}.template.json'}, 'dependencies': dependencies}
+    artifacts['Tree'] = {'type': 'cdk:tree', 'properties': {'file': 'tree.json'}}
+    (tmp_path / 'manifest.json').write_text(json.dumps({'version': '13.0.0', 'artifacts': artifacts}))
+    return str(tmp_path)
+
+
+STACKS = {
+    'network': ([], ['network:vpc'], []),
+    'dev': ([], [], ['network:vpc']),
+    'qa': (['network'], [], []),
+    'tools': ([], [], []),
+}
+
+
+def test_stacks_deploy_concurrently_in_dependency_order(tmp_path):
+    graph = DeployGraph.from_assembly(_assembly(tmp_path, STACKS))
+    assert graph.nodes['dev'].dependencies == {'network'}
+    fake = FakeCloudFormation(durations={'network': 0.1, 'dev': 0.1}, duration=0.02)
+    report = DeployScheduler(graph, fake, concurrency=2, retries=0).run()
+
+    assert report.succeeded
+    assert fake.max_in_flight == 2
+    assert fake.deployed.index('network') < min(fake.deployed.index('dev'), fake.deployed.index('qa'))
+    assert report.critical_path()[0] == ['network', 'dev']
+    assert 'critical path' in report.summary()
+
+
+def test_failures_are_retried_with_backoff_then_skip_dependents(tmp_path):
+    graph = DeployGraph.from_assembly(_assembly(tmp_path, STACKS))
+    delays = []
+    fake = FakeCloudFormation(failures={'tools': 2, 'network': 5})
+    scheduler = DeployScheduler(graph, fake, concurrency=3, retries=2, backoff=1.0, jitter=0, sleep=delays.append)
+    report = scheduler.run()
+
+    assert report.results['tools'].status == SUCCEEDED and report.results['tools'].attempts == 3
+    assert report.results['network'].status == FAILED and report.results['network'].attempts == 3
+    assert {report.results[name].status for name in ('dev', 'qa')} == {SKIPPED}
+    assert sorted(delays) == [1.0, 1.0, 2.0, 2.0]
+    assert not report.succeeded
+
+
+def test_ordering_rules(tmp_path):
+    graph = DeployGraph.from_assembly(_assembly(tmp_path, STACKS), stacks=['dev', 'qa', 'tools'])
+    # dev's import of network is left to the stack already deployed
+    fake = FakeCloudFormation(duration=0.02)
+    fake.exports['network:vpc'] = 'network'
+    rules = DeployRules.parse(after=['tools=dev'], serial=['[dq]*'])
+    report = DeployScheduler(graph, fake, concurrency=4, rules=rules).run()
+    assert graph.nodes['tools'].dependencies == set()
+
+    assert report.succeeded
+    assert fake.deployed.index('tools') > fake.deployed.index('dev')
+    dev, qa = report.results['dev'], report.results['qa']
+    assert dev.end <= qa.start or qa.end <= dev.start
+
+    with pytest.raises(ValueError, match='cycle'):
+        DeployScheduler(DeployGraph.from_assembly(str(tmp_path)), fake, rules=DeployRules({'network': ['qa']}))
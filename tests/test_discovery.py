@@ -0,0 +1,28 @@
+from eksdivingboard.cdk.discovery import FileDiscovery, IgnorePatterns
+
+
+def _touch(root, relative_path):
+    file_path = root.joinpath(relative_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text('key: value\n')
+    return str(file_path)
+
+
+def test_single_pass_buckets_and_pruning(tmp_path):
+    vpc = _touch(tmp_path, 'deploy/vpc.yaml')
+    dev = _touch(tmp_path, 'deploy/environments/dev.yaml')
+    default = _touch(tmp_path, 'defaults/default_vpc.yaml')
+    _touch(tmp_path, 'deploy/scratch/ignored.yaml')
+    _touch(tmp_path, 'deploy/.hidden/ignored.yaml')
+    _touch(tmp_path, 'deploy/notes.txt')
+
+    discovery = FileDiscovery(ignore_patterns=IgnorePatterns(['scratch/']))
+    discovery.add_bucket('environment', str(tmp_path / 'deploy/environments'))
+    discovery.add_bucket('default', str(tmp_path / 'defaults'), [str(tmp_path / 'deploy')])
+    discovery.add_bucket('deploy', str(tmp_path / 'deploy'), [
+        str(tmp_path / 'defaults'), str(tmp_path / 'deploy/environments')])
+    found = discovery.discover()
+
+    assert found['environment'] == [dev]
+    assert found['default'] == [default]
+    assert found['deploy'] == [vpc]
@@ -0,0 +1,58 @@
+import os
+import json
+import pytest
+from eksdivingboard.cdk.assembly import synth_configs
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.emitter import emit_stack, make_unique_id
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(TESTS_DIR, 'golden')
+
+
+def _environment_configs():
+    definition = DeploymentDefinition.load(os.path.join(TESTS_DIR, 'fixtures/example.yaml'))
+    return ConfigsCompiler(**definition.compiler_arguments()).compile_stack_configs('InfrastructureStackDefaultStack')
+
+
+def _golden(stack_name):
+    with open(os.path.join(GOLDEN_DIR, f'{stack_name}.template.json')) as stream:
+        return json.load(stream)
+
+
+def test_logical_ids_match_cdk():
+    assert make_unique_id(['MyVpc', 'Resource']) == 'MyVpcF9F0CA6F'
+    assert make_unique_id(['VPC', 'PublicSubnet1', 'Subnet']) == 'VPCPublicSubnet1SubnetB4246D30'
+    assert make_unique_id(['VPC', 'IGW']) == 'VPCIGWB7E252D3'
+    assert make_unique_id(['default-vpc']) == 'defaultvpc'
+
+
+def test_vpc_template_matches_golden_file():
+    template = emit_stack('dev', _environment_configs()['dev'])
+    assert template.render() == _golden('dev')
+
+
+def test_assembly_lists_every_stack(tmp_path):
+    manifest = synth_configs(_environment_configs(), str(tmp_path), root_stack_id='InfrastructureStack')
+
+    assert list(manifest['artifacts']) == ['InfrastructureStack', 'dev', 'test', 'prod', 'Tree']
+    with open(tmp_path / 'InfrastructureStack.template.json') as stream:
+        assert json.load(stream) == {}
+    dev = manifest['artifacts']['dev']
+    assert dev['properties'] == {'templateFile': 'dev.template.json'}
+    assert dev['metadata']['/dev/default-vpc/Resource'] == [{'type': 'aws:cdk:logicalId', 'data': 'defaultvpc456EE64A'}]
+
+
+def test_golden_file_matches_jsii_synth(tmp_path):
+    cdk = pytest.importorskip('aws_cdk.core')
+    from eksdivingboard.cdk.infrastructure_stack import EnvironmentStack
+
+    app = cdk.App(outdir=str(tmp_path), context={'aws:cdk:enable-path-metadata': True})
+    EnvironmentStack(app, 'dev', _environment_configs()['dev']).build_stack()
+    app.synth()
+    with open(tmp_path / 'dev.template.json') as stream:
+        template = json.load(stream)
+    # version reporting is a CLI concern the Python backend leaves out
+    template.get('Resources', {}).pop('CDKMetadata', None)
+    template.pop('Conditions', None)
+    assert template == _golden('dev')
@@ -0,0 +1,183 @@
+import os
+import json
+import pytest
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.emitter import Template, emit_stack, emit_vpc, make_unique_id
+from eksdivingboard.cdk.fragments import FragmentCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+VPC = {'cidr': '10.1.0.0/16', 'nat_gateways': 1, 'subnet_configuration': [
+    {'Public': {'subnet_type': 'public', 'cidr_mask': 24}}, {'Private': {'subnet_type': 'private'}}]}
+
+
+def _configs():
+    definition = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml'))
+    return ConfigsCompiler(**definition.compiler_arguments()).compile_stack_configs('default')
+
+
+def test_fragments_are_remapped_to_the_new_stack_and_construct():
+    cache = FragmentCache()
+    emit_stack('first', {'vpc': {'shared': VPC}}, fragments=cache)
+    cached = emit_stack('second', {'vpc': {'main-vpc': VPC}}, fragments=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    rendered = emit_stack('second', {'vpc': {'main-vpc': VPC}})
+    assert cached.render() == rendered.render()
+    assert cached.construct_tree() == rendered.construct_tree()
+    assert cached.logical_ids() == rendered.logical_ids()
+
+
+def test_cached_stacks_match_rendered_stacks(tmp_path):
+    environment_configs = _configs()
+    for path_metadata in (True, False):
+        cache = FragmentCache(directory=str(tmp_path))
+        for name, configs in environment_configs.items():
+            cached = emit_stack(name, configs, path_metadata, fragments=cache)
+            assert cached.render() == emit_stack(name, configs, path_metadata).render()
+
+    # a new process reads the fragments back from the directory
+    cache = FragmentCache(maxsize=1, directory=str(tmp_path))
+    for name, configs in environment_configs.items():
+        assert emit_stack(name, configs, fragments=cache).render() == emit_stack(name, configs).render()
+    assert cache.misses == 0 and cache.disk_hits > 0
+    assert cache.stats()['fragments'] == 1
+
+
+def _assembly(tmp_path, stack_name, template, logical_ids):
+    # a cloud assembly with the construct path metadata cdk.App writes
+    outdir = tmp_path / 'cdk.out'
+    outdir.mkdir()
+    (outdir / f'{stack_name}.template.json').write_text(json.dumps(template))
+    (outdir / 'manifest.json').write_text(json.dumps({'version': '13.0.0', 'artifacts': {stack_name: {
+        'type': 'aws:cloudformation:stack',
+        'properties': {'templateFile': f'{stack_name}.template.json'},
+        'metadata': {f'/{stack_name}/{path}': [{'type': 'aws:cdk:logicalId', 'data': logical_id}]
+                     for path, logical_id in logical_ids.items()},
+    }}}))
+    return str(outdir)
+
+
+def test_harvest_keeps_resources_outputs_and_parameters(tmp_path):
+    topic_id = make_unique_id(['topics', 'Topic'])
+    arn_id = make_unique_id(['topics', 'Arn'])
+    owner_id = make_unique_id(['topics', 'Owner'])
+    template = {
+        'Parameters': {owner_id: {'Type': 'String', 'Default': 'ops'}},
+        'Resources': {topic_id: {'Type': 'AWS::SNS::Topic', 'Properties': {'DisplayName': {'Ref': owner_id}},
+                                 'Metadata': {'aws:cdk:path': 'dev/topics/Topic'}},
+                      'Other': {'Type': 'AWS::SQS::Queue'}},
+        'Outputs': {arn_id: {'Value': {'Ref': topic_id}}},
+    }
+    outdir = _assembly(tmp_path, 'dev', template, {
+        'topics/Topic': topic_id, 'topics/Arn': arn_id, 'topics/Owner': owner_id, 'other/Resource': 'Other'})
+    cache = FragmentCache()
+    cache.pending.append(('dev', 'topics', 'key'))
+    assert cache.harvest(outdir) == 1 and cache.pending == []
+
+    applied = {logical_id: (element, section) for _components, logical_id, element, section
+               in cache.get('key').apply('test', 'queues')}
+    topic_id = make_unique_id(['queues', 'Topic'])
+    arn_id = make_unique_id(['queues', 'Arn'])
+    owner_id = make_unique_id(['queues', 'Owner'])
+    assert applied == {
+        topic_id: ({'Type': 'AWS::SNS::Topic', 'Properties': {'DisplayName': {'Ref': owner_id}}}, 'Resources'),
+        arn_id: ({'Value': {'Ref': topic_id}}, 'Outputs'),
+        owner_id: ({'Type': 'String', 'Default': 'ops'}, 'Parameters'),
+    }
+
+
+def test_build_only_replaces_listed_construct_types():
+    class Construct(object):
+        construct_type = 'vpc'
+        fragment_excluded_options = frozenset({'flow_logs'})
+
+    # both return before importing aws_cdk and note nothing for harvest()
+    assert FragmentCache(jsii_constructs=()).build(Construct(), 'default-vpc', VPC) is None
+    cache = FragmentCache()
+    assert cache.build(Construct(), 'default-vpc', dict(VPC, flow_logs={})) is None
+    assert cache.pending == []
+
+    environ = {'EKSDIVE_FRAGMENT_CACHE': '1'}
+    assert FragmentCache.from_environment(environ).jsii_constructs == {'vpc'}
+    environ['EKSDIVE_FRAGMENT_CONSTRUCTS'] = 'vpc, topics'
+    assert FragmentCache.from_environment(environ).jsii_constructs == {'vpc', 'topics'}
+    environ['EKSDIVE_FRAGMENT_CONSTRUCTS'] = ''
+    assert FragmentCache.from_environment(environ).jsii_constructs == set()
+
+
+def test_options_key_memo_is_bounded():
+    cache = FragmentCache(maxsize=2)
+    options = [{'cidr': f'10.{index}.0.0/16'} for index in range(3)]
+    for index, item in enumerate(options):
+        cache.emit(Template(f'stack{index}', path_metadata=False), 'vpc', emit_vpc, 'vpc', item)
+    assert len(cache._keys) == 2
+    assert cache._options_key(options[0], 'vpc') is None
+    assert cache._options_key(options[2], 'vpc') is not None
+
+
+def test_jsii_hits_render_the_same_template_as_misses(tmp_path):
+    core = pytest.importorskip('aws_cdk.core')
+    from eksdivingboard.cdk.structures import StackConstruct
+
+    class Topics(core.Construct):
+
+        def __init__(self, scope, id, display_name):
+            super().__init__(scope, id)
+            owner = core.CfnParameter(self, 'Owner', type='String', default='ops')
+            topic = core.CfnResource(self, 'Topic', type='AWS::SNS::Topic',
+                                     properties={'DisplayName': display_name, 'TopicName': owner.value_as_string})
+            core.CfnOutput(self, 'Arn', value=topic.ref, export_name=f'{id}-arn')
+
+    class TopicConstruct(StackConstruct):
+
+        def __init__(self, scope, configs):
+            super().__init__(scope, configs)
+            self.construct_type = 'topics'
+            self.base_construct = Topics
+            self.build()
+
+    def synth(outdir, cache):
+        app = core.App(outdir=str(outdir))
+        for stack_name in ('dev', 'test'):
+            TopicConstruct(core.Stack(app, stack_name), {'alerts': {'display_name': 'Alerts'}})
+        app.synth()
+        templates = {stack_name: json.loads((outdir / f'{stack_name}.template.json').read_text())
+                     for stack_name in ('dev', 'test')}
+        return templates
+
+    cache = FragmentCache(jsii_constructs={'topics'})
+    StackConstruct.fragments = cache
+    try:
+        missed = synth(tmp_path / 'miss', cache)
+        assert cache.harvest(str(tmp_path / 'miss')) == 2
+        hit = synth(tmp_path / 'hit', cache)
+    finally:
+        StackConstruct.fragments = None
+    assert cache.hits == 2
+    assert hit == missed
+    assert set(hit['dev']['Outputs']) and set(hit['dev']['Parameters'])
+
+
+def test_jsii_vpc_hits_render_the_same_templates_as_misses(tmp_path):
+    core = pytest.importorskip('aws_cdk.core')
+    from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
+    from eksdivingboard.cdk.structures import configure_fragments
+
+    def synth(outdir):
+        app = core.App(outdir=str(outdir), context={'aws:cdk:enable-path-metadata': True})
+        InfrastructureStack.from_deployment_file(app, 'InfrastructureStack', os.path.join(FIXTURES, 'example.yaml'))
+        app.synth()
+        return {stack_name: json.loads((outdir / f'{stack_name}.template.json').read_text())
+                for stack_name in ('dev', 'test', 'prod')}
+
+    cache = FragmentCache()
+    configure_fragments(cache)
+    try:
+        missed = synth(tmp_path / 'miss')
+        assert cache.harvest(str(tmp_path / 'miss')) == 3
+        hit = synth(tmp_path / 'hit')
+    finally:
+        configure_fragments(None)
+    assert cache.hits == 3
+    assert hit == missed
@@ -0,0 +1,66 @@
+import os
+import pickle
+import pytest
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.emitter import emit_stack
+from eksdivingboard.cdk.frozen import ConfigRecord, FrozenDict, Interner, freeze, thaw
+from eksdivingboard.cdk.incremental import config_fingerprint
+from eksdivingboard.cdk.vpc import AwsVpc
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _compile(**options):
+    definition = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml'))
+    compiler = ConfigsCompiler(**options, **definition.compiler_arguments())
+    return compiler, compiler.compile_stack_configs('InfrastructureStackDefaultStack')
+
+
+def test_frozen_configs_match_plain_configs():
+    _plain_compiler, plain = _compile()
+    compiler, frozen = _compile(freeze=True)
+
+    assert list(frozen) == list(plain)
+    for name in plain:
+        assert thaw(frozen[name]) == plain[name]
+        assert config_fingerprint(frozen[name]) == config_fingerprint(plain[name])
+        assert emit_stack(name, frozen[name]).render() == emit_stack(name, plain[name]).render()
+    assert compiler.validate(frozen) == {}
+
+    options = frozen['dev']['vpc']['default-vpc']
+    assert isinstance(options, ConfigRecord)
+    assert type(options).__name__ == 'AwsVpcOptions'
+    assert isinstance(options['subnet_configuration'], tuple)
+    with pytest.raises(TypeError):
+        options['max_azs'] = 1
+    with pytest.raises(TypeError):
+        options.max_azs = 1
+
+
+def test_identical_subtrees_are_stored_once():
+    interner = Interner()
+    _compiler, first = _compile(interner=interner)
+    _compiler, second = _compile(interner=interner)
+    # a second deployment compiled with the same interner reuses every node
+    assert all(first[name] is second[name] for name in first)
+    subnets = [configs['vpc']['default-vpc']['subnet_configuration'] for configs in first.values()]
+    assert all(subnet is subnets[0] for subnet in subnets)
+    # only the node table is kept between compiles, not the mutable sources
+    assert interner.shared and not interner._frozen and len(interner)
+
+
+def test_freezing_keeps_scalar_types_apart():
+    frozen = freeze({'vpc': {'a': {'vpn_gateway': True}, 'b': {'vpn_gateway': 1}}, 'other': [1.0, 1, True]})
+    assert frozen['vpc']['a']['vpn_gateway'] is True
+    assert type(frozen['vpc']['b']['vpn_gateway']) is int
+    assert [type(item) for item in frozen['other']] == [float, int, bool]
+    assert isinstance(frozen['other'], tuple) and isinstance(frozen, FrozenDict)
+    assert hash(frozen) == hash(pickle.loads(pickle.dumps(frozen)))
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_set_defaults_does_not_change_the_config():
+    options = freeze({'vpc': {'main': {'max_azs': 2}}})['vpc']['main']
+    assert AwsVpc.set_defaults(options) == {'cidr': '10.0.0.0/16', 'max_azs': 2}
+    assert dict(options) == {'max_azs': 2}
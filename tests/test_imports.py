@@ -0,0 +1,13 @@
+import sys
+import subprocess
+
+
+def test_compiler_import_does_not_load_aws_cdk():
+    probe = "\n".join([
+        "import sys",
+        "from eksdivingboard.cdk.compiler import ConfigsCompiler",
+        "import eksdivingboard.cdk.vpc",
+        "print(sorted(m for m in sys.modules if m.startswith('aws_cdk')))",
+    ])
+    output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,115 @@
+import os
+import json
+import shutil
+from eksdivingboard.cdk.compiler import ConfigsCompiler
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.incremental import DependencyGraph, config_fingerprint, merge_assemblies
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+DEV = 'aws://111111111111/us-east-1'
+PROD = 'aws://222222222222/us-east-1'
+
+
+def _graph(context=None):
+    environments = {name: {'files': ['vpc.yaml'], 'constructs': {'vpc': ['vpc.yaml']}, 'config_hash': name}
+                    for name in ('dev', 'prod')}
+    return DependencyGraph(environments, {'vpc.yaml': 'hash'}, 'code', ['dev', 'prod'],
+                           config_fingerprint(context or {}))
+
+
+def _missing(environment, vpc_id):
+    account, region = environment[len('aws://'):].split('/')
+    return {'key': f'vpc-provider:account={account}:filter.vpc-id={vpc_id}:region={region}',
+            'provider': 'vpc-provider', 'props': {'account': account, 'region': region}}
+
+
+def _write_assembly(outdir, stacks, missing=()):
+    outdir.mkdir()
+    artifacts = {}
+    for name, environment in stacks.items():
+        (outdir / f'{name}.template.json').write_text(json.dumps({'Resources': {}}))
+        artifacts[name] = {'type': 'aws:cloudformation:stack', 'environment': environment,
+                           'properties': {'templateFile': f'{name}.template.json'}}
+    manifest = {'version': '13.0.0', 'artifacts': artifacts}
+    if missing:
+        manifest['missing'] = list(missing)
+    (outdir / 'manifest.json').write_text(json.dumps(manifest))
+    return str(outdir)
+
+
+def test_new_lookup_context_rebuilds_every_stack(tmp_path):
+    outdir = _write_assembly(tmp_path / 'cdk.out', {'dev': DEV, 'prod': PROD})
+    assert _graph().affected(_graph(), outdir) == {}
+    prefetched = _graph({'vpc-provider:account=111111111111:filter.vpc-id=vpc-1': {'vpcId': 'vpc-1'}})
+    assert prefetched.affected(_graph(), outdir) == {'dev': ['*'], 'prod': ['*']}
+
+
+def test_missing_lookups_only_come_from_current_stacks(tmp_path):
+    outdir = _write_assembly(tmp_path / 'cdk.out', {'dev': DEV, 'prod': PROD},
+                             [_missing(DEV, 'vpc-1'), _missing(PROD, 'vpc-2')])
+    # dev no longer looks anything up, prod is unchanged
+    staging = _write_assembly(tmp_path / 'staging', {'dev': DEV})
+    merge_assemblies(staging, outdir, ['dev', 'prod'], [])
+    manifest = json.loads((tmp_path / 'cdk.out' / 'manifest.json').read_text())
+    assert manifest['missing'] == [_missing(PROD, 'vpc-2')]
+
+    merge_assemblies(None, outdir, ['dev'], ['prod'])
+    manifest = json.loads((tmp_path / 'cdk.out' / 'manifest.json').read_text())
+    assert 'missing' not in manifest
+    assert list(manifest['artifacts']) == ['dev']
+
+
+def _compiled_graph(root):
+    definition = DeploymentDefinition.load(str(root / 'example.yaml'))
+    compiler = ConfigsCompiler(**definition.compiler_arguments())
+    return DependencyGraph.from_compiler(compiler, compiler.compile_stack_configs('default'))
+
+
+def test_affected_stacks_follow_their_input_files(tmp_path):
+    root = tmp_path / 'deployments'
+    shutil.copytree(FIXTURES, root)
+    outdir = _write_assembly(tmp_path / 'cdk.out', {'dev': DEV, 'test': DEV, 'prod': PROD})
+    graph = _compiled_graph(root)
+    assert graph.affected(DependencyGraph(), outdir) == {'dev': ['*'], 'test': ['*'], 'prod': ['*']}
+
+    # unchanged
+    graph.save(outdir)
+    previous = DependencyGraph.load(outdir)
+    assert _compiled_graph(root).affected(previous, outdir) == {}
+
+    # a variables file nothing references
+    (root / 'example' / 'environments' / 'dev.yaml').write_text('account: 90210\nvpc_name: renamed\n')
+    assert _compiled_graph(root).affected(previous, outdir) == {}
+
+    # one construct's file
+    (root / 'example' / 'default_vpc.yaml').write_text('vpc:\n  default-vpc:\n    max_azs: 2\n')
+    assert _compiled_graph(root).affected(previous, outdir) == {'dev': ['vpc'], 'test': ['vpc'], 'prod': ['vpc']}
+
+    # another construct type
+    (root / 'example' / 'queue.yaml').write_text('queue:\n  jobs:\n    fifo: true\n')
+    assert _compiled_graph(root).affected(previous, outdir) == {'dev': ['*'], 'test': ['*'], 'prod': ['*']}
+
+
+def test_merge_swaps_in_rebuilt_stacks_and_drops_removed_ones(tmp_path):
+    outdir = _write_assembly(tmp_path / 'cdk.out', {'dev': DEV, 'test': DEV, 'prod': PROD})
+    (tmp_path / 'cdk.out' / 'tree.json').write_text(json.dumps({'tree': {'id': 'App', 'children': {
+        name: {'id': name} for name in ('dev', 'test', 'prod')}}}))
+
+    # unchanged
+    merge_assemblies(None, outdir, ['dev', 'test', 'prod'], [])
+    manifest = json.loads((tmp_path / 'cdk.out' / 'manifest.json').read_text())
+    assert list(manifest['artifacts']) == ['dev', 'test', 'prod']
+
+    # one stack rebuilt, one environment removed
+    staging = _write_assembly(tmp_path / 'staging', {'test': DEV})
+    (tmp_path / 'staging' / 'test.template.json').write_text(json.dumps({'Resources': {'Queue': {}}}))
+    merge_assemblies(staging, outdir, ['dev', 'test'], ['prod'])
+
+    manifest = json.loads((tmp_path / 'cdk.out' / 'manifest.json').read_text())
+    assert list(manifest['artifacts']) == ['dev', 'test']
+    assert json.loads((tmp_path / 'cdk.out' / 'test.template.json').read_text()) == {'Resources': {'Queue': {}}}
+    assert json.loads((tmp_path / 'cdk.out' / 'dev.template.json').read_text()) == {'Resources': {}}
+    assert not (tmp_path / 'cdk.out' / 'prod.template.json').exists()
+    tree = json.loads((tmp_path / 'cdk.out' / 'tree.json').read_text())
+    assert list(tree['tree']['children']) == ['dev', 'test']
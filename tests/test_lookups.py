@@ -0,0 +1,149 @@
+import json
+import pytest
+from eksdivingboard.cdk.lookups import (
+    AwsBackend, LookupCache, LookupRequest, MissingLookupsError, StaticBackend, check_lookups, prefetch_lookups,
+    vpc_context_response,
+)
+
+ACCOUNT = '123456789012'
+REGION = 'us-east-1'
+
+
+def _vpc(vpc_id):
+    return vpc_context_response(vpc_id, '10.0.0.0/16', [{
+        'name': 'Private', 'type': 'Private', 'subnets': [
+            {'subnetId': 'subnet-1', 'cidr': '10.0.0.0/24', 'availabilityZone': 'us-east-1a',
+             'routeTableId': 'rtb-1'},
+        ],
+    }])
+
+
+def _assembly(tmp_path, requests):
+    outdir = tmp_path / 'cdk.out'
+    outdir.mkdir()
+    (outdir / 'manifest.json').write_text(json.dumps({'version': '13.0.0', 'artifacts': {}, 'missing': [
+        {'key': request.key, 'provider': request.provider, 'props': request.props} for request in requests]}))
+    return str(outdir)
+
+
+def test_vpc_lookup_keys_match_cdk():
+    request = LookupRequest.vpc(ACCOUNT, REGION, 'vpc-0123')
+    assert request.key == ('vpc-provider:account=123456789012:filter.vpc-id=vpc-0123:region=us-east-1'
+                           ':returnAsymmetricSubnets=true')
+
+
+def test_missing_lookups_are_fetched_in_one_batch(tmp_path):
+    first, second = LookupRequest.vpc(ACCOUNT, REGION, 'vpc-1'), LookupRequest.vpc(ACCOUNT, REGION, 'vpc-2')
+    ami = LookupRequest('ami', {'account': ACCOUNT, 'region': REGION, 'filters': {'name': ['base-*']}})
+    outdir = _assembly(tmp_path, [first, second, first, ami])
+    cache = LookupCache.load(str(tmp_path / 'cdk.lookups.json'))
+
+    with pytest.raises(MissingLookupsError) as error:
+        check_lookups(outdir, cache)
+    assert error.value.keys == [first.key, second.key, first.key, ami.key]
+
+    backend = StaticBackend(vpcs={'vpc-1': _vpc('vpc-1'), 'vpc-2': _vpc('vpc-2')})
+    with pytest.raises(MissingLookupsError) as error:
+        prefetch_lookups(outdir, cache, backend)
+    assert error.value.keys == [ami.key]
+    assert backend.calls == 1
+
+    # what the backend did answer was saved, and is not fetched again
+    cache = LookupCache.load(str(tmp_path / 'cdk.lookups.json'))
+    assert cache.context() == {first.key: _vpc('vpc-1'), second.key: _vpc('vpc-2')}
+    backend.values[ami.key] = ['ami-1']
+    assert prefetch_lookups(outdir, cache, backend) == {ami.key: ['ami-1']}
+    check_lookups(outdir, LookupCache.load(str(tmp_path / 'cdk.lookups.json')))
+
+
+class _Paginator(object):
+
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        self.client.calls.append(self.operation)
+        key, items = self.client.responses[self.operation]
+        # two pages, so every page is read
+        return [{key: items[:1]}, {key: items[1:]}]
+
+
+class _Ec2Client(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def get_paginator(self, operation):
+        return _Paginator(self, operation)
+
+
+class _Session(object):
+
+    def __init__(self, client):
+        self._client = client
+
+    def client(self, service):
+        assert service == 'ec2'
+        return self._client
+
+
+def test_aws_backend_describes_each_environment_once():
+    client = _Ec2Client({
+        'describe_vpcs': ('Vpcs', [{'VpcId': 'vpc-1', 'CidrBlock': '10.0.0.0/16', 'OwnerId': ACCOUNT}]),
+        'describe_subnets': ('Subnets', [
+            {'VpcId': 'vpc-1', 'SubnetId': 'subnet-b', 'CidrBlock': '10.0.1.0/24', 'AvailabilityZone': 'us-east-1b'},
+            {'VpcId': 'vpc-1', 'SubnetId': 'subnet-a', 'CidrBlock': '10.0.0.0/24', 'AvailabilityZone': 'us-east-1a',
+             'Tags': [{'Key': 'aws-cdk:subnet-name', 'Value': 'Ingress'}]},
+        ]),
+        'describe_route_tables': ('RouteTables', [
+            {'VpcId': 'vpc-1', 'RouteTableId': 'rtb-public', 'Routes': [{'GatewayId': 'igw-1'}],
+             'Associations': [{'SubnetId': 'subnet-a'}]},
+            {'VpcId': 'vpc-1', 'RouteTableId': 'rtb-main', 'Routes': [{'GatewayId': 'local'}],
+             'Associations': [{'Main': True}]},
+        ]),
+        'describe_vpn_gateways': ('VpnGateways', []),
+    })
+    sessions = []
+
+    def session_factory(account, region):
+        sessions.append((account, region))
+        return _Session(client)
+
+    found, gone = LookupRequest.vpc(ACCOUNT, REGION, 'vpc-1'), LookupRequest.vpc(ACCOUNT, REGION, 'vpc-9')
+    ami = LookupRequest('ami', {'account': ACCOUNT, 'region': REGION, 'filters': {'name': ['base-*']}})
+    values, reasons = AwsBackend(session_factory).lookup([found, gone, ami])
+
+    assert sessions == [(ACCOUNT, REGION)]
+    assert client.calls == ['describe_vpcs', 'describe_subnets', 'describe_route_tables', 'describe_vpn_gateways']
+    assert values == {found.key: vpc_context_response('vpc-1', '10.0.0.0/16', [
+        {'name': 'Private', 'type': 'Private', 'subnets': [
+            {'subnetId': 'subnet-b', 'cidr': '10.0.1.0/24', 'availabilityZone': 'us-east-1b',
+             'routeTableId': 'rtb-main'}]},
+        {'name': 'Ingress', 'type': 'Public', 'subnets': [
+            {'subnetId': 'subnet-a', 'cidr': '10.0.0.0/24', 'availabilityZone': 'us-east-1a',
+             'routeTableId': 'rtb-public'}]},
+    ], account=ACCOUNT)}
+    assert set(reasons) == {gone.key, ami.key}
+
+
+def test_cache_from_another_version_is_ignored(tmp_path):
+    cache_file = tmp_path / 'cdk.lookups.json'
+    cache_file.write_text(json.dumps({'version': 0, 'entries': {'vpc-provider:stale': {'value': {}}}}))
+    assert LookupCache.load(str(cache_file)).context() == {}
+
+
+def test_cached_lookups_answer_vpc_from_lookup(tmp_path):
+    core = pytest.importorskip('aws_cdk.core')
+    from aws_cdk import aws_ec2 as ec2
+    request = LookupRequest.vpc(ACCOUNT, REGION, 'vpc-1')
+    cache = LookupCache()
+    cache.put(request, _vpc('vpc-1'))
+
+    app = core.App(outdir=str(tmp_path), context=cache.context())
+    stack = core.Stack(app, 'lookup', env=core.Environment(account=ACCOUNT, region=REGION))
+    vpc = ec2.Vpc.from_lookup(stack, 'vpc', vpc_id='vpc-1')
+    app.synth()
+    assert vpc.vpc_id == 'vpc-1'
+    check_lookups(str(tmp_path), LookupCache())
@@ -0,0 +1,28 @@
+from eksdivingboard.cdk.merge import MergeEngine
+
+
+def test_deep_merge_shares_untouched_subtrees():
+    merger = MergeEngine()
+    defaults = {'vpc': {'default-vpc': {'cidr': '10.0.0.0/16', 'subnet_configuration': [{'public': {}}]}}}
+    deploy = {'vpc': {'default-vpc': {'max_azs': 4}}}
+    merged = merger.merge({}, defaults, source='defaults.yaml')
+    merged = merger.merge(merged, deploy, source='deploy.yaml')
+
+    assert merged['vpc']['default-vpc'] == {
+        'cidr': '10.0.0.0/16', 'subnet_configuration': [{'public': {}}], 'max_azs': 4}
+    assert defaults['vpc']['default-vpc'] == {'cidr': '10.0.0.0/16', 'subnet_configuration': [{'public': {}}]}
+    assert merged['vpc']['default-vpc']['subnet_configuration'] is defaults['vpc']['default-vpc']['subnet_configuration']
+    assert merger.source_of(('vpc', 'default-vpc', 'cidr')) == 'defaults.yaml'
+    assert merger.source_of(('vpc', 'default-vpc', 'max_azs')) == 'deploy.yaml'
+
+
+def test_sealed_results_are_not_written_to():
+    merger = MergeEngine()
+    first = merger.merge({}, {'vpc': {'default-vpc': {'cidr': '10.0.0.0/16'}}}, source='defaults.yaml')
+    merger.seal()
+    assert merger._owned == {}
+
+    second = merger.merge(first, {'vpc': {'default-vpc': {'max_azs': 4}}}, source='deploy.yaml')
+    assert first == {'vpc': {'default-vpc': {'cidr': '10.0.0.0/16'}}}
+    assert second == {'vpc': {'default-vpc': {'cidr': '10.0.0.0/16', 'max_azs': 4}}}
+    assert merger.source_of(('vpc', 'default-vpc', 'max_azs')) == 'deploy.yaml'
@@ -0,0 +1,84 @@
+import os
+import json
+import pytest
+from eksdivingboard.cdk.parallel_synth import group_environments, stitch_assemblies
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _worker(tmp_path, name, stacks):
+    # a cloud assembly as one worker's cdk.App writes it
+    outdir = tmp_path / name
+    outdir.mkdir()
+    artifacts = {}
+    children = {}
+    for stack in stacks:
+        (outdir / f'{stack}.template.json').write_text(json.dumps({'Resources': {stack: {'Type': 'AWS::SNS::Topic'}}}))
+        artifacts[stack] = {'type': 'aws:cloudformation:stack',
+                            'properties': {'templateFile': f'{stack}.template.json'}}
+        children[stack] = {'id': stack, 'path': stack}
+    artifacts['Tree'] = {'type': 'cdk:tree', 'properties': {'file': 'tree.json'}}
+    (outdir / 'manifest.json').write_text(json.dumps({'version': '13.0.0', 'artifacts': artifacts}))
+    (outdir / 'tree.json').write_text(json.dumps({'version': 'tree-0.1', 'tree': {'id': 'App', 'children': children}}))
+    (outdir / 'cdk.out').write_text(json.dumps({'version': '13.0.0'}))
+    return str(outdir)
+
+
+def test_group_environments_keeps_order_and_balances():
+    assert group_environments(['dev', 'test', 'prod'], 2) == [['dev', 'test'], ['prod']]
+    assert group_environments(['a', 'b', 'c', 'd', 'e'], 3) == [['a', 'b'], ['c', 'd'], ['e']]
+    assert group_environments(['dev', 'test'], 8) == [['dev'], ['test']]
+    assert group_environments(['dev'], 0) == [['dev']]
+
+
+def test_stitch_assemblies_merges_workers_in_order(tmp_path):
+    workers = [_worker(tmp_path, 'worker-0', ['dev', 'test']), _worker(tmp_path, 'worker-1', ['prod'])]
+    outdir = tmp_path / 'cdk.out'
+    outdir.mkdir()
+    manifest = stitch_assemblies(workers, str(outdir))
+
+    assert list(manifest['artifacts']) == ['dev', 'test', 'prod', 'Tree']
+    assert json.loads((outdir / 'manifest.json').read_text()) == manifest
+    tree = json.loads((outdir / 'tree.json').read_text())
+    assert list(tree['tree']['children']) == ['dev', 'test', 'prod']
+    for stack in ('dev', 'test', 'prod'):
+        assert (outdir / f'{stack}.template.json').exists()
+    assert (outdir / 'cdk.out').exists()
+
+
+def test_stitch_assemblies_rejects_duplicate_stacks(tmp_path):
+    workers = [_worker(tmp_path, 'worker-0', ['dev']), _worker(tmp_path, 'worker-1', ['dev'])]
+    outdir = tmp_path / 'cdk.out'
+    outdir.mkdir()
+    with pytest.raises(ValueError):
+        stitch_assemblies(workers, str(outdir))
+
+
+def test_parallel_assembly_matches_the_serial_app(tmp_path):
+    cdk = pytest.importorskip('aws_cdk.core')
+    from eksdivingboard.cdk.compiler import ConfigsCompiler
+    from eksdivingboard.cdk.deployment import DeploymentDefinition
+    from eksdivingboard.cdk.infrastructure_stack import InfrastructureStack
+    from eksdivingboard.cdk.parallel_synth import synth_environments
+
+    deployment_file = os.path.join(FIXTURES, 'example.yaml')
+    # metadata traces name each jsii kernel's temporary directory
+    context = {'aws:cdk:disable-stack-trace': True}
+    app = cdk.App(outdir=str(tmp_path / 'serial'), context=context)
+    InfrastructureStack.from_deployment_file(app, 'InfrastructureStack', deployment_file)
+    app.synth()
+
+    definition = DeploymentDefinition.load(deployment_file)
+    environment_configs = ConfigsCompiler(**definition.compiler_arguments()).compile_stack_configs(
+        'InfrastructureStackDefaultStack')
+    synth_environments(environment_configs, str(tmp_path / 'parallel'), max_workers=2,
+                       root_stack_id='InfrastructureStack', context=context)
+
+    serial = json.loads((tmp_path / 'serial' / 'manifest.json').read_text())['artifacts']
+    parallel = json.loads((tmp_path / 'parallel' / 'manifest.json').read_text())['artifacts']
+    assert list(parallel) == list(serial) == ['Tree', 'InfrastructureStack', 'dev', 'test', 'prod']
+    for stack in ('InfrastructureStack', 'dev', 'test', 'prod'):
+        assert parallel[stack] == serial[stack]
+        template = f'{stack}.template.json'
+        assert json.loads((tmp_path / 'parallel' / template).read_text()) == \
+            json.loads((tmp_path / 'serial' / template).read_text())
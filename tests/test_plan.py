@@ -0,0 +1,32 @@
+import os
+import sys
+import shutil
+import subprocess
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(TESTS_DIR, 'fixtures')
+PACKAGE_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'eksdivingboard')
+
+
+def _plan(*args):
+    # plan.py runs from the package directory, like app.py
+    return subprocess.run([sys.executable, 'plan.py'] + list(args), cwd=PACKAGE_DIR, capture_output=True, text=True)
+
+
+def test_plan_prints_every_stack_and_construct():
+    result = _plan('--deployment', os.path.join(FIXTURES, 'example.yaml'))
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    assert [line for line in lines if line.startswith('Stack ')] == ['Stack dev', 'Stack test', 'Stack prod']
+    assert '  vpc (AwsVpc -> aws_ec2.Vpc)' in lines
+    assert '    default-vpc: cidr=10.0.0.0/16 nat_gateways=1 max_azs=4 subnet_configuration=[3]' in lines
+
+
+def test_plan_reports_invalid_options(tmp_path):
+    shutil.copytree(FIXTURES, tmp_path / 'fixtures')
+    vpc_file = tmp_path / 'fixtures' / 'example' / 'default_vpc.yaml'
+    vpc_file.write_text(vpc_file.read_text().replace('max_azs: 4', 'max_azs: four'))
+    result = _plan('--deployment', str(tmp_path / 'fixtures' / 'example.yaml'), '--quiet')
+    assert result.returncode == 1
+    assert result.stdout == ''
+    assert 'vpc.default-vpc.max_azs' in result.stderr and str(vpc_file) in result.stderr
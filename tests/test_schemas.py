@@ -0,0 +1,76 @@
+import importlib.metadata
+import pytest
+from eksdivingboard.cdk.registry import PLUGIN_ENTRY_POINT_GROUP, registry
+from eksdivingboard.cdk.schemas import SCHEMAS, Schema, validate_configs
+from eksdivingboard.cdk.specs import ConstructSpec, OptionSpec
+
+
+def test_every_error_is_reported_with_its_path_and_source():
+    configs = {
+        'vpc': {'default-vpc': {
+            'cidr': '10.0.0.0/16',
+            'max_azs': 'three',
+            'subnet_configuration': [{'public': {'subnet_type': 'public', 'cidr_mask': 20, 'zone': 'a'}}],
+        }},
+        'eks_cluster': {'my_eks_cluster': {'version': 'v1.9'}},
+        'unknown': {},
+    }
+    errors = validate_configs(configs, source_of=lambda key_path: f'{key_path[0]}.yaml')
+
+    assert [(error.key_path, error.source) for error in errors] == [
+        ('vpc.default-vpc.max_azs', 'vpc.yaml'),
+        ('vpc.default-vpc.subnet_configuration.0.public.zone', 'vpc.yaml'),
+        ('eks_cluster.my_eks_cluster.version', 'eks_cluster.yaml'),
+        ('unknown', 'unknown.yaml'),
+    ]
+
+
+class _Entry(object):
+
+    def __init__(self, name, loaded):
+        self.name = name
+        self.value = f'example_plugin:{loaded.__name__}'
+        self._loaded = loaded
+
+    def load(self):
+        return self._loaded
+
+
+class _EntryPoints(list):
+
+    def select(self, group):
+        return self if group == PLUGIN_ENTRY_POINT_GROUP else []
+
+
+def test_plugin_schemas_are_loaded_before_validation(monkeypatch):
+    class QueueConstruct(object):
+        schema = Schema(ConstructSpec('queue', 'Queue', 'aws_sqs.Queue',
+                                      options={'fifo': OptionSpec(bool)}))
+
+    monkeypatch.setattr(importlib.metadata, 'entry_points', lambda: _EntryPoints([_Entry('queue', QueueConstruct)]))
+    monkeypatch.setattr(registry, '_plugins_loaded', False)
+    monkeypatch.setattr(registry, '_constructs', dict(registry._constructs))
+    try:
+        errors = validate_configs({'queue': {'jobs': {'fifo': 'yes'}}})
+        assert registry.get('queue') is QueueConstruct
+    finally:
+        SCHEMAS.pop('queue', None)
+
+    assert [error.key_path for error in errors] == ['queue.jobs.fifo']
+
+
+def test_enum_and_instance_options_are_converted_for_aws_cdk():
+    construct_class = registry.get('eks_cluster')
+    converted = {'version', 'endpoint_access', 'default_capacity_type', 'default_capacity_instance'}
+    assert converted <= set(construct_class._converters)
+
+    pytest.importorskip('aws_cdk.aws_eks')
+    from aws_cdk import aws_ec2 as ec2, aws_eks as eks
+    params = construct_class._construct_params(construct_class, {
+        'endpoint_access': 'public_and_private', 'default_capacity_type': 'ec2',
+        'default_capacity_instance': 't3.large'})
+    assert isinstance(params['endpoint_access'], eks.EndpointAccess)
+    assert params['default_capacity_type'] == eks.DefaultCapacityType.EC2
+    assert isinstance(params['default_capacity_instance'], ec2.InstanceType)
+    assert params['version'].version == '1.21'
+
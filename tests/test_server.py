@@ -0,0 +1,66 @@
+import os
+import json
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from eksdivingboard.cdk.compiler import ConfigsCompiler, compile_configs
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.server import SynthServer, SynthClient, SynthError
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def client(tmp_path):
+    server = SynthServer(str(tmp_path / 'synth.sock'), workdir=str(tmp_path / 'work'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield SynthClient(server.socket_path, timeout=30)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_compile_configs_is_repeatable():
+    arguments = DeploymentDefinition.load(os.path.join(FIXTURES, 'example.yaml')).compiler_arguments()
+    compiler = ConfigsCompiler(**arguments)
+    first = compiler.compile_stack_configs('InfrastructureStackDefaultStack')
+    files = list(compiler._deploy_files)
+    # a second compile on the same instance must not pick up every file twice
+    assert compiler.compile_stack_configs('InfrastructureStackDefaultStack') == first
+    assert compiler._deploy_files == files
+    assert compile_configs(arguments, 'InfrastructureStackDefaultStack') == (first, {})
+
+
+def test_concurrent_python_synths(client, tmp_path):
+    deployment = os.path.join(FIXTURES, 'example.yaml')
+    assert client.ping()['ok']
+
+    def synth(index):
+        return client.synth(deployment, environments=['dev', 'prod'], outdir=str(tmp_path / f'out{index}'),
+                            backend='python')
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(synth, range(4)))
+    for index, response in enumerate(responses):
+        assert response['stacks'] == ['InfrastructureStack', 'dev', 'prod']
+        with open(tmp_path / f'out{index}/manifest.json') as stream:
+            assert list(json.load(stream)['artifacts']) == ['InfrastructureStack', 'dev', 'prod', 'Tree']
+    assert (tmp_path / 'out0/dev.template.json').read_text() == (tmp_path / 'out3/dev.template.json').read_text()
+
+
+def test_errors_are_returned_to_the_client(client, tmp_path):
+    shutil.copytree(FIXTURES, tmp_path / 'fixtures')
+    vpc_file = tmp_path / 'fixtures/example/default_vpc.yaml'
+    vpc_file.write_text(vpc_file.read_text().replace('max_azs: 4', "max_azs: 'many'"))
+    deployment = str(tmp_path / 'fixtures/example.yaml')
+
+    with pytest.raises(SynthError) as error:
+        client.synth(deployment, backend='python')
+    assert error.value.errors and all('max_azs' in message for message in error.value.errors)
+
+    with pytest.raises(SynthError, match='unknown environments'):
+        client.synth(os.path.join(FIXTURES, 'example.yaml'), environments=['staging'], backend='python')
+    # the server keeps serving after failed requests
+    assert client.ping()['ok']
@@ -0,0 +1,12 @@
+import pytest
+from eksdivingboard.cdk.templates import TemplateEngine, UndefinedVariablesError
+
+
+def test_variables_resolve_in_one_pass():
+    engine = TemplateEngine({'env': 'dev', 'name_dev': 'vpc-dev', 'max_azs': 3})
+    configs = {'vpc': {'${env}-vpc': {'vpc_name': '${name_${env}}', 'max_azs': '${max_azs}'}}}
+    assert engine.resolve(configs)['vpc']['${env}-vpc'] == {'vpc_name': 'vpc-dev', 'max_azs': 3}
+
+    with pytest.raises(UndefinedVariablesError) as error:
+        engine.resolve({'a': '${missing_one}', 'b': ['${missing_two}']})
+    assert {name for name, _location in error.value.missing} == {'missing_one', 'missing_two'}
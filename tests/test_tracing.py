@@ -0,0 +1,44 @@
+import json
+import os
+from eksdivingboard.cdk.tracing import NULL_SPAN, TRACE_OWNER_ENV, Tracer
+
+
+def test_spans_are_only_recorded_while_enabled(monkeypatch):
+    monkeypatch.setenv(TRACE_OWNER_ENV, str(os.getpid()))
+    tracer = Tracer()
+    assert tracer.span('compile') is NULL_SPAN
+
+    tracer.enable()
+    with tracer.span('compile', files=3) as span:
+        span.set(environments=2)
+    (event,) = tracer.chrome_trace()['traceEvents']
+    assert (event['name'], event['ph'], event['pid']) == ('compile', 'X', os.getpid())
+    assert event['args'] == {'files': '3', 'environments': '2'}
+    assert tracer.summary().splitlines()[1].split()[:2] == ['compile', '1']
+    tracer.disable()
+    tracer.events = []
+
+
+def test_workers_leave_the_trace_file_to_its_owner(tmp_path, monkeypatch):
+    output = str(tmp_path / 'trace.json')
+    monkeypatch.setenv(TRACE_OWNER_ENV, str(os.getpid() + 1))
+    worker = Tracer()
+    worker.enable(output)
+    assert worker.worker
+    with worker.span('synth'):
+        pass
+    worker.finish()
+    assert not os.path.exists(output)
+    assert os.listdir(tmp_path) == [f'trace.json.{os.getpid()}.part']
+
+    monkeypatch.setenv(TRACE_OWNER_ENV, str(os.getpid()))
+    owner = Tracer()
+    owner.enable(output)
+    assert not owner.worker
+    with owner.span('stitch'):
+        pass
+    owner.finish()
+    assert os.listdir(tmp_path) == ['trace.json']
+    with open(output, 'r') as stream:
+        names = sorted(event['name'] for event in json.load(stream)['traceEvents'])
+    assert names == ['stitch', 'synth']
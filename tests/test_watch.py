@@ -0,0 +1,71 @@
+import os
+import json
+import shutil
+import sys
+import pytest
+from eksdivingboard.cdk.deployment import DeploymentDefinition
+from eksdivingboard.cdk.watch import InotifyWatcher, PollingWatcher, WatchSession
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _session(tmp_path):
+    shutil.copytree(FIXTURES, tmp_path / 'fixtures')
+    definition = DeploymentDefinition.load(str(tmp_path / 'fixtures/example.yaml'))
+    return WatchSession(definition.compiler_arguments(), str(tmp_path / 'cdk.out'), root_stack_id='InfrastructureStack')
+
+
+def _edit(file_name, old, new):
+    with open(file_name) as stream:
+        content = stream.read()
+    assert old in content
+    with open(file_name, 'w') as stream:
+        stream.write(content.replace(old, new))
+
+
+def test_only_stacks_with_changed_configs_are_rewritten(tmp_path):
+    session = _session(tmp_path)
+    assert session.build() == ['dev', 'test', 'prod', 'InfrastructureStack']
+    with open(tmp_path / 'cdk.out/manifest.json') as stream:
+        assert list(json.load(stream)['artifacts']) == ['InfrastructureStack', 'dev', 'test', 'prod', 'Tree']
+
+    # a variables file only touches its own environment, and an unused variable changes nothing
+    test_variables = str(tmp_path / 'fixtures/example/environments/test.yaml')
+    _edit(test_variables, 'account:', 'unused: 1\naccount:')
+    assert session.update({test_variables}) == []
+
+    vpc_file = str(tmp_path / 'fixtures/example/default_vpc.yaml')
+    _edit(vpc_file, 'max_azs: 4', 'max_azs: 1')
+    assert session.update({vpc_file}) == ['dev', 'test', 'prod']
+    with open(tmp_path / 'cdk.out/prod.template.json') as stream:
+        subnets = [resource for resource in json.load(stream)['Resources'].values()
+                   if resource['Type'] == 'AWS::EC2::Subnet']
+    assert len(subnets) == 3
+
+
+def test_broken_edit_keeps_the_last_good_template(tmp_path):
+    session = _session(tmp_path)
+    session.build()
+    before = (tmp_path / 'cdk.out/dev.template.json').read_text()
+    vpc_file = str(tmp_path / 'fixtures/example/default_vpc.yaml')
+    _edit(vpc_file, 'max_azs: 4', "max_azs: 'many'")
+    assert session.update({vpc_file}) == []
+    assert (tmp_path / 'cdk.out/dev.template.json').read_text() == before
+
+
+@pytest.mark.parametrize('watcher_class', [
+    PollingWatcher,
+    pytest.param(InotifyWatcher, marks=pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify')),
+])
+def test_watchers_report_changed_yaml_files(tmp_path, watcher_class):
+    (tmp_path / 'nested').mkdir()
+    watcher = watcher_class([str(tmp_path)])
+    if watcher_class is PollingWatcher:
+        watcher.interval = 0.01
+    try:
+        target = tmp_path / 'nested/vpc.yaml'
+        target.write_text('vpc: {}\n')
+        (tmp_path / 'notes.txt').write_text('ignored')
+        assert watcher.wait(timeout=5) == {str(target)}
+    finally:
+        watcher.close()